@@ -12,15 +12,18 @@ from langchain_core.language_models import BaseLanguageModel
 from langchain_core.messages import ChatMessage
 from langchain_core.tools import BaseTool
 from langgraph.constants import END
+from langgraph.checkpoint.base import BaseCheckpointSaver
 from langgraph.graph.state import CompiledStateGraph
 
 from llmcompiler.few_shot.few_shot import BaseFewShot
+from llmcompiler.graph.checkpoint import CheckpointStore
 from llmcompiler.graph.output_parser import Task
 from llmcompiler.graph.plan_and_schedule import PlanAndSchedule
 from llmcompiler.graph.rewrite import Rewrite
 from llmcompiler.graph.token_calculate import SwitchLLM
 from llmcompiler.result.chat import ChatResponse, ChatRequest
 from llmcompiler.tools.generic.action_output import Chart, Source
+from llmcompiler.tools.tool_index import tool_index
 from langchain_core.messages import (
     BaseMessage
 )
@@ -42,7 +45,8 @@ class Launch(ABC):
                  re_planer: Union[BaseLanguageModel, List[BaseLanguageModel], SwitchLLM, List[SwitchLLM]] = None,
                  multi_dialogue: bool = False, debug_prompt: bool = False, few_shot: BaseFewShot = None,
                  print_graph: bool = True, print_dag: bool = True,
-                 custom_prompts: dict[str, str] = None):
+                 custom_prompts: dict[str, str] = None, checkpoint_store: CheckpointStore = None,
+                 checkpointer: BaseCheckpointSaver = None):
         """
         初始化必要参数。
         :param chat: 请求对象
@@ -56,6 +60,8 @@ class Launch(ABC):
         :param print_graph: LLMCompiler的LangGrap结构可视化语法是否打印。
         :param print_dag: 任务的有向无环图可视化语法是否打印。
         :param custom_prompts: 自定义提示词。
+        :param checkpoint_store: 已完成TASK的检查点存储，与`checkpointer`使用相同的`thread_id`，恢复会话时不重复调用Tool。
+        :param checkpointer: LangGraph检查点，运行时传入`thread_id`可以在其它进程中从上一步继续执行。
         """
         self.few_shot = few_shot
         self.chat = chat
@@ -76,10 +82,12 @@ class Launch(ABC):
 
         self.print_graph = print_graph
         self.print_dag = print_dag
+        self.checkpointer = checkpointer
 
         self.rewrite = Rewrite(llm=llm, tools=tools, few_shot=few_shot, custom_prompts=custom_prompts)
         if self.swi_planer:
-            self.plan_and_schedule = PlanAndSchedule(self.swi_planer, self.tools, self.swi_re_planer, self.print_dag, self.custom_prompts)
+            self.plan_and_schedule = PlanAndSchedule(self.swi_planer, self.tools, self.swi_re_planer, self.print_dag,
+                                                     self.custom_prompts, checkpoint_store=checkpoint_store)
         else:
             raise Exception("Planer is not initialized!")
 
@@ -162,9 +170,8 @@ class Launch(ABC):
         """
         输出中如果包含工具名称重置输出
         """
-        for tool in self.tools:
-            if tool.name in output:
-                return OUTPUT_TEMPLATE
+        if tool_index(self.tools).contains_any(output):
+            return OUTPUT_TEMPLATE
         return output
 
     def response(self, query: str, response: Any, charts: List[Chart], source: List[Source], labels: List[str]):
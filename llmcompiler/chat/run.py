@@ -7,9 +7,10 @@
 import time
 import logging
 from langchain_core.messages import BaseMessage, AIMessage
+from langchain_core.runnables import RunnableLambda, RunnableConfig
 from langgraph.graph.state import CompiledStateGraph
 from langgraph.errors import GraphRecursionError
-from typing import List, Dict, Tuple, Any
+from typing import List, Dict, Tuple, Any, Optional, Callable
 
 from langgraph.graph import StateGraph, END
 from langgraph.graph.message import MessagesState
@@ -18,6 +19,8 @@ from llmcompiler.chat.launch import Launch
 from llmcompiler.graph.joiner import Joiner
 from llmcompiler.graph.output_parser import Task
 from llmcompiler.result.chat import ChatResponse
+from llmcompiler.graph.task_events import TaskResultEvent, with_task_result_callback
+from llmcompiler.utils.thread.deadline import with_deadline
 
 
 class RunLLMCompiler(Launch):
@@ -32,7 +35,7 @@ class RunLLMCompiler(Launch):
         # -----------------------------------初始化工具集和Agent-----------------------------------
         start_time = time.time()
         graph_builder = StateGraph(MessagesState)
-        graph_builder.add_node("plan_and_schedule", self.plan_and_schedule.init)
+        graph_builder.add_node("plan_and_schedule", self.plan_and_schedule_node())
         graph_builder.add_node("join", Joiner(self.swi_joiner, self.tools, self.chat.message, self.custom_prompts).init)
         graph_builder.set_entry_point("plan_and_schedule")
         graph_builder.add_edge("plan_and_schedule", "join")
@@ -40,7 +43,7 @@ class RunLLMCompiler(Launch):
             source="join",
             path=self.should_continue,
         )
-        graph = graph_builder.compile()
+        graph = graph_builder.compile(checkpointer=self.checkpointer)
         print(
             f"==========================Initializing Agent And Tools: {round(time.time() - start_time, 2)} seconds==========================")
         if self.print_graph:
@@ -49,49 +52,96 @@ class RunLLMCompiler(Launch):
             print(graph.get_graph().draw_mermaid())
         return graph
 
+    def plan_and_schedule_node(self) -> RunnableLambda:
+        """
+        `plan_and_schedule`节点同时支持同步与异步执行：`graph.stream`使用线程调度，`graph.astream`使用协程调度
+        """
+        return RunnableLambda(self.plan_and_schedule.init, afunc=self.plan_and_schedule.ainit,
+                              name="plan_and_schedule")
+
     def should_continue(self, state: Dict[str, List[BaseMessage]]):
         state = state["messages"]
         if isinstance(state[-1], AIMessage):
             return END
         return "plan_and_schedule"
 
-    def run(self, recursion_limit: int = 2) -> ChatResponse:
+    def run_config(self, recursion_limit: int, timeout: Optional[float] = None,
+                   on_task_result: Optional[Callable[[TaskResultEvent], None]] = None,
+                   thread_id: Optional[str] = None) -> RunnableConfig:
         """
-        运行流程：数据提取Agent
+        Graph运行配置
+        :param timeout: 请求截止时间（秒），超时后不再等待未完成的Tool调用，已有结果交给Joiner回答
+        :param on_task_result: 每个Tool TASK有结果（完成、被跳过或超时）时立即回调，可用于流式展示图表与进度
+        :param thread_id: 会话ID，LangGraph检查点与TASK检查点都按该ID保存与恢复
         """
-        run_start_time: float = time.time()
+        config = RunnableConfig(recursion_limit=recursion_limit)
+        if thread_id is not None:
+            config["configurable"] = {"thread_id": thread_id}
+        if timeout is not None:
+            config = with_deadline(config, timeout)
+        if on_task_result is not None:
+            config = with_task_result_callback(config, on_task_result)
+        return config
+
+    def _resumable(self, config: RunnableConfig) -> bool:
+        """是否可能从LangGraph检查点继续执行：设置了检查点且运行配置中有会话ID"""
+        return self.checkpointer is not None and config.get("configurable", {}).get("thread_id") is not None
+
+    def graph_input(self, graph: CompiledStateGraph, config: RunnableConfig) -> Optional[Dict[str, Any]]:
+        """会话在LangGraph检查点中有未完成的步骤时从检查点继续执行（输入为None），否则开始新的请求"""
+        if self._resumable(config) and graph.get_state(config).next:
+            return None
+        return self.rewrite.info(self.chat.message)
+
+    async def agraph_input(self, graph: CompiledStateGraph, config: RunnableConfig) -> Optional[Dict[str, Any]]:
+        """`graph_input`的异步版本"""
+        if self._resumable(config) and (await graph.aget_state(config)).next:
+            return None
+        return self.rewrite.info(self.chat.message)
+
+    def _prepare_run(self, recursion_limit: int, timeout: Optional[float],
+                     on_task_result: Optional[Callable[[TaskResultEvent], None]],
+                     thread_id: Optional[str]) -> Tuple[CompiledStateGraph, RunnableConfig, "RunSteps"]:
+        """编译Graph并生成运行配置，`run`与`arun`共用"""
+        steps = RunSteps(self)
         logging.info(self.chat.message)
 
         # --- 编译 Graph Agent ---
         graph = self.init()
 
         # -----------------------------------LLMCompiler-Agent执行-----------------------------------
-        start_time: float = time.time()
-        charts: List = []
-        source: List = []
-        labels: List = []
-        final_step: Dict = {}
         recursion_limit = recursion_limit * 2 + 1  # (2*(dag+join))*(最大2次迭代)
-        graph_stream = graph.stream(self.rewrite.info(self.chat.message), {'recursion_limit': recursion_limit})
-        iteration = 1
+        config = self.run_config(recursion_limit, timeout, on_task_result, thread_id)
+        steps.start_time = time.time()
+        return graph, config, steps
+
+    def run(self, recursion_limit: int = 2, timeout: Optional[float] = None,
+            on_task_result: Optional[Callable[[TaskResultEvent], None]] = None,
+            thread_id: Optional[str] = None) -> ChatResponse:
+        """
+        运行流程：数据提取Agent
+        """
+        graph, config, steps = self._prepare_run(recursion_limit, timeout, on_task_result, thread_id)
         try:
-            for step in graph_stream:
-                print(
-                    f"==========================Iteration {iteration}, {list(step.keys())}: {round(time.time() - start_time, 2)}秒==========================")
-                if 'plan_and_schedule' in step:
-                    chart_list = self.plan_and_schedule.charts
-                    self.expand(chart_list, charts, source, labels)
-                if 'join' in step:
-                    # DAG - Task Fetching Unit Completed / Joiner Completed
-                    iteration += 1
-                final_step = step
-                start_time: float = time.time()
+            for step in graph.stream(self.graph_input(graph, config), config):
+                steps.on_step(step)
         except GraphRecursionError as e:
             logging.error(f"{str(e)}")
-        response = self.response_str(final_step, charts, iteration - 1)
-        end_time = time.time()
-        logging.info(f"===========AI-AGENT total execution time: {end_time - run_start_time} seconds~\n")
-        return self.response(query=self.chat.message, response=response, charts=charts, source=source, labels=labels)
+        return steps.response()
+
+    async def arun(self, recursion_limit: int = 2, timeout: Optional[float] = None,
+                   on_task_result: Optional[Callable[[TaskResultEvent], None]] = None,
+                   thread_id: Optional[str] = None) -> ChatResponse:
+        """
+        运行流程的异步版本：`plan_and_schedule`节点使用协程调度Tool，适合单进程内大量并发请求
+        """
+        graph, config, steps = self._prepare_run(recursion_limit, timeout, on_task_result, thread_id)
+        try:
+            async for step in graph.astream(await self.agraph_input(graph, config), config):
+                steps.on_step(step)
+        except GraphRecursionError as e:
+            logging.error(f"{str(e)}")
+        return steps.response()
 
     def initWithoutJoiner(self) -> CompiledStateGraph:
         """
@@ -101,9 +151,9 @@ class RunLLMCompiler(Launch):
         # -----------------------------------初始化工具集和Agent-----------------------------------
         start_time = time.time()
         graph_builder = StateGraph(MessagesState)
-        graph_builder.add_node("plan_and_schedule", self.plan_and_schedule.init)
+        graph_builder.add_node("plan_and_schedule", self.plan_and_schedule_node())
         graph_builder.set_entry_point("plan_and_schedule")
-        graph = graph_builder.compile()
+        graph = graph_builder.compile(checkpointer=self.checkpointer)
         print(
             f"==========================Initializing Agent And Tools: {round(time.time() - start_time, 2)} seconds==========================")
         if self.print_graph:
@@ -131,8 +181,8 @@ class RunLLMCompiler(Launch):
                     f"==========================Running, {list(step.keys())}: {round(time.time() - start_time, 2)}秒==========================")
                 tasks = self.plan_and_schedule.tasks_temporary_save
                 observations = self.plan_and_schedule.observations
-                for index, task in enumerate(tasks):
-                    results.append((task, observations.get(index + 1)))
+                for task in tasks:
+                    results.append((task, observations.get(task["idx"])))
         except GraphRecursionError as e:
             logging.error(f"{str(e)}")
         end_time = time.time()
@@ -158,3 +208,37 @@ class RunLLMCompiler(Launch):
         logging.info(results)
         logging.info(f"===========AI-AGENT total execution time: {end_time - start_time} seconds~\n")
         return results
+
+
+class RunSteps:
+    """一次运行中Graph每一步输出的处理：展开图表、统计迭代次数，运行结束后组装最终响应"""
+
+    def __init__(self, launch: Launch):
+        self.launch = launch
+        self.run_start_time: float = time.time()
+        self.start_time: float = self.run_start_time
+        self.charts: List = []
+        self.source: List = []
+        self.labels: List = []
+        self.final_step: Dict = {}
+        self.iteration = 1
+
+    def on_step(self, step: Dict[str, Any]):
+        print(
+            f"==========================Iteration {self.iteration}, {list(step.keys())}: {round(time.time() - self.start_time, 2)}秒==========================")
+        if 'plan_and_schedule' in step:
+            chart_list = self.launch.plan_and_schedule.charts
+            self.launch.expand(chart_list, self.charts, self.source, self.labels)
+        if 'join' in step:
+            # DAG - Task Fetching Unit Completed / Joiner Completed
+            self.iteration += 1
+        self.final_step = step
+        self.start_time = time.time()
+
+    def response(self) -> ChatResponse:
+        launch = self.launch
+        response = launch.response_str(self.final_step, self.charts, self.iteration - 1)
+        end_time = time.time()
+        logging.info(f"===========AI-AGENT total execution time: {end_time - self.run_start_time} seconds~\n")
+        return launch.response(query=launch.chat.message, response=response, charts=self.charts, source=self.source,
+                               labels=self.labels)
@@ -0,0 +1,417 @@
+# -*- coding: utf-8 -*-
+"""
+@Author  : Yc-Ma
+@Desc    : Compile task arguments into placeholder resolution programs.
+@Time    : 2026-10-18 11:20:15
+"""
+import re
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple, Union, Type
+
+from langchain_core.tools import BaseTool
+from pydantic import BaseModel
+from typing_extensions import TypedDict
+
+from llmcompiler.tools.dag.dag_flow_params import DISABLE_RESOLVED_ARGS, PARTIAL_RESOLVED_ARGS_PARSE
+from llmcompiler.tools.generic.action_output import ActionOutput, DAGFlow
+from llmcompiler.utils.string.string_sim import word_similarity_score
+
+# $1 or ${1} -> 1
+# ${2}[0].code -> 2
+ID_PATTERN = r"\$\{?(\d+)\}?"
+# 部分解析时被替换的参数部分：${2}.stock_return
+PLACEHOLDER_PATTERN = r'\$\{[^}]+\}(?:\.[\w]+)?'
+# 一个字段多个参数时的参数引用：${2}.stock_return -> (2, stock_return)
+MULTI_REF_PATTERN = r"\$\{?(\d+)\}?(?:\.(\w+))?"
+
+_MISSING = object()
+
+
+class ResolvedArgs(TypedDict):
+    """`resolved_args` dependency"""
+    dep_task: Dict[str, Any]
+    output: ActionOutput
+    field: str
+
+
+class ResolveContext:
+    """
+    执行参数解析程序时使用的运行期信息
+    :param observations: 其它TASK返回结果
+    :param cur_task: 当前TASK
+    :param tasks_temporary_save: 已生成的TASK，`TaskRegistry`
+    :param resolved_dependency: 解析过程中记录每个字段依赖的上游TASK与字段信息
+    """
+    __slots__ = ("observations", "cur_task", "tasks_temporary_save", "resolved_dependency")
+
+    def __init__(self, observations: Dict[int, Any], cur_task: Dict[str, Any], tasks_temporary_save: Any,
+                 resolved_dependency: Dict[str, Any]):
+        self.observations = observations
+        self.cur_task = cur_task
+        self.tasks_temporary_save = tasks_temporary_save
+        self.resolved_dependency = resolved_dependency
+
+    def dependency_task(self, idx: int) -> Optional[Dict[str, Any]]:
+        """获取被依赖的TASK，`join`不会被依赖"""
+        return self.tasks_temporary_save.get(idx)
+
+    def previous_tool_idx(self) -> Optional[int]:
+        """解析不到ID默认使用上一个TASK ID，不能使用当前任务的ID，不能使用Join类任务ID"""
+        return self.tasks_temporary_save.previous_tool_idx(self.cur_task["idx"])
+
+
+class ArgProgram:
+    """单个参数值的解析程序"""
+    __slots__ = ()
+
+    def resolve(self, ctx: ResolveContext, cur_field: Optional[str]) -> Any:
+        raise NotImplementedError
+
+
+class LiteralArg(ArgProgram):
+    """不包含参数引用，或者字段禁用了参数解析，原样返回"""
+    __slots__ = ("value",)
+
+    def __init__(self, value: Any):
+        self.value = value
+
+    def resolve(self, ctx: ResolveContext, cur_field: Optional[str]) -> Any:
+        return self.value
+
+
+class SingleRef(ArgProgram):
+    """
+    引用一个TASK的参数，例如：`${1}`、`${1}.code`、`$1`；
+    `idx`为空表示参数中没有TASK ID，运行时使用上一个TASK的返回结果
+    """
+    __slots__ = ("arg", "idx", "field", "has_dollar")
+
+    def __init__(self, arg: str, idx: Optional[int]):
+        self.arg = arg
+        self.idx = idx
+        # 参数中显式指定的上游字段：`${1}.code -> code`
+        self.field = arg.split('.')[-1] if '.' in arg else None
+        self.has_dollar = '$' in arg
+
+    def resolve(self, ctx: ResolveContext, cur_field: Optional[str]) -> Any:
+        value = self._value(ctx, cur_field)
+        if value is _MISSING:
+            return self.arg
+        return value
+
+    def _value(self, ctx: ResolveContext, cur_field: Optional[str]) -> Any:
+        """返回依赖的值，依赖的TASK没有可用的返回结果时返回`_MISSING`"""
+        idx = self.idx if self.idx is not None else ctx.previous_tool_idx()
+        if idx is None:
+            return _MISSING
+        output = ctx.observations.get(idx)
+        if not isinstance(output, ActionOutput):
+            return _MISSING
+        dep_task = ctx.dependency_task(idx)
+        value, field = _tools_dag_flow_value(output.dag_kwargs, dep_task, self.field, self.has_dollar, cur_field)
+        if value is not None:
+            _record_dependency(ctx, cur_field, ResolvedArgs(dep_task=dep_task, output=output, field=field))
+        return value
+
+
+class PartialTemplate(SingleRef):
+    """字段启用了部分解析：只替换参数部分，保留字符串其余部分，例如：`average of ${2}.stock_return`"""
+    __slots__ = ("prefix", "suffix")
+
+    def __init__(self, arg: str, idx: Optional[int]):
+        super().__init__(arg, idx)
+        match = re.search(PLACEHOLDER_PATTERN, arg)
+        self.prefix = arg[:match.start()] if match else None
+        self.suffix = arg[match.end():] if match else None
+
+    def resolve(self, ctx: ResolveContext, cur_field: Optional[str]) -> Any:
+        value = self._value(ctx, cur_field)
+        if value is _MISSING:
+            return self.arg
+        if value is None:
+            return None
+        if self.prefix is None:
+            return self.arg
+        # 仅替换一次（部分替换时会将字符串其余部分保留并只替换参数部分）
+        return f"{self.prefix}{value}{self.suffix}"
+
+
+class MultiRef(ArgProgram):
+    """
+    一个字段多个参数，依次替换每个参数引用并保留原始字符串
+    eg.`average of ${2}.stock_return ceshi ${4}.ff ${5}.stock_return ceshi`
+    """
+    __slots__ = ("arg", "segments", "refs")
+
+    def __init__(self, arg: str):
+        self.arg = arg
+        # segments比refs多一个元素：segments[0] + ref[0] + segments[1] + ... + segments[-1]
+        self.segments: List[str] = []
+        # (TASK ID, 引用字段, 引用在原始参数中的起始位置)
+        self.refs: List[Tuple[int, Optional[str], int]] = []
+        pos = 0
+        for match in re.finditer(MULTI_REF_PATTERN, arg):
+            self.segments.append(arg[pos:match.start()])
+            self.refs.append((int(match.group(1)), match.group(2), match.start()))
+            pos = match.end()
+        self.segments.append(arg[pos:])
+
+    def resolve(self, ctx: ResolveContext, cur_field: Optional[str]) -> Any:
+        parts = [self.segments[0]]
+        for i, (idx, field, start) in enumerate(self.refs):
+            output = ctx.observations.get(idx)
+            if not isinstance(output, ActionOutput):
+                # 依赖的TASK没有可用的返回结果，剩余部分保持原样
+                return "".join(parts) + self.arg[start:]
+            dep_task = ctx.dependency_task(idx)
+            value, dep_field = _tools_dag_flow_value(output.dag_kwargs, dep_task, field, True, cur_field)
+            if value is None:
+                return None
+            _record_dependency(ctx, cur_field, ResolvedArgs(dep_task=dep_task, output=output, field=dep_field),
+                               multi=True)
+            parts.append(str(value))
+            parts.append(self.segments[i + 1])
+        return "".join(parts)
+
+
+class ListArg(ArgProgram):
+    """参数值为列表，逐个元素解析"""
+    __slots__ = ("items",)
+
+    def __init__(self, items: List[ArgProgram]):
+        self.items = items
+
+    def resolve(self, ctx: ResolveContext, cur_field: Optional[str]) -> Any:
+        return [item.resolve(ctx, cur_field) for item in self.items]
+
+
+class CompiledArgs:
+    """
+    TASK全部参数的解析程序，解析计划时生成，执行TASK时只运行程序，不再执行正则匹配
+    - `fields`：字典类型参数，KEY为预处理后的字段名
+    - `program`：字符串类型参数
+    - 两者都为空表示参数原样传递
+    """
+    __slots__ = ("fields", "program", "raw")
+
+    def __init__(self, raw: Any, fields: Dict[str, ArgProgram] = None, program: ArgProgram = None):
+        self.raw = raw
+        self.fields = fields
+        self.program = program
+
+    def resolve(self, ctx: ResolveContext) -> Any:
+        if self.fields is not None:
+            return {key: program.resolve(ctx, key) for key, program in self.fields.items()}
+        elif self.program is not None:
+            return self.program.resolve(ctx, None)
+        else:
+            # This will likely fail
+            return self.raw
+
+
+def compile_args(tool: Union[str, BaseTool], args: Any) -> CompiledArgs:
+    """编译TASK参数"""
+    if not isinstance(tool, BaseTool):
+        return CompiledArgs(args)
+    args_schema = tool.args_schema if isinstance(tool.args_schema, type) else None
+    flags = _schema_flags(args_schema)
+    if isinstance(args, str):
+        return CompiledArgs(args, program=_compile_arg(args, flags, None))
+    elif isinstance(args, dict):
+        return CompiledArgs(args, fields={key: _compile_arg(val, flags, key) for key, val in _pre_args(args).items()})
+    return CompiledArgs(args)
+
+
+def _compile_arg(arg: Any, flags: Optional[Dict[str, Tuple[bool, bool]]], field: Optional[str]) -> ArgProgram:
+    """
+    编译单个参数值
+    1. 解析依赖的TASK ID
+    2. 根据字段配置选择解析方式
+    """
+    if flags is None:
+        # 没有`args_schema`的Tool不执行参数解析
+        return LiteralArg(arg)
+    resolved, partial = flags.get(field, (True, False))
+    if not resolved:
+        return LiteralArg(arg)
+    if isinstance(arg, str):
+        return _compile_arg_str(arg, partial)
+    elif isinstance(arg, list):
+        return ListArg([_compile_arg_str(a, partial) if isinstance(a, str) else LiteralArg(a) for a in arg])
+    return LiteralArg(arg)
+
+
+def _compile_arg_str(arg: str, partial: bool) -> ArgProgram:
+    """
+    :param arg: 模型生成的参数 （例如：${1}、${1}[0]、${1}[0].code...）
+    :param partial: 字段是否启用部分解析
+    """
+    if arg.count('${') > 1:
+        # 支持多参数-默认部分解析
+        return MultiRef(arg)
+    if not _is_match_arg(arg):
+        return LiteralArg(arg)
+    # 支持单参数、以及部分解析
+    idx = _resolve_arg_str_idx(arg)
+    if idx == -1:
+        return LiteralArg(arg)
+    if partial:
+        return PartialTemplate(arg, idx)
+    return SingleRef(arg, idx)
+
+
+@lru_cache(maxsize=1024)
+def _schema_flags(args_schema: Optional[Type[BaseModel]]) -> Optional[Dict[str, Tuple[bool, bool]]]:
+    """
+    预先计算每个字段是否执行参数解析、是否执行部分解析
+    - 参数解析的含义为将`${1}.code、$1`等类似的参数解析为真实参数值
+    - 部分参数解析的含义为将`'average of ${2}.stock_return'`等类似的参数解析为真实参数值，保留原有字符串表示
+    """
+    if args_schema is None:
+        return None
+    resolved_key = next(iter(DISABLE_RESOLVED_ARGS.keys()), None)
+    partial_key = next(iter(PARTIAL_RESOLVED_ARGS_PARSE.keys()), None)
+    flags = {}
+    for key, value in args_schema.model_fields.items():
+        json_schema_extra = getattr(value, 'json_schema_extra', None)
+        if not isinstance(json_schema_extra, dict):
+            json_schema_extra = {}
+        flags[key] = (json_schema_extra.get(resolved_key, True), json_schema_extra.get(partial_key, False))
+    return flags
+
+
+def _is_match_arg(arg: str) -> bool:
+    """
+    判断是否需要进行参数值匹配
+    """
+    if '$' in arg:
+        return True
+    if arg.startswith("{") and arg.endswith("}"):
+        return True
+    if arg.startswith("<") and arg.endswith(">"):
+        return True
+    return False
+
+
+def _resolve_arg_str_idx(arg: str) -> Optional[int]:
+    """
+    匹配 TASK ID，参数中没有TASK ID时返回None（运行时使用上一个TASK ID）
+    """
+    idx_str = re.sub(ID_PATTERN, lambda match: match.group(1), arg)
+    if idx_str == arg:
+        return None
+    try:
+        return int(idx_str)
+    except ValueError:
+        # 处理类似 ${2}[0].code -> 2[0].code 无法解析的问题
+        match = re.search(r'\d+', idx_str)
+        return int(match.group()) if match else -1
+
+
+def _record_dependency(ctx: ResolveContext, cur_field: Optional[str], resolved: ResolvedArgs, multi: bool = False):
+    """记录字段依赖的上游参数，一个字段多个参数时记录为列表"""
+    dependency = ctx.resolved_dependency
+    if multi and cur_field in dependency:
+        existing_value = dependency[cur_field]
+        if not isinstance(existing_value, list):
+            dependency[cur_field] = [existing_value]
+        dependency[cur_field].append(resolved)
+    else:
+        dependency[cur_field] = resolved
+
+
+def _tools_dag_flow_value(tool_observation: DAGFlow, dep_task: Optional[Dict[str, Any]], field: Optional[str],
+                          has_dollar: bool, cur_field: Optional[str]) -> Tuple[Any, str]:
+    """
+    获取参数值
+    :param tool_observation: 当前任务依赖的上一步Task结果
+    :param dep_task: 当前任务依赖的Task
+    :param field: 参数中显式指定的上游字段
+    :param has_dollar: 参数中是否包含`$`
+    :param cur_field: 当前Task入参字段
+    获取参数值方法：
+    - 解析字段名获取【标准方法，准确率最高】
+    - 猜字段如果出错则有可能触发Replan过程
+    :return 返回解析的参数值，以及被依赖的上游字段field
+    """
+    kwargs = tool_observation.kwargs
+    # 1. ==============匹配字段==============
+    if field is not None and field in kwargs:
+        return kwargs[field], field
+    # 2. ==============猜字段：从依赖任务的输出中猜，字段全匹配==============
+    if has_dollar and cur_field in kwargs:
+        return kwargs[cur_field], cur_field
+    # 3. ==============猜字段：从依赖任务的输入猜字段，字段全匹配==============
+    # 从依赖的Task中尝试直接获取相同的参数
+    if dep_task is not None and isinstance(dep_task["args"], dict) and cur_field in dep_task["args"]:
+        value = dep_task["args"][cur_field]
+        if '$' not in str(value):
+            return value, cur_field
+    # 4. ==============猜字段：匹配不到字段则猜字段，基于字段匹配度从上一个Task输出中猜字段==============
+    return _resolve_arg_parse_random(cur_field, tool_observation)
+
+
+def _resolve_arg_parse_random(cur_field: str, tool_observation: DAGFlow) -> Tuple[Any, str]:
+    min_similarity = 100
+    best_key = None
+    data = tool_observation.kwargs
+    for key in data.keys():
+        similarity = word_similarity_score(cur_field, key)  # 猜一个KEY
+        if similarity < min_similarity:
+            min_similarity = similarity
+            best_key = key
+    if best_key:
+        return data.get(best_key), best_key
+    return None, None
+
+
+def _pre_args(args: Dict[str, Any]) -> Dict[str, Any]:
+    """参数预处理"""
+    new_args = {}
+    additional_args = {}
+
+    for key, value in args.items():
+        if isinstance(value, str):
+            parsed_result = _args_parse_dict(value)
+            if isinstance(parsed_result, Dict):
+                # 检查是否包含 '__value__' 并处理
+                if '__value__' in parsed_result:
+                    new_args[key] = parsed_result['__value__']
+                else:
+                    new_args[key] = None
+                # 拼接额外的 key-value 对
+                for k, v in parsed_result.items():
+                    if k != '__value__':
+                        additional_args[k] = v
+            else:
+                new_args[key] = parsed_result
+        else:
+            new_args[key] = value
+
+    # 合并 additional_args 到 new_args
+    new_args.update(additional_args)
+    return new_args
+
+
+def _args_parse_dict(input_string) -> Dict[str, Any]:
+    """
+    正则表达式匹配 key=value 的模式，如果有剩余部分则保存在__value__字段中
+    :param input_string: 输入字符串
+    :return:
+    """
+    pattern = r'(\w+)=["\']([^"\']+)["\']'
+    matches = re.findall(pattern, input_string)
+
+    # 构建字典
+    result_dict = {key: value for key, value in matches}
+
+    if not result_dict:
+        # 空字典表示没有提取到 key=value，可以直接返回
+        return input_string
+
+    # 移除已匹配部分，剩余的作为单独的值
+    remaining = re.sub(pattern, '', input_string).replace(',', '').strip()
+    if remaining:
+        result_dict['__value__'] = remaining.strip('"')
+
+    return result_dict
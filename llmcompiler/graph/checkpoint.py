@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+"""
+@Author  : Yc-Ma
+@Desc    : Checkpoint store of completed tasks for resuming a request.
+@Time    : 2026-10-18 19:48:13
+"""
+import os
+import pickle
+import sqlite3
+import logging
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, Container, Dict, List, Optional
+
+from typing_extensions import TypedDict
+from langchain_core.runnables import RunnableConfig
+from langchain_core.runnables.config import patch_config
+from langchain_core.tools import BaseTool
+
+from llmcompiler.graph.output_parser import Task
+from llmcompiler.graph.task_events import observation_status, TASK_SUCCESS
+
+logger = logging.getLogger(__name__)
+
+# 放在`RunnableConfig["configurable"]`中的当前会话检查点
+TASK_CHECKPOINT_VAR = "task_checkpoint"
+
+
+class TaskRecord(TypedDict):
+    idx: int
+    tool: str
+    args: Any
+    dependencies: List[int]
+    thought: Optional[str]
+    resolved_args: Any
+    observation: Any
+
+
+class CheckpointStore(ABC):
+    """已完成TASK的检查点存储，按会话（LangGraph的`thread_id`）保存每个TASK的记录"""
+
+    @abstractmethod
+    def put(self, thread_id: str, record: TaskRecord):
+        """保存TASK记录，同一会话中相同TASK ID的记录被覆盖"""
+
+    @abstractmethod
+    def load(self, thread_id: str) -> Dict[int, TaskRecord]:
+        """读取会话的全部TASK记录"""
+
+    @abstractmethod
+    def delete(self, thread_id: str):
+        """删除会话的全部TASK记录"""
+
+
+class MemoryCheckpointStore(CheckpointStore):
+    """进程内的检查点存储，记录以pickle保存，与持久化存储的行为一致"""
+
+    def __init__(self):
+        self._threads: Dict[str, Dict[int, bytes]] = {}
+        self._lock = threading.Lock()
+
+    def put(self, thread_id: str, record: TaskRecord):
+        data = pickle.dumps(record, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._threads.setdefault(thread_id, {})[record["idx"]] = data
+
+    def load(self, thread_id: str) -> Dict[int, TaskRecord]:
+        with self._lock:
+            records = dict(self._threads.get(thread_id, {}))
+        return {idx: pickle.loads(data) for idx, data in records.items()}
+
+    def delete(self, thread_id: str):
+        with self._lock:
+            self._threads.pop(thread_id, None)
+
+
+class SqliteCheckpointStore(CheckpointStore):
+    """基于SQLite文件的检查点存储，进程退出后可以在其它进程中恢复会话"""
+
+    def __init__(self, path: str):
+        self.path = os.path.abspath(path)
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._connection().execute(
+            "CREATE TABLE IF NOT EXISTS task_checkpoint ("
+            "thread_id TEXT NOT NULL, idx INTEGER NOT NULL, record BLOB NOT NULL, PRIMARY KEY (thread_id, idx))")
+
+    def _connection(self) -> sqlite3.Connection:
+        """每个线程使用独立的连接"""
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            self._local.connection = connection
+        return connection
+
+    def put(self, thread_id: str, record: TaskRecord):
+        self._connection().execute(
+            "INSERT OR REPLACE INTO task_checkpoint (thread_id, idx, record) VALUES (?, ?, ?)",
+            (thread_id, record["idx"], pickle.dumps(record, protocol=pickle.HIGHEST_PROTOCOL)))
+
+    def load(self, thread_id: str) -> Dict[int, TaskRecord]:
+        rows = self._connection().execute("SELECT idx, record FROM task_checkpoint WHERE thread_id = ?",
+                                          (thread_id,)).fetchall()
+        return {idx: pickle.loads(data) for idx, data in rows}
+
+    def delete(self, thread_id: str):
+        self._connection().execute("DELETE FROM task_checkpoint WHERE thread_id = ?", (thread_id,))
+
+
+class TaskCheckpoint:
+    """
+    一个会话的检查点：记录调用成功的Tool TASK（TASK定义、解析后的参数、结果）；
+    恢复会话时，TASK ID、Tool与参数都与检查点一致且上游TASK都已复用的TASK直接复用检查点中的结果，不再调用Tool。
+    """
+
+    def __init__(self, store: CheckpointStore, thread_id: str, restored: Optional[Dict[int, TaskRecord]] = None):
+        self.store = store
+        self.thread_id = thread_id
+        self.restored = restored or {}
+
+    def resolved(self, task: Task, resolved_args: Any):
+        """
+        暂存TASK解析后的参数，TASK完成时与结果一起写入；参数暂存在TASK中而不是检查点中，
+        超时、被跳过或请求结束时仍未完成的TASK不会在检查点的生命周期内一直持有参数
+        """
+        task["resolved_args"] = resolved_args
+
+    def reusable(self, task: Task, reused: Container[int]) -> Optional[TaskRecord]:
+        """
+        检查点中与`task`一致的记录：TASK ID、Tool与参数一致，且依赖的TASK都复用了检查点中的结果；
+        上游TASK重新执行时结果可能已经变化，下游TASK也重新执行
+        :param reused: 本次恢复中复用了检查点结果的TASK ID
+        """
+        record = self.restored.get(task["idx"])
+        if record is None or not isinstance(task["tool"], BaseTool):
+            return None
+        if record["tool"] != task["tool"].name or record["args"] != task["args"]:
+            return None
+        if any(dep not in reused for dep in task["dependencies"]):
+            return None
+        return record
+
+    def record(self, task: Task, observation: Any):
+        """写入调用成功的Tool TASK，失败、跳过、超时的TASK在恢复后重新执行"""
+        resolved_args = task.pop("resolved_args", None)
+        if not isinstance(task["tool"], BaseTool) or observation_status(observation) != TASK_SUCCESS:
+            return
+        record = TaskRecord(idx=task["idx"], tool=task["tool"].name, args=task["args"],
+                            dependencies=list(task["dependencies"]), thought=task.get("thought"),
+                            resolved_args=resolved_args, observation=observation)
+        try:
+            self.store.put(self.thread_id, record)
+        except Exception as e:
+            logger.warning(f"Failed to checkpoint task {task['idx']} of thread {self.thread_id}: {repr(e)}")
+
+
+def with_task_checkpoint(config: Optional[RunnableConfig], checkpoint: TaskCheckpoint) -> RunnableConfig:
+    return patch_config(config, configurable={TASK_CHECKPOINT_VAR: checkpoint})
+
+
+def task_checkpoint(config: Optional[RunnableConfig]) -> Optional[TaskCheckpoint]:
+    """`RunnableConfig`中的当前会话检查点"""
+    return (config or {}).get("configurable", {}).get(TASK_CHECKPOINT_VAR)
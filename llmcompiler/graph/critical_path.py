@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""
+@Author  : Yc-Ma
+@Desc    : Critical-path priority of DAG tasks.
+@Time    : 2026-10-18 10:02:47
+"""
+import threading
+from collections import deque
+from typing import Deque, Dict, List, Optional, Callable
+
+from langchain_core.tools import BaseTool
+
+from llmcompiler.graph.output_parser import Task
+
+
+class ToolLatency:
+    """
+    进程级共享的Tool历史耗时统计，每个Tool保留最近`window`次调用的耗时（秒）
+    """
+
+    def __init__(self, window: int = 200, default: float = 1.0):
+        """
+        :param window: 每个Tool保留的耗时样本数量
+        :param default: 没有历史耗时的Tool使用的默认耗时
+        """
+        self.window = window
+        self.default = default
+        self._samples: Dict[str, Deque[float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, tool_name: str, seconds: float):
+        with self._lock:
+            samples = self._samples.get(tool_name)
+            if samples is None:
+                samples = self._samples[tool_name] = deque(maxlen=self.window)
+            samples.append(seconds)
+
+    def mean(self, tool_name: str) -> float:
+        """平均耗时，没有历史耗时返回默认值"""
+        with self._lock:
+            samples = self._samples.get(tool_name)
+            if not samples:
+                return self.default
+            return sum(samples) / len(samples)
+
+    def count(self, tool_name: str) -> int:
+        """耗时样本数量"""
+        with self._lock:
+            return len(self._samples.get(tool_name, ()))
+
+    def percentile(self, tool_name: str, q: float) -> Optional[float]:
+        """耗时分位数，`q`取值范围为0~100，没有历史耗时返回`None`"""
+        with self._lock:
+            samples = self._samples.get(tool_name)
+            if not samples:
+                return None
+            ordered = sorted(samples)
+        index = min(len(ordered) - 1, max(0, int(round(q / 100 * (len(ordered) - 1)))))
+        return ordered[index]
+
+    def clear(self, tool_name: str = None):
+        with self._lock:
+            if tool_name is None:
+                self._samples.clear()
+            else:
+                self._samples.pop(tool_name, None)
+
+
+TOOL_LATENCY = ToolLatency()
+
+
+def task_cost(task: Task, latency: ToolLatency = TOOL_LATENCY) -> float:
+    """TASK的预估耗时：`join`不调用Tool，耗时为0"""
+    tool = task["tool"]
+    if isinstance(tool, BaseTool):
+        return latency.mean(tool.name)
+    return 0.0
+
+
+class CriticalPath:
+    """
+    维护每个TASK的剩余关键路径长度：TASK自身预估耗时 + 下游TASK中最长的剩余关键路径。
+    流式生成计划时下游TASK陆续到达，新TASK加入后沿依赖向上更新上游TASK的剩余关键路径，
+    剩余关键路径越长的就绪TASK越优先执行。
+    """
+
+    def __init__(self, latency: ToolLatency = TOOL_LATENCY,
+                 on_update: Optional[Callable[[int, float], None]] = None):
+        """
+        :param on_update: 上游TASK的剩余关键路径变长时回调，参数为TASK ID和新的剩余关键路径长度
+        """
+        self.latency = latency
+        self.on_update = on_update
+        self._cost: Dict[int, float] = {}
+        self._remaining: Dict[int, float] = {}
+        self._dependencies: Dict[int, List[int]] = {}
+
+    def add(self, task: Task) -> float:
+        """加入TASK并返回其剩余关键路径长度"""
+        idx = task["idx"]
+        cost = task_cost(task, self.latency)
+        self._cost[idx] = cost
+        self._dependencies[idx] = list(task["dependencies"])
+        self._remaining[idx] = max(self._remaining.get(idx, 0.0), cost)
+        self._propagate(idx)
+        return self._remaining[idx]
+
+    def remaining(self, idx: int) -> float:
+        return self._remaining.get(idx, 0.0)
+
+    def _propagate(self, idx: int):
+        stack = [idx]
+        while stack:
+            current = stack.pop()
+            for dep in self._dependencies.get(current, []):
+                if dep not in self._cost:
+                    # 依赖来自之前的计划，已经执行完成
+                    continue
+                candidate = self._cost[dep] + self._remaining[current]
+                if candidate > self._remaining.get(dep, 0.0):
+                    self._remaining[dep] = candidate
+                    if self.on_update is not None:
+                        self.on_update(dep, candidate)
+                    stack.append(dep)
@@ -6,6 +6,7 @@
 """
 import re
 import logging
+import functools
 from langchain_core.language_models import BaseLanguageModel
 from langchain_core.tools import BaseTool
 from langchain_core.utils.json import parse_json_markdown
@@ -15,7 +16,7 @@ from langchain_core.outputs import Generation
 from langchain_core.prompts import ChatPromptTemplate, SystemMessagePromptTemplate, PromptTemplate, MessagesPlaceholder
 from pydantic import BaseModel, Field
 from langchain_core.messages import AIMessage, ChatMessage
-from typing import List, Union, Sequence, Any
+from typing import List, Union, Sequence, Any, Tuple
 from langchain_core.runnables import RunnableLambda
 
 from langchain_core.messages import (
@@ -26,9 +27,10 @@ from langchain_core.messages import (
 
 from llmcompiler.graph.prompt import JOINER_SYSTEM_PROMPT_1, JOINER_SYSTEM_PROMPT_2, JOINER_RESPONSE_HUMAN_TEMPLATE
 from llmcompiler.utils.date.date import formatted_dt_now
-from llmcompiler.utils.prompt.prompt import get_custom_or_default
+from llmcompiler.utils.prompt.prompt import get_custom_or_default, custom_prompts_key
 from llmcompiler.utils.string.question_trim import extract_json_dict
 from llmcompiler.graph.token_calculate import SwitchLLM, auto_switch_llm
+from llmcompiler.tools.tool_index import ToolIndex, tool_index
 
 
 class FinalResponse(BaseModel):
@@ -50,6 +52,40 @@ class JoinOutputs(BaseModel):
     action: Union[FinalResponse, Replan]
 
 
+@functools.lru_cache(maxsize=32)
+def joiner_prompt(tools: ToolIndex, prompts: Tuple[Tuple[str, str], ...] = ()) -> Tuple[ChatPromptTemplate, str]:
+    """
+    Joiner的提示词与其中的Tool描述，按Tool列表与自定义提示词缓存，当前时间在每次生成提示词时获取
+    :param prompts: 自定义提示词`(name, template)`
+    """
+    custom_prompts = dict(prompts)
+    joiner_system_prompt_1 = get_custom_or_default(custom_prompts, "JOINER_SYSTEM_PROMPT_1",
+                                                   JOINER_SYSTEM_PROMPT_1)
+    joiner_system_prompt_2 = get_custom_or_default(custom_prompts, "JOINER_SYSTEM_PROMPT_2",
+                                                   JOINER_SYSTEM_PROMPT_2)
+    PROMPT = ChatPromptTemplate.from_messages(
+        [
+            SystemMessagePromptTemplate(
+                prompt=PromptTemplate(input_variables=[], template=joiner_system_prompt_1)),
+            MessagesPlaceholder(variable_name='messages'),
+            SystemMessagePromptTemplate(
+                prompt=PromptTemplate(input_variables=[], template=joiner_system_prompt_2)),
+        ]
+    )
+    # print(PROMPT.pretty_print())
+    tool_descriptions = "\n".join(
+        f"{i + 1}. {tool.name}: {tool.description} args: {str(tool.args)}\n"
+        for
+        i, tool in enumerate(tools)
+        # +1 to offset the 0 starting index, we want it count normally from 1.
+    )
+    prompt = PROMPT.partial(
+        tools=tool_descriptions,
+        formatted_dt_now=formatted_dt_now
+    )  # You can optionally add examples
+    return prompt, tool_descriptions
+
+
 class Joiner:
     """
     Joiner: Responds to the user or triggers a second plan
@@ -63,32 +99,10 @@ class Joiner:
         self.custom_prompts = custom_prompts
 
     def init(self, messages: dict[str, list[BaseMessage]]):
-        joiner_system_prompt_1 = get_custom_or_default(self.custom_prompts, "JOINER_SYSTEM_PROMPT_1",
-                                                       JOINER_SYSTEM_PROMPT_1)
-        joiner_system_prompt_2 = get_custom_or_default(self.custom_prompts, "JOINER_SYSTEM_PROMPT_2",
-                                                       JOINER_SYSTEM_PROMPT_2)
-        PROMPT = ChatPromptTemplate.from_messages(
-            [
-                SystemMessagePromptTemplate(
-                    prompt=PromptTemplate(input_variables=[], template=joiner_system_prompt_1)),
-                MessagesPlaceholder(variable_name='messages'),
-                SystemMessagePromptTemplate(
-                    prompt=PromptTemplate(input_variables=[], template=joiner_system_prompt_2)),
-            ]
-        )
-        # print(PROMPT.pretty_print())
-        tool_descriptions = "\n".join(
-            f"{i + 1}. {tool.name}: {tool.description} args: {str(tool.args)}\n"
-            for
-            i, tool in enumerate(self.tools)
-            # +1 to offset the 0 starting index, we want it count normally from 1.
-        )
-        prompt = PROMPT.partial(
-            tools=tool_descriptions,
-            formatted_dt_now=formatted_dt_now()
-        )  # You can optionally add examples
+        prompt, tool_descriptions = joiner_prompt(tool_index(self.tools), custom_prompts_key(self.custom_prompts))
         messages = self.select_recent_messages(messages)
-        llm = auto_switch_llm(self.llm, [prompt, messages])
+        # 消息转为文本计算Token时Tool描述中的换行等字符被转义
+        llm = auto_switch_llm(self.llm, [prompt, messages], (repr(tool_descriptions)[1:-1],))
         chain = prompt | llm | RunnableLambda(JoinerParser(self.tools).parse_result)
         response = chain.invoke(messages)
         return {"messages": response}
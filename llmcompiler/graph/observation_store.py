@@ -0,0 +1,241 @@
+# -*- coding: utf-8 -*-
+"""
+@Author  : Yc-Ma
+@Desc    : Memory-bounded observation store spilling to memory-mapped files.
+@Time    : 2026-10-18 16:37:12
+"""
+import os
+import sys
+import mmap
+import shutil
+import pickle
+import struct
+import logging
+import tempfile
+import threading
+import weakref
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, MutableMapping, Optional
+
+import numpy as np
+import pandas as pd
+from pydantic import BaseModel
+
+logger = logging.getLogger(__name__)
+
+# 默认内存预算与参与落盘的最小结果大小
+DEFAULT_OBSERVATION_BUDGET = 256 * 1024 * 1024
+DEFAULT_MIN_SPILL_BYTES = 1024 * 1024
+
+# 估算列表、字典大小时抽样的元素数量
+_SAMPLE_SIZE = 16
+_HEADER = struct.Struct("<Q")
+
+
+def estimate_size(value: Any, depth: int = 0) -> int:
+    """
+    估算结果占用的内存字节数：DataFrame与数组按数据大小计算，较长的列表、字典按抽样元素的平均大小计算
+    """
+    if depth > 8:
+        return sys.getsizeof(value)
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=False).sum())
+    if isinstance(value, (pd.Series, pd.Index)):
+        return int(value.memory_usage(deep=False))
+    if isinstance(value, np.ndarray):
+        return int(value.nbytes)
+    if isinstance(value, (str, bytes, bytearray)):
+        return sys.getsizeof(value)
+    if isinstance(value, BaseModel):
+        return sys.getsizeof(value) + estimate_size(value.__dict__, depth + 1)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + _sampled_size(list(value.items()), depth)
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return sys.getsizeof(value) + _sampled_size(list(value), depth)
+    return sys.getsizeof(value)
+
+
+def _sampled_size(items: list, depth: int) -> int:
+    if not items:
+        return 0
+    step = max(1, len(items) // _SAMPLE_SIZE)
+    sample = items[::step][:_SAMPLE_SIZE]
+    total = 0
+    for item in sample:
+        if isinstance(item, tuple) and len(item) == 2:
+            total += estimate_size(item[0], depth + 1) + estimate_size(item[1], depth + 1)
+        else:
+            total += estimate_size(item, depth + 1)
+    return total * len(items) // len(sample)
+
+
+def dump_spill(path: str, value: Any):
+    """
+    使用pickle协议5写入文件：对象结构在前，DataFrame、数组等的数据缓冲区按原始字节依次写在后面，
+    读取时缓冲区直接引用内存映射，不需要反序列化拷贝
+    """
+    buffers = []
+    payload = pickle.dumps(value, protocol=5, buffer_callback=buffers.append)
+    with open(path, "wb") as f:
+        f.write(_HEADER.pack(len(buffers)))
+        f.write(_HEADER.pack(len(payload)))
+        f.write(payload)
+        for buffer in buffers:
+            raw = buffer.raw()
+            f.write(_HEADER.pack(raw.nbytes))
+            f.write(raw)
+
+
+def load_spill(path: str) -> Any:
+    """读取`dump_spill`写入的文件，数据缓冲区以写时复制方式映射，修改不会写回文件"""
+    with open(path, "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+    view = memoryview(mapped)
+    (count,) = _HEADER.unpack_from(view, 0)
+    (size,) = _HEADER.unpack_from(view, _HEADER.size)
+    offset = _HEADER.size * 2
+    payload = view[offset:offset + size]
+    offset += size
+    buffers = []
+    for _ in range(count):
+        (length,) = _HEADER.unpack_from(view, offset)
+        offset += _HEADER.size
+        buffers.append(view[offset:offset + length])
+        offset += length
+    return pickle.loads(payload, buffers=buffers)
+
+
+class ObservationStore(MutableMapping[int, Any]):
+    """
+    有内存预算的TASK结果存储，兼容原有`observations`字典的用法。
+    内存中的结果超过预算时，按最久未访问的顺序将较大的结果写入临时目录并释放内存，被再次读取时从内存映射文件恢复。
+    无法序列化的结果始终保留在内存中。
+    """
+
+    def __init__(self, budget: int = DEFAULT_OBSERVATION_BUDGET, min_spill_bytes: int = DEFAULT_MIN_SPILL_BYTES,
+                 spill_dir: Optional[str] = None):
+        """
+        :param budget: 内存中结果的字节数上限（估算值）
+        :param min_spill_bytes: 小于该大小的结果不落盘
+        :param spill_dir: 落盘目录的父目录，默认使用系统临时目录
+        """
+        self.budget = budget
+        self.min_spill_bytes = min_spill_bytes
+        self.spill_dir = spill_dir
+        self._memory: "OrderedDict[int, Any]" = OrderedDict()
+        self._sizes: Dict[int, int] = {}
+        self._spilled: Dict[int, str] = {}
+        self._unspillable = set()
+        self._used = 0
+        self._directory: Optional[str] = None
+        self._finalizer = None
+        self._lock = threading.RLock()
+
+    @property
+    def memory_bytes(self) -> int:
+        """内存中结果的估算字节数"""
+        return self._used
+
+    def spilled(self, key: int) -> bool:
+        """结果是否已经落盘且不在内存中"""
+        with self._lock:
+            return key in self._spilled and key not in self._memory
+
+    def __setitem__(self, key: int, value: Any):
+        with self._lock:
+            self._discard(key)
+            self._remember(key, value, estimate_size(value))
+            self._shrink()
+
+    def __getitem__(self, key: int) -> Any:
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key]
+            path = self._spilled[key]
+            value = load_spill(path)
+            # 文件保留到结果被删除，再次落盘时不需要重新写入
+            self._remember(key, value, self._sizes[key])
+            self._shrink(keep=key)
+            return value
+
+    def __delitem__(self, key: int):
+        with self._lock:
+            if key not in self._memory and key not in self._spilled:
+                raise KeyError(key)
+            self._discard(key)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._memory or key in self._spilled
+
+    def __iter__(self) -> Iterator[int]:
+        with self._lock:
+            keys = list(self._memory)
+            keys.extend(key for key in self._spilled if key not in self._memory)
+        return iter(keys)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._memory) + len([key for key in self._spilled if key not in self._memory])
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._sizes.clear()
+            self._spilled.clear()
+            self._unspillable.clear()
+            self._used = 0
+            if self._finalizer is not None:
+                self._finalizer()
+                self._finalizer = None
+                self._directory = None
+
+    def _remember(self, key: int, value: Any, size: int):
+        self._memory[key] = value
+        self._sizes[key] = size
+        self._used += size
+
+    def _discard(self, key: int):
+        if key in self._memory:
+            del self._memory[key]
+            self._used -= self._sizes[key]
+        self._sizes.pop(key, None)
+        self._unspillable.discard(key)
+        path = self._spilled.pop(key, None)
+        if path is not None:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _shrink(self, keep: Optional[int] = None):
+        """按最久未访问的顺序落盘，直到内存中的结果不超过预算"""
+        if self._used <= self.budget:
+            return
+        for key in list(self._memory):
+            if self._used <= self.budget:
+                break
+            if key == keep or key in self._unspillable or self._sizes[key] < self.min_spill_bytes:
+                continue
+            if key not in self._spilled and not self._spill(key):
+                continue
+            del self._memory[key]
+            self._used -= self._sizes[key]
+
+    def _spill(self, key: int) -> bool:
+        path = os.path.join(self._ensure_directory(), f"{key}.pkl")
+        try:
+            dump_spill(path, self._memory[key])
+        except Exception as e:
+            logger.warning(f"Observation {key} can not be spilled to disk: {repr(e)}")
+            self._unspillable.add(key)
+            return False
+        self._spilled[key] = path
+        return True
+
+    def _ensure_directory(self) -> str:
+        if self._directory is None:
+            self._directory = tempfile.mkdtemp(prefix="llmcompiler-observations-", dir=self.spill_dir)
+            # 存储被回收或进程退出时删除落盘目录
+            self._finalizer = weakref.finalize(self, shutil.rmtree, self._directory, True)
+        return self._directory
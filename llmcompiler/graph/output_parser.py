@@ -9,11 +9,15 @@ import re
 import logging
 from typing import (
     Any,
+    AsyncIterator,
+    Collection,
     Dict,
     Iterator,
     List,
+    NamedTuple,
     Optional,
     Sequence,
+    Set,
     Tuple,
     Union,
 )
@@ -23,13 +27,15 @@ from langchain_core.runnables import RunnableConfig
 from langchain_core.tools import BaseTool
 from typing_extensions import TypedDict
 
-from llmcompiler.service.status import init_base_call_tools
+from llmcompiler.graph.arg_resolver import CompiledArgs, compile_args
+from llmcompiler.tools.tool_index import tool_index
 
 THOUGHT_PATTERN = r"Thought: ([^\n]*)"
 ACTION_PATTERN = r"\n*(\d+)\. (\w+)\((.*)\)(\s*#\w+\n)?"
 # $1 or ${1} -> 1
 ID_PATTERN = r"\$\{?(\d+)\}?"
 ID_PATTERN_V2 = r"\$\{(\d+)\}|\{(\d+)\}|\$(\d+)"
+_ID_REGEX = re.compile(ID_PATTERN)
 END_OF_PLAN = "<END_OF_PLAN>"
 
 
@@ -43,62 +49,78 @@ def _ast_parse(arg: str) -> Any:
         return arg
 
 
+class ActionArg(NamedTuple):
+    """Tool调用中的一个参数：参数名、字面量（无法解析为字面量时为原文）"""
+    key: str
+    value: Any
+
+
+_QUOTES = "\"'"
+# 引号只在值或元素开始处开启字符串，例如`query=O'Neil fund`中的`'`属于值本身
+_VALUE_STARTS = "=,([{:"
+_KEY_REGEX = re.compile(r"\s*(\w+)\s*=(?!=)")
+_OPENERS = "([{"
+_CLOSERS = ")]}"
+
+
+def lex_action_args(args: str, keys: Collection[str]) -> List[ActionArg]:
+    """
+    一次扫描`k=v, ...`形式的参数：引号内以及嵌套的列表、字典、元组中的逗号不分割参数，引号只在值或元素开始处开启字符串；
+    以`keys`中的参数名加`=`开始的片段是新参数，其它片段（例如值中未加引号的`, x=`）属于前一个参数，
+    第一个参数之前的内容被忽略；未配对的`)`表示调用结束
+    """
+    segments: List[Tuple[int, int]] = []
+    depth, quote, escaped, start, end = 0, None, False, 0, len(args)
+    # 引号外上一个非空白字符
+    prev = None
+    for i, char in enumerate(args):
+        if quote is not None:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == quote:
+                quote, prev = None, char
+            continue
+        if char.isspace():
+            continue
+        last, prev = prev, char
+        if char in _QUOTES and (last is None or last in _VALUE_STARTS):
+            quote = char
+        elif char in _OPENERS:
+            depth += 1
+        elif char in _CLOSERS:
+            if depth:
+                depth -= 1
+            elif char == ")":
+                end = i
+                break
+        elif char == "," and not depth:
+            segments.append((start, i))
+            start = i + 1
+    segments.append((start, end))
+
+    # 参数名、值的开始与结束位置
+    spans: List[List[Any]] = []
+    for seg_start, seg_end in segments:
+        match = _KEY_REGEX.match(args, seg_start, seg_end)
+        if match and match.group(1) in keys:
+            spans.append([match.group(1), match.end(), seg_end])
+        elif spans and args[seg_start:seg_end].strip():
+            spans[-1][2] = seg_end
+    action_args = []
+    for key, value_start, value_end in spans:
+        action_args.append(ActionArg(key, _ast_parse(args[value_start:value_end].strip())))
+    return action_args
+
+
 def _parse_llm_compiler_action_args(args: str, tool: Union[str, BaseTool]) -> Union[str, Dict, Tuple]:
     """Parse arguments from a string."""
     if args == "":
         return ()
     if isinstance(tool, str):
         return ()
-    extracted_args = {}
-    tool_key = None
-    prev_idx = None
-    sort_keys = _sort_keys(args, list(tool.args.keys()))
-    for key in sort_keys:
-        # Split if present
-        if f"{key}=" in args:
-            idx = args.index(f"{key}=")
-            if prev_idx is not None:
-                extracted_args[tool_key] = _ast_parse(
-                    args[prev_idx:idx].strip().rstrip(",")
-                )
-            args = args.split(f"{key}=", 1)[1]
-            tool_key = key
-            prev_idx = 0
-    if prev_idx is not None:
-        extracted_args[tool_key] = _ast_parse(
-            args[prev_idx:].strip().rstrip(",").rstrip(")")
-        )
-    return extracted_args
-
-
-def _sort_keys(text: str, keys: List[str]) -> List[str]:
-    """按照KEY包含的顺序排序KEYS"""
-
-    def sort_key(key):
-        try:
-            return text.index(key)
-        except ValueError:
-            return float('inf')
-
-    sorted_keys_v1 = sorted(keys, key=sort_key)
-    sorted_keys_v2 = _custom_sort(sorted_keys_v1)
-    return sorted_keys_v2
-
-
-def _custom_sort(fields):
-    """根据字段被包含关系对列表进行排序"""
-    sorted_fields = []
-    while fields:
-        for field in fields:
-            if all(not _filed_contains(other, field) for other in fields if other != field):
-                sorted_fields.append(field)
-                fields.remove(field)
-                break
-    return sorted_fields
-
-
-def _filed_contains(a, b):
-    return b in a
+    return {arg.key: arg.value for arg in lex_action_args(args, tool.args)}
 
 
 def default_dependency_rule(idx, args: str):
@@ -115,13 +137,23 @@ def default_dependency_rule_v2(idx, args: str):
     return idx in numbers
 
 
+def referenced_task_ids(args: str) -> Set[int]:
+    """参数中引用的全部TASK ID，只扫描一遍参数"""
+    return {int(match) for match in _ID_REGEX.findall(args)}
+
+
 def _get_dependencies_from_graph(
         idx: int, tool_name: str, args: Dict[str, Any]
 ) -> list[int]:
     """Get dependencies from a graph."""
     if tool_name == "join":
         return list(range(1, idx))
-    return [i for i in range(1, idx) if default_dependency_rule(i, str(args))]
+    referenced = referenced_task_ids(str(args))
+    # 只能依赖之前的TASK，引用自身或之后TASK的占位符不构成依赖
+    invalid = sorted(i for i in referenced if not 0 < i < idx)
+    if invalid:
+        logging.warning(f"Task {idx} references tasks {invalid} that are not planned before it.")
+    return sorted(i for i in referenced if 0 < i < idx)
 
 
 class Task(TypedDict):
@@ -130,6 +162,10 @@ class Task(TypedDict):
     args: Union[str, Dict]
     dependencies: List[int]
     thought: Optional[str]
+    # 解析计划时编译的参数解析程序
+    programs: Optional[CompiledArgs]
+    # 执行时解析后的参数，设置了会话检查点时随TASK结果写入检查点
+    resolved_args: Optional[Any]
 
 
 def instantiate_task(
@@ -143,9 +179,8 @@ def instantiate_task(
     if tool_name == "join":
         tool = "join"
     else:
-        try:
-            tool = tools[[tool.name for tool in tools].index(tool_name)]
-        except ValueError:
+        tool = tool_index(tools).get(tool_name)
+        if tool is None:
             logging.error(f"Tool <{tool_name}> not found.")
             # raise OutputParserException(f"Tool {tool_name} not found.") from e
     if tool is not None:
@@ -157,39 +192,169 @@ def instantiate_task(
             args=tool_args,
             dependencies=dependencies,
             thought=thought,
+            programs=compile_args(tool, tool_args),
         )
         return task
 
 
+# 增量解析状态：行首、TASK编号、编号后的`.`、`.`后的空格、Tool名称、参数、TASK之后的内容、其它行
+_HEAD, _INDEX, _DOT, _GAP, _NAME, _CALL, _TAIL, _OTHER = range(8)
+
+
+class PlanStreamParser:
+    """
+    计划的增量解析器：逐字符识别`N. tool(args)`，参数的括号配对完成时立即生成TASK，不必等待换行；
+    引号中的括号不参与配对，每个字符只处理一次。
+    括号在行尾仍未配对的行（以及`Thought: `等其它行）在换行时按正则整行解析，与逐行解析的结果一致。
+    """
+
+    def __init__(self, tools: Sequence[BaseTool], parse_line=None):
+        """
+        :param parse_line: 整行解析函数`(line, thought) -> (task, thought)`
+        """
+        self.tools = tool_index(tools)
+        self.parse_line = parse_line
+        self.thought: Optional[str] = None
+        # 生成的Tool TASK名称
+        self.tool_names: List[str] = []
+        self._line: List[str] = []
+        self._reset()
+
+    def _reset(self):
+        self._state = _HEAD
+        self._index: List[str] = []
+        self._name: List[str] = []
+        self._args: List[str] = []
+        self._depth = 0
+        self._quote: Optional[str] = None
+        self._escaped = False
+        # 参数中引号外上一个非空白字符，参数从`(`之后开始
+        self._prev = "("
+        self._line.clear()
+
+    def feed(self, text: str) -> Iterator[Task]:
+        for char in text:
+            task = self._end_line() if char == "\n" else self._step(char)
+            if task is not None:
+                yield task
+
+    def close(self) -> Iterator[Task]:
+        """输入结束，最后一行按换行处理"""
+        task = self._end_line()
+        if task is not None:
+            yield task
+
+    def _step(self, char: str) -> Optional[Task]:
+        self._line.append(char)
+        state = self._state
+        if state == _CALL:
+            return self._call_char(char)
+        if state == _TAIL or state == _OTHER:
+            return None
+        if state == _HEAD:
+            if char.isdigit():
+                self._index.append(char)
+                self._state = _INDEX
+            elif not char.isspace():
+                self._state = _OTHER
+        elif state == _INDEX:
+            if char.isdigit():
+                self._index.append(char)
+            else:
+                self._state = _DOT if char == "." else _OTHER
+        elif state == _DOT:
+            self._state = _GAP if char == " " else _OTHER
+        elif state == _GAP:
+            if char.isalnum() or char == "_":
+                self._name.append(char)
+                self._state = _NAME
+            elif char != " ":
+                self._state = _OTHER
+        elif state == _NAME:
+            if char.isalnum() or char == "_":
+                self._name.append(char)
+            elif char == "(":
+                self._depth = 1
+                self._state = _CALL
+            else:
+                self._state = _OTHER
+        return None
+
+    def _call_char(self, char: str) -> Optional[Task]:
+        if self._quote is not None:
+            if self._escaped:
+                self._escaped = False
+            elif char == "\\":
+                self._escaped = True
+            elif char == self._quote:
+                self._quote = None
+                self._prev = char
+            self._args.append(char)
+            return None
+        if char.isspace():
+            self._args.append(char)
+            return None
+        last, self._prev = self._prev, char
+        if char in _QUOTES and last in _VALUE_STARTS:
+            self._quote = char
+        elif char == "(":
+            self._depth += 1
+        elif char == ")":
+            self._depth -= 1
+            if self._depth == 0:
+                self._state = _TAIL
+                return self._emit()
+        self._args.append(char)
+        return None
+
+    def _emit(self) -> Optional[Task]:
+        task = instantiate_task(tools=self.tools, idx=int("".join(self._index)), tool_name="".join(self._name),
+                                args="".join(self._args), thought=self.thought)
+        self.thought = None
+        if task is not None and isinstance(task["tool"], BaseTool):
+            self.tool_names.append(task["tool"].name)
+        return task
+
+    def _end_line(self) -> Optional[Task]:
+        task = None
+        if self._state != _TAIL and self._line:
+            task, self.thought = self.parse_line("".join(self._line), self.thought)
+            if task is not None and isinstance(task["tool"], BaseTool):
+                self.tool_names.append(task["tool"].name)
+        self._reset()
+        return task
+
+
 class LLMCompilerPlanParser(BaseTransformOutputParser[dict], extra="allow"):
     """Planning output parser."""
 
     tools: List[BaseTool]
-    # 任务编号初始值
-    task_num: int = 0
 
     def __init__(self, **kwargs: Any):
         super().__init__(**kwargs)
+        self._tool_index = tool_index(self.tools)
 
     def _transform(self, input: Iterator[Union[str, BaseMessage]]) -> Iterator[Task]:
-        texts = []
-        # TODO: Cleanup tuple state tracking here.
-        thought = None
+        parser = PlanStreamParser(self._tool_index, self._parse_task)
         print("================================ Planer Compiler ================================")
         for chunk in input:
             # Assume input is str. TODO: support vision/other formats
             text = chunk if isinstance(chunk, str) else str(chunk.content)
-            base_call_tools = init_base_call_tools(text=text, tools=self.tools)
-            if base_call_tools.count() > 0:
-                # 流式输出时不打印该日志
-                print(','.join([tb.tool_name for tb in base_call_tools.call_status]))
-            for task, thought in self.ingest_token(text, texts, thought):
-                yield task
+            yield from parser.feed(text)
         # Final possible task
-        if texts:
-            task, _ = self._parse_task("".join(texts), thought)
-            if task:
+        yield from parser.close()
+        self._print_tool_names(parser)
+
+    async def _atransform(self, input: AsyncIterator[Union[str, BaseMessage]]) -> AsyncIterator[Task]:
+        parser = PlanStreamParser(self._tool_index, self._parse_task)
+        print("================================ Planer Compiler ================================")
+        async for chunk in input:
+            text = chunk if isinstance(chunk, str) else str(chunk.content)
+            for task in parser.feed(text):
                 yield task
+        for task in parser.close():
+            yield task
+        self._print_tool_names(parser)
 
     def parse(self, text: str) -> List[Task]:
         tasks = list(self._transform([text]))
@@ -203,33 +368,11 @@ class LLMCompilerPlanParser(BaseTransformOutputParser[dict], extra="allow"):
     ) -> Iterator[Task]:
         yield from self.transform([input], config, **kwargs)
 
-    def ingest_token(
-            self, token: str, buffer: List[str], thought: Optional[str]
-    ) -> Iterator[Tuple[Optional[Task], str]]:
-        buffer.append(token)
-        if "\n" in token:
-            buffer_ = "".join(buffer).split("\n")
-            suffix = buffer_[-1]
-            for line in buffer_[:-1]:
-                task, thought = self._parse_task(line, thought)
-                if task:
-                    yield task, thought
-            self._init_task_num()
-            buffer.clear()
-            buffer.append(suffix)
-
-    def _task_num(self) -> int:
-        """
-        获取TASK编号，累加后返回【任务编号使用要与参数替换`$*`结合起来】
-        """
-        self.task_num += 1
-        return self.task_num
-
-    def _init_task_num(self):
-        """
-        初始化任务编号
-        """
-        self.task_num = 0
+    @staticmethod
+    def _print_tool_names(parser: PlanStreamParser):
+        """计划解析完成后打印调用的Tool"""
+        if parser.tool_names:
+            print(','.join(parser.tool_names))
 
     def _parse_task(self, line: str, thought: Optional[str] = None):
         task = None
@@ -242,7 +385,7 @@ class LLMCompilerPlanParser(BaseTransformOutputParser[dict], extra="allow"):
             idx, tool_name, args, _ = match.groups()
             idx = int(idx)
             task = instantiate_task(
-                tools=self.tools,
+                tools=self._tool_index,
                 idx=idx,
                 tool_name=tool_name,
                 args=args,
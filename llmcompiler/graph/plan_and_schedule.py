@@ -5,12 +5,17 @@
 @Time    : 2024-08-02 09:30:49
 """
 import json
-import re
-import time
+import hashlib
+import asyncio
 import logging
 import itertools
-from typing import Sequence, Tuple, Optional
-from concurrent.futures import ThreadPoolExecutor, wait
+import time
+import threading
+import uuid
+import functools
+from collections import ChainMap
+from concurrent.futures import Future, CancelledError, wait, FIRST_COMPLETED
+from typing import Sequence, Tuple, Optional, Set, Hashable, MutableMapping
 
 from langchain_core.prompts import PromptTemplate
 from langchain_core.runnables.graph import Graph, Node, Edge
@@ -21,22 +26,50 @@ from langchain_core.messages import (
 )
 
 from llmcompiler.graph.planner import Planer
+from llmcompiler.graph.critical_path import CriticalPath, TOOL_LATENCY
 from llmcompiler.graph.output_parser import Task
-from typing import Any, Union, Iterable, List, Dict
+from llmcompiler.graph.arg_resolver import ResolveContext, compile_args
+from llmcompiler.graph.task_registry import TaskRegistry
+from llmcompiler.graph.plan_validation import topological_levels
+from llmcompiler.graph.checkpoint import CheckpointStore, TaskCheckpoint, TaskRecord, task_checkpoint, \
+    with_task_checkpoint
+from llmcompiler.graph.observation_store import ObservationStore, DEFAULT_OBSERVATION_BUDGET
+from llmcompiler.graph.task_events import TaskResultEvent, observation_status, output_charts, task_result_event, \
+    task_result_publisher, TASK_SUCCESS
+from typing import Any, Union, Iterable, AsyncIterable, List, Dict
 from typing_extensions import TypedDict
 from langchain_core.runnables import (
     chain as as_runnable, RunnableConfig,
 )
+from langchain_core.runnables.config import run_in_executor, patch_config
 
 from llmcompiler.graph.prompt import TOOL_MESSAGE_TEMPLATE
 from llmcompiler.graph.tool_message import ToolMessage
-from llmcompiler.tools.dag.dag_flow_params import DISABLE_RESOLVED_ARGS, PARTIAL_RESOLVED_ARGS_PARSE, \
-    RESOLVED_RAGS_DEPENDENCY_VAR
-from llmcompiler.tools.generic.action_output import ActionOutput, ActionOutputError, Chart, DAGFlow, BaseChart
-from llmcompiler.utils.string.string_sim import word_similarity_score
+from llmcompiler.tools.dag.dag_flow_params import RESOLVED_RAGS_DEPENDENCY_VAR
+from llmcompiler.tools.basic import supports_batch
+from llmcompiler.tools.configure.tool_decorator import row_call_options, disable_row_call_output_fields
+from llmcompiler.tools.generic.action_output import ActionOutput, ActionOutputError, Chart, BaseChart, \
+    ActionOutputStream, concat_output
+from llmcompiler.tools.cache.tool_cache import get_tool_cache
+from llmcompiler.utils.thread.row_channel import RowChannel
+from llmcompiler.utils.thread.single_flight import SingleFlight
+from llmcompiler.utils.thread.deadline import request_deadline, remaining_time, with_cancel_event, call_cancelled
+from llmcompiler.utils.thread.execution_service import ExecutionService, get_execution_service, request_key, \
+    tool_quota_keys, TASK_LANE
+from llmcompiler.utils.thread.rate_limit import acquire_tool_rate, aacquire_tool_rate, tool_semaphore
+from llmcompiler.utils.thread.pool_executor import max_worker
+from llmcompiler.utils.thread.process_pool import ToolEnvelope, tool_envelope, run_in_process, submit_envelope
+from llmcompiler.utils.thread.broker import run_remotely
+from llmcompiler.tools.configure.retry_policy import call_with_retry, acall_with_retry
 from llmcompiler.graph.token_calculate import SwitchLLM
 
 
+# 幂等Tool的对冲调用：使用独立的执行通道，超过历史耗时的p95仍未返回时发起，至少需要的历史耗时样本数量
+HEDGE_LANE = "hedge"
+HEDGE_PERCENTILE = 95
+HEDGE_MIN_SAMPLES = 20
+
+
 def _get_observations(messages: List[BaseMessage]) -> Dict[int, Any]:
     # Get all previous tool responses
     results = {}
@@ -48,61 +81,134 @@ def _get_observations(messages: List[BaseMessage]) -> Dict[int, Any]:
 
 class SchedulerInput(TypedDict):
     messages: List[BaseMessage]
-    tasks: Iterable[Task]
+    tasks: Union[Iterable[Task], AsyncIterable[Task]]
     charts: List[Chart]
-    tasks_temporary_save: List[Task]
-    observations: Dict
+    tasks_temporary_save: Union[TaskRegistry, List[Task]]
+    observations: MutableMapping[int, Any]
     print_dag: bool
+    # 可选：请求内相同Tool调用去重，默认每次调度独立去重
+    single_flight: SingleFlight
 
 
-class ResolvedArgs(TypedDict):
-    """`resolved_args` dependency"""
-    dep_task: Task
-    output: ActionOutput
-    field: str
+def _execute_task(task, observations, config, charts: List[Chart], tasks_temporary_save: List[Task],
+                  single_flight: Optional[SingleFlight] = None, channel: Optional[RowChannel] = None,
+                  remember: bool = True):
+    """
+    :param remember: 是否记录调用结果对应的TASK，逐批执行的调用结果只是TASK结果的一部分，不能按TASK ID复用
+    """
+    tool_to_use = task["tool"]
+    if isinstance(tool_to_use, str):
+        _print_task(task)
+        return tool_to_use
+    args = task["args"]
+    # KEY为字段名，VALUE为依赖的信息，每个TASK独立解析，不同TASK之间互不影响
+    resolved_dependency: Dict[str, Any] = {}
+    try:
+        resolved_args = _resolve_task_args(task, observations, tasks_temporary_save, resolved_dependency)
+    except Exception as e:
+        return (
+            f"ERROR(Failed to call {tool_to_use.name} with args {args}.)"
+            f" Args could not be resolved. Error: {repr(e)}"
+        )
+    _checkpoint_resolved_args(config, task, resolved_args)
+    try:
+        _print_task(task, resolved_args)
+        # 判断父级TASK的输出，是否存在disable_row_call=true的参数，`__tasks__`
+        # 每个参数值来自哪个Tool、哪个字段。如果依赖的TOOL的OUTPUTSCHEMA使用了`DISABLE_ROW_CALL`参数则通过`RunnableConfig`将`resolved_dependency`传递到下游
+        config = _with_resolved_dependency(config, resolved_dependency)
+        if single_flight is not None:
+            # 相同的Tool调用只执行一次，重复的TASK复用第一次调用的结果
+            key = _single_flight_key(tool_to_use, resolved_args, resolved_dependency)
+            action_output = _completed_call(single_flight, key, observations)
+            if action_output is None:
+                action_output = single_flight.do(key, _cached_invoke_tool, tool_to_use, resolved_args, config,
+                                                 resolved_dependency, channel)
+                if remember:
+                    _remember_call(single_flight, key, task, action_output)
+        else:
+            action_output = _cached_invoke_tool(tool_to_use, resolved_args, config, resolved_dependency, channel)
+        stream_output_chart(action_output, charts)
+        return action_output
+    except Exception as e:
+        return (
+                f"ERROR(Failed to call {tool_to_use.name} with args {args}."
+                + f" Args resolved to {resolved_args}. Error: {repr(e)})"
+        )
 
 
-# RESOLVED_RAGS_DEPENDENCY KEY为字段名，VALUE为依赖的信息
-RESOLVED_RAGS_DEPENDENCY = {}
+def _execute_pipelined_task(task, observations, config, charts: List[Chart], tasks_temporary_save: List[Task],
+                            single_flight: Optional[SingleFlight], source: Tuple[int, RowChannel]):
+    """
+    上游TASK按批次产生结果时，下游按行调用的TASK逐批执行：每个批次作为上游TASK的结果解析参数并调用Tool，
+    全部批次执行完成后按行合并，与上游全部完成后一次调用的结果一致；
+    与按行调用相同，任意批次失败时整个TASK失败，返回第一个失败批次的错误
+    :param source: 上游TASK ID，以及上游TASK的批次通道
+    """
+    dep_idx, dep_channel = source
+    outputs = []
+    try:
+        for batch in dep_channel:
+            outputs.append(_execute_task(task, ChainMap({dep_idx: batch}, observations), config, charts,
+                                         tasks_temporary_save, single_flight, remember=False))
+    except Exception as e:
+        return (
+            f"ERROR(Failed to call {task['tool'].name} with args {task['args']}.)"
+            f" Task {dep_idx} failed while streaming results. Error: {repr(e)}"
+        )
+    failed = next((output for output in outputs if not _reusable_output(output)), None)
+    if failed is not None:
+        return failed
+    return concat_output(outputs, task["tool"].name)
+
+
+def _pipelinable(task: Task, dep_task: Optional[Task]) -> bool:
+    """
+    下游TASK能否在上游TASK按批次返回结果时逐批执行：
+    Tool按行调用、单值参数会填充到每一行、没有限制调用行数，且上游结果中没有禁止按行展开的字段；
+    上游Tool会重试或对冲调用时，已写入的批次可能来自失败的调用，下游TASK等待最终结果
+    """
+    options = row_call_options(task["tool"])
+    if options is None or options["limit"] > 0 or not options["fill_non_list_row"]:
+        return False
+    if dep_task is None:
+        return False
+    dep_tool = dep_task["tool"]
+    if getattr(dep_tool, "retry_policy", None) is not None or getattr(dep_tool, "idempotent", False):
+        return False
+    if options["detect_disable_row_call"] and disable_row_call_output_fields(dep_task["tool"]):
+        return False
+    return True
 
 
-def _execute_task(task, observations, config, charts: List[Chart], tasks_temporary_save: List[Task]):
+async def _aexecute_task(task, observations, config, charts: List[Chart], tasks_temporary_save: List[Task],
+                         single_flight: Optional[SingleFlight] = None):
+    """`_execute_task`的异步版本：使用`tool.ainvoke`调用Tool"""
     tool_to_use = task["tool"]
     if isinstance(tool_to_use, str):
         _print_task(task)
         return tool_to_use
     args = task["args"]
+    resolved_dependency: Dict[str, Any] = {}
     try:
-
-        # 每个TOOL的解析重置该变量
-        global RESOLVED_RAGS_DEPENDENCY
-        RESOLVED_RAGS_DEPENDENCY.clear()
-
-        if isinstance(args, str):
-            resolved_args = _resolve_arg(args, observations, task, tasks_temporary_save)
-        elif isinstance(args, dict):
-            args = _pre_args(args)
-            resolved_args = {
-                key: _resolve_arg(val, observations, task, tasks_temporary_save, key) for key, val in args.items()
-            }
-        else:
-            # This will likely fail
-            resolved_args = args
+        resolved_args = _resolve_task_args(task, observations, tasks_temporary_save, resolved_dependency)
     except Exception as e:
         return (
             f"ERROR(Failed to call {tool_to_use.name} with args {args}.)"
             f" Args could not be resolved. Error: {repr(e)}"
         )
+    _checkpoint_resolved_args(config, task, resolved_args)
     try:
         _print_task(task, resolved_args)
-        # 判断父级TASK的输出，是否存在disable_row_call=true的参数，`__tasks__`
-        # 每个参数值来自哪个Tool、哪个字段。如果依赖的TOOL的OUTPUTSCHEMA使用了`DISABLE_ROW_CALL`参数则将`RESOLVED_RAGS_DEPENDENCY`传递到下游
-        if RESOLVED_RAGS_DEPENDENCY:
-            tool_to_use.metadata = {RESOLVED_RAGS_DEPENDENCY_VAR: RESOLVED_RAGS_DEPENDENCY}
-        if resolved_args:
-            action_output = tool_to_use.invoke(resolved_args, config)
+        config = _with_resolved_dependency(config, resolved_dependency)
+        if single_flight is not None:
+            key = _single_flight_key(tool_to_use, resolved_args, resolved_dependency)
+            action_output = _completed_call(single_flight, key, observations)
+            if action_output is None:
+                action_output = await single_flight.ado(key, _acached_invoke_tool, tool_to_use, resolved_args,
+                                                        config, resolved_dependency)
+                _remember_call(single_flight, key, task, action_output)
         else:
-            action_output = tool_to_use._run()
+            action_output = await _acached_invoke_tool(tool_to_use, resolved_args, config, resolved_dependency)
         stream_output_chart(action_output, charts)
         return action_output
     except Exception as e:
@@ -112,56 +218,542 @@ def _execute_task(task, observations, config, charts: List[Chart], tasks_tempora
         )
 
 
-def _pre_args(args: Dict[str, Any]) -> Dict[str, Any]:
-    """参数预处理"""
-    new_args = {}
-    additional_args = {}
-
-    for key, value in args.items():
-        if isinstance(value, str):
-            parsed_result = _args_parse_dict(value)
-            if isinstance(parsed_result, Dict):
-                # 检查是否包含 '__value__' 并处理
-                if '__value__' in parsed_result:
-                    new_args[key] = parsed_result['__value__']
-                else:
-                    new_args[key] = None
-                # 拼接额外的 key-value 对
-                for k, v in parsed_result.items():
-                    if k != '__value__':
-                        additional_args[k] = v
+def _batchable(task: Task) -> bool:
+    """
+    TASK能否与同时就绪、调用同一Tool的其它TASK合并为一次`_run_batch`调用：
+    Tool实现了`_run_batch`、不按行调用，且在调度线程中执行（`execution="process"/"remote"`的Tool逐个发往工作进程）
+    """
+    tool_to_use = task["tool"]
+    return supports_batch(tool_to_use) and row_call_options(tool_to_use) is None \
+        and getattr(tool_to_use, "execution", "thread") == "thread"
+
+
+def _prepare_batch(tasks: List[Task], observations, tasks_temporary_save: List[Task], config: Optional[RunnableConfig],
+                   single_flight: Optional[SingleFlight] = None
+                   ) -> Tuple[Dict[int, Any], List[Dict[str, Any]], Dict[int, int], Dict[int, str],
+                              Dict[int, Tuple[Hashable, Future]], List[Task]]:
+    """
+    解析合并调用中每个TASK的参数：参数无法解析的TASK直接返回错误，命中结果缓存的TASK直接返回缓存结果，参数相同的TASK只调用一次；
+    与单独执行的TASK相同按调用去重：已完成的相同调用直接复用结果，相同调用正在执行时该TASK不参与合并调用，之后单独执行
+    :return: 已有结果的TASK、需要调用的参数列表、TASK ID到参数序号的映射、TASK ID到结果缓存KEY的映射、
+    TASK ID到登记的调用（去重KEY与Future）的映射、需要单独执行的TASK
+    """
+    tool_to_use = tasks[0]["tool"]
+    results: Dict[int, Any] = {}
+    batch_kwargs: List[Dict[str, Any]] = []
+    members: Dict[int, int] = {}
+    cache_keys: Dict[int, str] = {}
+    flights: Dict[int, Tuple[Hashable, Future]] = {}
+    deferred: List[Task] = []
+    positions: Dict[Tuple[str, str, str], int] = {}
+    for task in tasks:
+        idx = task["idx"]
+        resolved_dependency: Dict[str, Any] = {}
+        try:
+            resolved_args = _resolve_task_args(task, observations, tasks_temporary_save, resolved_dependency)
+        except Exception as e:
+            results[idx] = (
+                f"ERROR(Failed to call {tool_to_use.name} with args {task['args']}.)"
+                f" Args could not be resolved. Error: {repr(e)}"
+            )
+            continue
+        if single_flight is not None:
+            flight_key = _single_flight_key(tool_to_use, resolved_args, resolved_dependency)
+            action_output = _completed_call(single_flight, flight_key, observations)
+            if action_output is not None:
+                _checkpoint_resolved_args(config, task, resolved_args)
+                _print_task(task, resolved_args)
+                results[idx] = action_output
+                continue
+            if flight_key is not None:
+                future = single_flight.claim(flight_key)
+                if future is None:
+                    deferred.append(task)
+                    continue
+                flights[idx] = (flight_key, future)
+        _checkpoint_resolved_args(config, task, resolved_args)
+        _print_task(task, resolved_args)
+        try:
+            # 与`tool.invoke`相同，按`args_schema`校验参数并填充默认值
+            kwargs = tool_to_use._to_args_and_kwargs(resolved_args, None)[1] if resolved_args else {}
+        except Exception as e:
+            results[idx] = (
+                    f"ERROR(Failed to call {tool_to_use.name} with args {task['args']}."
+                    + f" Args resolved to {resolved_args}. Error: {repr(e)})"
+            )
+            continue
+        cache_key = _tool_cache_key(tool_to_use, resolved_args, resolved_dependency)
+        if cache_key is not None:
+            action_output = get_tool_cache().lookup(tool_to_use.name, cache_key)
+            if action_output is not None:
+                results[idx] = action_output
+                continue
+            cache_keys[idx] = cache_key
+        key = _single_flight_key(tool_to_use, kwargs, {})
+        if key is not None and key in positions:
+            members[idx] = positions[key]
+            continue
+        members[idx] = len(batch_kwargs)
+        if key is not None:
+            positions[key] = len(batch_kwargs)
+        batch_kwargs.append(kwargs)
+    return results, batch_kwargs, members, cache_keys, flights, deferred
+
+
+def _finish_batch(tasks: List[Task], results: Dict[int, Any], outputs: Union[List[Any], Exception],
+                  members: Dict[int, int], cache_keys: Dict[int, str], charts: List[Chart],
+                  single_flight: Optional[SingleFlight] = None,
+                  flights: Optional[Dict[int, Tuple[Hashable, Future]]] = None) -> Dict[int, Any]:
+    """
+    按TASK拆分合并调用的结果，调用成功的结果写入缓存；合并调用出错时每个参与调用的TASK都返回错误。
+    登记的调用在此完成，等待中的重复调用复用结果或重新执行
+    """
+    tool_to_use = tasks[0]["tool"]
+    for task in tasks:
+        idx = task["idx"]
+        if idx in members:
+            if isinstance(outputs, Exception):
+                results[idx] = (
+                    f"ERROR(Failed to call {tool_to_use.name} with args {task['args']}"
+                    f" in a batch of {len(tasks)} tasks. Error: {repr(outputs)})"
+                )
             else:
-                new_args[key] = parsed_result
+                results[idx] = outputs[members[idx]]
+                if idx in cache_keys and _reusable_output(results[idx]):
+                    get_tool_cache().set(tool_to_use.name, cache_keys[idx], results[idx], tool_to_use.cache_ttl)
+        if idx in (flights or {}):
+            flight_key, future = flights[idx]
+            _remember_call(single_flight, flight_key, task, results[idx])
+            single_flight.settle(flight_key, future, results[idx])
+        if idx in results:
+            stream_output_chart(results[idx], charts)
+    return results
+
+
+def _execute_batch(tasks: List[Task], observations, config, charts: List[Chart], tasks_temporary_save: List[Task],
+                   single_flight: Optional[SingleFlight] = None) -> Dict[int, Any]:
+    """合并执行调用同一Tool的多个TASK：一次`_run_batch`调用代替每个TASK各自调用，返回以TASK ID为KEY的结果"""
+    results, batch_kwargs, members, cache_keys, flights, deferred = _prepare_batch(
+        tasks, observations, tasks_temporary_save, config, single_flight)
+    outputs: Union[List[Any], Exception] = []
+    if batch_kwargs:
+        try:
+            outputs = _invoke_tool_batch(tasks[0]["tool"], batch_kwargs, config)
+        except Exception as e:
+            outputs = e
+    results = _finish_batch(tasks, results, outputs, members, cache_keys, charts, single_flight, flights)
+    # 相同调用可能就在本次合并调用中，其结果尚未写入`observations`
+    observations = ChainMap(results, observations)
+    for task in deferred:
+        results[task["idx"]] = _execute_task(task, observations, config, charts, tasks_temporary_save, single_flight)
+    return results
+
+
+async def _aexecute_batch(tasks: List[Task], observations, config, charts: List[Chart],
+                          tasks_temporary_save: List[Task], single_flight: Optional[SingleFlight] = None
+                          ) -> Dict[int, Any]:
+    """`_execute_batch`的异步版本"""
+    results, batch_kwargs, members, cache_keys, flights, deferred = _prepare_batch(
+        tasks, observations, tasks_temporary_save, config, single_flight)
+    outputs: Union[List[Any], Exception] = []
+    if batch_kwargs:
+        try:
+            outputs = await _ainvoke_tool_batch(tasks[0]["tool"], batch_kwargs, config)
+        except Exception as e:
+            outputs = e
+    results = _finish_batch(tasks, results, outputs, members, cache_keys, charts, single_flight, flights)
+    observations = ChainMap(results, observations)
+    deferred_outputs = await asyncio.gather(*(
+        _aexecute_task(task, observations, config, charts, tasks_temporary_save, single_flight) for task in deferred))
+    for task, action_output in zip(deferred, deferred_outputs):
+        results[task["idx"]] = action_output
+    return results
+
+
+def _invoke_tool_batch(tool_to_use: BaseTool, batch_kwargs: List[Dict[str, Any]],
+                       config: Optional[RunnableConfig]) -> List[Any]:
+    """
+    调用一次`_run_batch`：整批获取一个令牌，失败时按重试策略整批重试；
+    按调用次数平均记录耗时，与单独调用的耗时一起用于关键路径优先级与对冲调用
+    """
+    deadline = request_deadline(config)
+
+    def attempt():
+        acquire_tool_rate(tool_to_use, remaining_time(deadline))
+        start_time = time.time()
+        try:
+            outputs = tool_to_use._run_batch(batch_kwargs)
+        finally:
+            TOOL_LATENCY.record(tool_to_use.name, (time.time() - start_time) / len(batch_kwargs))
+        return _checked_batch_outputs(tool_to_use, batch_kwargs, outputs)
+
+    return call_with_retry(attempt, tool_to_use.retry_policy, deadline, tool_to_use.name)
+
+
+async def _ainvoke_tool_batch(tool_to_use: BaseTool, batch_kwargs: List[Dict[str, Any]],
+                              config: Optional[RunnableConfig]) -> List[Any]:
+    """`_invoke_tool_batch`的异步版本，`_run_batch`在线程池中执行"""
+    deadline = request_deadline(config)
+
+    async def call():
+        await aacquire_tool_rate(tool_to_use, remaining_time(deadline))
+        start_time = time.time()
+        try:
+            outputs = await run_in_executor(config, tool_to_use._run_batch, batch_kwargs)
+        finally:
+            TOOL_LATENCY.record(tool_to_use.name, (time.time() - start_time) / len(batch_kwargs))
+        return _checked_batch_outputs(tool_to_use, batch_kwargs, outputs)
+
+    async def attempt():
+        semaphore = tool_semaphore(tool_to_use)
+        if semaphore is None:
+            return await call()
+        async with semaphore:
+            return await call()
+
+    return await acall_with_retry(attempt, tool_to_use.retry_policy, deadline, tool_to_use.name)
+
+
+def _checked_batch_outputs(tool_to_use: BaseTool, batch_kwargs: List[Dict[str, Any]], outputs: Any) -> List[Any]:
+    outputs = list(outputs)
+    if len(outputs) != len(batch_kwargs):
+        raise ValueError(f"`{tool_to_use.name}._run_batch` returned {len(outputs)} results "
+                         f"for {len(batch_kwargs)} calls.")
+    return outputs
+
+
+def _invoke_tool(tool_to_use: BaseTool, resolved_args: Any, config: Optional[RunnableConfig],
+                 channel: Optional[RowChannel] = None) -> Any:
+    """
+    调用Tool：按Tool声明的速率限制获取令牌，失败时按重试策略重试，幂等Tool超过历史p95耗时仍未返回时再发起一次调用；
+    按行调用的Tool在每一行调用时限流与重试。
+    :param channel: Tool按批次返回结果时，每个批次到达后写入该通道，下游TASK可以逐批执行
+    """
+    if row_call_options(tool_to_use) is not None:
+        return _invoke_tool_once(tool_to_use, resolved_args, config, channel)
+    deadline = request_deadline(config)
+    retry_policy = getattr(tool_to_use, "retry_policy", None)
+    # 可能重试的Tool不写入批次通道：失败的调用已写入的批次无法撤回，下游TASK等待最终结果
+    attempt_channel = channel if retry_policy is None else None
+
+    def attempt():
+        hedge_after = _hedge_delay(tool_to_use)
+        if hedge_after is None:
+            return _limited_invoke_tool(tool_to_use, resolved_args, config, deadline, attempt_channel)
+        return _hedged_invoke_tool(tool_to_use, resolved_args, config, deadline, hedge_after)
+
+    return call_with_retry(attempt, retry_policy, deadline, tool_to_use.name)
+
+
+def _limited_invoke_tool(tool_to_use: BaseTool, resolved_args: Any, config: Optional[RunnableConfig],
+                         deadline: Optional[float], channel: Optional[RowChannel] = None) -> Any:
+    acquire_tool_rate(tool_to_use, remaining_time(deadline))
+    # 等待令牌期间调用已被取消（对冲调用的另一次调用已经返回）时不再调用Tool
+    if call_cancelled(config):
+        raise CancelledError(f"{tool_to_use.name} call was cancelled.")
+    return _invoke_tool_once(tool_to_use, resolved_args, config, channel)
+
+
+def _invoke_tool_once(tool_to_use: BaseTool, resolved_args: Any, config: Optional[RunnableConfig],
+                      channel: Optional[RowChannel] = None) -> Any:
+    """调用一次Tool，并记录Tool的耗时用于关键路径优先级调度与对冲调用"""
+    start_time = time.time()
+    try:
+        envelope = _shipped_envelope(tool_to_use, resolved_args)
+        if envelope is not None:
+            action_output = _run_shipped(tool_to_use, envelope, config)
+        elif resolved_args:
+            action_output = tool_to_use.invoke(resolved_args, config)
         else:
-            new_args[key] = value
+            action_output = tool_to_use._run()
+        if isinstance(action_output, ActionOutputStream):
+            action_output = action_output.collect(channel)
+        return action_output
+    finally:
+        TOOL_LATENCY.record(tool_to_use.name, time.time() - start_time)
+
+
+def _shipped_envelope(tool_to_use: BaseTool, resolved_args: Any) -> Optional[ToolEnvelope]:
+    """
+    声明了`execution="process"`的Tool在本机的工作进程中执行，避免CPU密集的Tool在调度线程中争用GIL；
+    声明了`execution="remote"`的Tool通过任务代理在远程工作进程中执行；
+    按行调用的Tool依赖调用上下文，始终在当前进程执行
+    """
+    if getattr(tool_to_use, "execution", "thread") not in ("process", "remote") \
+            or row_call_options(tool_to_use) is not None:
+        return None
+    return tool_envelope(tool_to_use, resolved_args)
+
 
-    # 合并 additional_args 到 new_args
-    new_args.update(additional_args)
-    return new_args
+def _run_shipped(tool_to_use: BaseTool, envelope: ToolEnvelope, config: Optional[RunnableConfig]) -> Any:
+    timeout = remaining_time(request_deadline(config))
+    if tool_to_use.execution == "remote":
+        return run_remotely(tool_to_use.name, envelope, timeout)
+    return run_in_process(envelope, timeout)
+
+
+async def _arun_shipped(tool_to_use: BaseTool, envelope: ToolEnvelope, config: Optional[RunnableConfig]) -> Any:
+    timeout = remaining_time(request_deadline(config))
+    if tool_to_use.execution == "remote":
+        return await run_in_executor(config, run_remotely, tool_to_use.name, envelope, timeout)
+    return await asyncio.wait_for(asyncio.wrap_future(submit_envelope(envelope)), timeout)
+
+
+def _hedge_delay(tool_to_use: BaseTool) -> Optional[float]:
+    """幂等Tool发起对冲调用前的等待秒数：历史耗时的p95，历史样本不足时不发起对冲调用"""
+    if not getattr(tool_to_use, "idempotent", False) or TOOL_LATENCY.count(tool_to_use.name) < HEDGE_MIN_SAMPLES:
+        return None
+    return TOOL_LATENCY.percentile(tool_to_use.name, HEDGE_PERCENTILE)
+
+
+def _hedged_invoke_tool(tool_to_use: BaseTool, resolved_args: Any, config: Optional[RunnableConfig],
+                        deadline: Optional[float], hedge_after: float) -> Any:
+    """
+    第一次调用超过`hedge_after`秒仍未返回时发起对冲调用，返回先成功的结果，另一次调用尚未开始时取消。
+    已经开始的另一次调用不会被强制中断，会继续占用对冲通道的线程直到返回：返回结果时设置取消信号，
+    Tool可以通过`call_cancelled()`检查后提前结束，等待令牌的调用不再调用Tool。
+    两次调用都属于调用方（TASK）已经占用的Tool级配额，不再重复占用，否则配额用尽时对冲调用会等待调用方自己释放的配额；
+    两次调用都不写入批次通道。超过请求截止时间仍没有结果时抛出`TimeoutError`
+    """
+    service = get_execution_service()
+    service.add_lane(HEDGE_LANE, max_worker())
+    cancelled = threading.Event()
+    config = with_cancel_event(config, cancelled)
+    attempts = [service.submit(_limited_invoke_tool, tool_to_use, resolved_args, config, deadline, lane=HEDGE_LANE)]
+    remaining = remaining_time(deadline)
+    done, _ = wait(attempts, timeout=hedge_after if remaining is None else min(hedge_after, remaining))
+    if not done and not _past(deadline):
+        attempts.append(service.submit(_limited_invoke_tool, tool_to_use, resolved_args, config, deadline,
+                                       lane=HEDGE_LANE))
+    pending = set(attempts)
+    try:
+        while pending:
+            done, pending = wait(pending, timeout=remaining_time(deadline), return_when=FIRST_COMPLETED)
+            if not done:
+                raise TimeoutError(f"{tool_to_use.name} did not finish before the request deadline.")
+            for future in done:
+                if future.exception() is None and not _task_failed(future.result()):
+                    return future.result()
+        return attempts[0].result()
+    finally:
+        cancelled.set()
+        for future in attempts:
+            future.cancel()
+
+
+async def _ainvoke_tool(tool_to_use: BaseTool, resolved_args: Any, config: Optional[RunnableConfig]) -> Any:
+    """`_invoke_tool`的异步版本"""
+    if row_call_options(tool_to_use) is not None:
+        return await _ainvoke_tool_once(tool_to_use, resolved_args, config)
+    deadline = request_deadline(config)
+
+    async def attempt():
+        hedge_after = _hedge_delay(tool_to_use)
+        if hedge_after is None:
+            return await _alimited_invoke_tool(tool_to_use, resolved_args, config, deadline)
+        return await _ahedged_invoke_tool(tool_to_use, resolved_args, config, deadline, hedge_after)
+
+    return await acall_with_retry(attempt, getattr(tool_to_use, "retry_policy", None), deadline, tool_to_use.name)
+
+
+async def _alimited_invoke_tool(tool_to_use: BaseTool, resolved_args: Any, config: Optional[RunnableConfig],
+                                deadline: Optional[float]) -> Any:
+    """Tool声明了`max_concurrency`时在当前事件循环内限制并发"""
+    semaphore = tool_semaphore(tool_to_use)
+    if semaphore is None:
+        await aacquire_tool_rate(tool_to_use, remaining_time(deadline))
+        return await _ainvoke_tool_once(tool_to_use, resolved_args, config)
+    async with semaphore:
+        await aacquire_tool_rate(tool_to_use, remaining_time(deadline))
+        return await _ainvoke_tool_once(tool_to_use, resolved_args, config)
+
+
+async def _ainvoke_tool_once(tool_to_use: BaseTool, resolved_args: Any, config: Optional[RunnableConfig]) -> Any:
+    start_time = time.time()
+    try:
+        envelope = _shipped_envelope(tool_to_use, resolved_args)
+        if envelope is not None:
+            action_output = await _arun_shipped(tool_to_use, envelope, config)
+        elif resolved_args:
+            action_output = await tool_to_use.ainvoke(resolved_args, config)
+        else:
+            action_output = await run_in_executor(config, tool_to_use._run)
+        if isinstance(action_output, ActionOutputStream):
+            action_output = await run_in_executor(config, action_output.collect)
+        return action_output
+    finally:
+        TOOL_LATENCY.record(tool_to_use.name, time.time() - start_time)
 
 
-def _args_parse_dict(input_string) -> Dict[str, Any]:
+async def _ahedged_invoke_tool(tool_to_use: BaseTool, resolved_args: Any, config: Optional[RunnableConfig],
+                               deadline: Optional[float], hedge_after: float) -> Any:
+    """`_hedged_invoke_tool`的异步版本，返回结果后取消另一次调用，线程池中执行的同步Tool通过取消信号提前结束"""
+    cancelled = threading.Event()
+    config = with_cancel_event(config, cancelled)
+    attempts = [asyncio.ensure_future(_alimited_invoke_tool(tool_to_use, resolved_args, config, deadline))]
+    try:
+        done, _ = await asyncio.wait(attempts, timeout=hedge_after)
+        if not done:
+            attempts.append(asyncio.ensure_future(_alimited_invoke_tool(tool_to_use, resolved_args, config, deadline)))
+        pending = set(attempts)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None and not _task_failed(future.result()):
+                    return future.result()
+        return attempts[0].result()
+    finally:
+        cancelled.set()
+        for future in attempts:
+            future.cancel()
+
+
+def _single_flight_key(tool_to_use: BaseTool, resolved_args: Any, resolved_dependency: Dict[str, Any]
+                       ) -> Optional[Tuple[str, str, str]]:
     """
-    正则表达式匹配 key=value 的模式，如果有剩余部分则保存在__value__字段中
-    :param input_string: 输入字符串
-    :return:
+    Tool调用去重KEY：Tool名称 + 规范化的参数 + 参数依赖的上游Tool与字段（按行调用等行为与参数依赖有关）；
+    参数无法规范化为JSON（例如DataFrame）时返回None，不参与去重
     """
-    pattern = r'(\w+)=["\']([^"\']+)["\']'
-    matches = re.findall(pattern, input_string)
 
-    # 构建字典
-    result_dict = {key: value for key, value in matches}
+    def reject(value):
+        raise TypeError(f"Object of type {type(value).__name__} is not canonicalizable")
+
+    def dependency(resolved):
+        if isinstance(resolved, list):
+            return [dependency(r) for r in resolved]
+        dep_task = resolved["dep_task"]
+        return [dep_task["tool"].name if dep_task else None, resolved["field"]]
+
+    try:
+        args_key = json.dumps(resolved_args, sort_keys=True, ensure_ascii=False, default=reject)
+        dependency_key = json.dumps({field: dependency(resolved) for field, resolved in resolved_dependency.items()},
+                                    sort_keys=True, ensure_ascii=False, default=reject)
+    except (TypeError, ValueError):
+        return None
+    return tool_to_use.name, args_key, dependency_key
+
+
+def _cached_invoke_tool(tool_to_use: BaseTool, resolved_args: Any, config: Optional[RunnableConfig],
+                        resolved_dependency: Dict[str, Any], channel: Optional[RowChannel] = None) -> Any:
+    """声明了`cache_ttl`的Tool先读取跨请求的结果缓存，调用成功的结果写入缓存"""
+    key = _tool_cache_key(tool_to_use, resolved_args, resolved_dependency)
+    if key is None:
+        return _invoke_tool(tool_to_use, resolved_args, config, channel)
+    cache = get_tool_cache()
+    action_output = cache.lookup(tool_to_use.name, key)
+    if action_output is None:
+        action_output = _invoke_tool(tool_to_use, resolved_args, config, channel)
+        if _reusable_output(action_output):
+            cache.set(tool_to_use.name, key, action_output, tool_to_use.cache_ttl)
+    return action_output
+
+
+async def _acached_invoke_tool(tool_to_use: BaseTool, resolved_args: Any, config: Optional[RunnableConfig],
+                               resolved_dependency: Dict[str, Any]) -> Any:
+    """`_cached_invoke_tool`的异步版本"""
+    key = _tool_cache_key(tool_to_use, resolved_args, resolved_dependency)
+    if key is None:
+        return await _ainvoke_tool(tool_to_use, resolved_args, config)
+    cache = get_tool_cache()
+    action_output = cache.lookup(tool_to_use.name, key)
+    if action_output is None:
+        action_output = await _ainvoke_tool(tool_to_use, resolved_args, config)
+        if _reusable_output(action_output):
+            cache.set(tool_to_use.name, key, action_output, tool_to_use.cache_ttl)
+    return action_output
 
-    if not result_dict:
-        # 空字典表示没有提取到 key=value，可以直接返回
-        return input_string
 
-    # 移除已匹配部分，剩余的作为单独的值
-    remaining = re.sub(pattern, '', input_string).replace(',', '').strip()
-    if remaining:
-        result_dict['__value__'] = remaining.strip('"')
+def _tool_cache_key(tool_to_use: BaseTool, resolved_args: Any, resolved_dependency: Dict[str, Any]
+                    ) -> Optional[str]:
+    """结果缓存KEY：只包含`cache_key_fields`声明的参数，Tool没有开启缓存时返回None"""
+    if not getattr(tool_to_use, "cache_ttl", None):
+        return None
+    key_fields = getattr(tool_to_use, "cache_key_fields", None)
+    if key_fields is not None and isinstance(resolved_args, dict):
+        resolved_args = {field: resolved_args.get(field) for field in key_fields}
+        resolved_dependency = {field: resolved_dependency[field] for field in key_fields
+                               if field in resolved_dependency}
+    key = _single_flight_key(tool_to_use, resolved_args, resolved_dependency)
+    if key is None:
+        return None
+    return hashlib.sha256("\n".join(key[1:]).encode("utf-8")).hexdigest()
 
-    return result_dict
+
+def _completed_call(single_flight: SingleFlight, key: Optional[Hashable], observations) -> Any:
+    """
+    已完成的相同调用的结果：去重实例只记录调用对应的TASK ID，结果从`observations`读取（可能已经落盘），
+    不可复用或已经不存在时返回None
+    """
+    idx = single_flight.recall(key)
+    if idx is None:
+        return None
+    action_output = observations.get(idx)
+    if not _reusable_output(action_output):
+        return None
+    single_flight.hit()
+    return action_output
+
+
+def _remember_call(single_flight: SingleFlight, key: Optional[Hashable], task: Task, action_output: Any):
+    """记录调用成功的结果对应的TASK ID，之后相同的调用从该TASK的结果复用"""
+    if _reusable_output(action_output):
+        single_flight.remember(key, task["idx"])
+
+
+def new_single_flight() -> SingleFlight:
+    """请求内相同Tool调用去重"""
+    return SingleFlight(reusable=_reusable_output)
+
+
+def _reusable_output(action_output: Any) -> bool:
+    """只复用调用成功的结果"""
+    return isinstance(action_output, ActionOutput) and not isinstance(action_output, ActionOutputError) \
+        and action_output.status
+
+
+def _task_failed(observation: Any) -> bool:
+    """TASK是否失败（调用出错、参数无法解析、依赖失败被跳过、超时，或Tool返回失败状态），失败TASK的下游Tool TASK不再执行"""
+    return observation_status(observation) != TASK_SUCCESS
+
+
+def _skipped_observation(task: Task, dep: int) -> str:
+    return (f"SKIPPED(Did not call {task['tool'].name} with args {task['args']}.)"
+            f" Dependency task {dep} failed or timed out.")
+
+
+def _timeout_observation(idx: int) -> str:
+    return f"TIMEOUT(Task {idx} did not finish before the request deadline.)"
+
+
+def _resolve_task_args(task: Task, observations: Dict[int, Any], tasks_temporary_save: List[Task],
+                       resolved_dependency: Dict[str, Any]) -> Any:
+    """
+    解析TASK的全部参数：执行解析计划时编译好的参数解析程序，手动构造的TASK在此处编译
+    :param resolved_dependency: 解析过程中记录每个字段依赖的上游TASK与字段信息
+    """
+    programs = task.get("programs")
+    if programs is None:
+        programs = task["programs"] = compile_args(task["tool"], task["args"])
+    return programs.resolve(ResolveContext(observations, task, TaskRegistry.wrap(tasks_temporary_save),
+                                           resolved_dependency))
+
+
+def _checkpoint_resolved_args(config: Optional[RunnableConfig], task: Task, resolved_args: Any):
+    """设置了会话检查点时暂存TASK解析后的参数"""
+    checkpoint = task_checkpoint(config)
+    if checkpoint is not None:
+        checkpoint.resolved(task, resolved_args)
+
+
+def _with_resolved_dependency(config: Optional[RunnableConfig], resolved_dependency: Dict[str, Any]
+                              ) -> Optional[RunnableConfig]:
+    """
+    将当前TASK的参数依赖信息放入`RunnableConfig`，Tool在调用期间可通过`ensure_config()`读取，
+    不再写入共享的Tool实例，Tool实例可以在不同请求之间安全复用
+    """
+    if not resolved_dependency:
+        return config
+    return patch_config(config, configurable={RESOLVED_RAGS_DEPENDENCY_VAR: resolved_dependency})
 
 
 def _print_task(task: Task, resolved_args: Dict = None):
@@ -170,6 +762,8 @@ def _print_task(task: Task, resolved_args: Dict = None):
     """
     print("---")
     for key, value in task.items():
+        if 'programs' == key:
+            continue
         if isinstance(value, BaseTool):
             print(f"{key}: {value.name}")
         else:
@@ -195,19 +789,8 @@ def stream_output_chart(action_output: Any, charts: List[Chart]):
     """
     流式输出图表对象
     """
-    if isinstance(action_output, ActionOutput) and action_output.status:
-        value = action_output.any
-        if isinstance(value, Chart):
-            stream_output_chart_ele(value, charts)
-        elif isinstance(value, List):
-            for chart in value:
-                if isinstance(chart, Chart):
-                    stream_output_chart_ele(chart, charts)
-                # List[List[Chart]]
-                elif isinstance(chart, List):
-                    for ch in chart:
-                        if isinstance(ch, Chart):
-                            stream_output_chart_ele(ch, charts)
+    for chart in output_charts(action_output):
+        stream_output_chart_ele(chart, charts)
 
 
 def stream_output_chart_ele(value: Chart, charts: List[Chart]):
@@ -219,296 +802,527 @@ def stream_output_chart_ele(value: Chart, charts: List[Chart]):
         # msg_pub.publish(type='chart', message=value)
 
 
-def _resolve_arg(arg: Union[str, Any], observations: Dict[int, Any], cur_task: Task, tasks_temporary_save: List[Task],
-                 field: str = None):
-    """
-    解析参数
-    1. 解析依赖的TASK ID
-    2. 获取TASK ID的返回值
-    3. 解析参数
-    """
-    # For dependencies on other tasks
-    if not _execute_parameter_parse(cur_task, field):
-        return arg
-    if isinstance(arg, str):
-        return _resolve_arg_str(arg, observations, cur_task, tasks_temporary_save, field)
-    elif isinstance(arg, list):
-        return [_resolve_arg_str(a, observations, cur_task, tasks_temporary_save, field) for a in arg]
-    else:
-        return arg
-
-
-def _execute_parameter_parse(cur_task: Task, field: str) -> bool:
-    """
-    是否对当前字段执行参数解析，参数解析的含义为将`${1}.code、$1`等类似的参数解析为真实参数值
-    """
-    dat = cur_task['tool'].args_schema
-    if dat is None:
-        return False
-    for key, value in dat.model_fields.items():
-        json_schema_extra = getattr(value, 'json_schema_extra', {})
-        if key == field and json_schema_extra:
-            resolved_args = next(iter(DISABLE_RESOLVED_ARGS.keys()), None)
-            if resolved_args in json_schema_extra:
-                return json_schema_extra[resolved_args]
-    return True
-
-
-def _resolve_arg_str(arg: str, observations: Dict[int, Any], cur_task: Task, tasks_temporary_save: List[Task],
-                     cur_field: str = None):
-    """
-    :param arg: 模型生成的参数 （例如：${1}、${1}[0]、${1}[0].code...）
-    :param observations: 其它TASK返回结果
-    :param field: 当前参数值对应的传入字段
-    """
-    if arg.count('${') > 1:
-        # 支持多参数-默认部分解析
-        idx_list = [int(idx) for idx in re.findall(r"\$\{?(\d+)\}?", arg)]
-        return _resolve_arg_str_parse_multi(idx_list, idx_list[0], arg, observations, cur_task, tasks_temporary_save,
-                                            cur_field)
-    else:
-        # 支持单参数、以及部分解析
-        idx = _resolve_arg_str_idx(arg, cur_task, tasks_temporary_save)
-        if idx is None or idx == -1 or idx == arg:
-            return arg
+@as_runnable
+def schedule_task(task_inputs, config):
+    task: Task = task_inputs["task"]
+    observations: Dict[int, Any] = task_inputs["observations"]
+    charts: List[Chart] = task_inputs["charts"]
+    tasks_temporary_save: List[Task] = task_inputs["tasks_temporary_save"]
+    single_flight: Optional[SingleFlight] = task_inputs.get("single_flight")
+    channel: Optional[RowChannel] = task_inputs.get("channel")
+    source: Optional[Tuple[int, RowChannel]] = task_inputs.get("source")
+    try:
+        if source is not None:
+            observation = _execute_pipelined_task(task, observations, config, charts, tasks_temporary_save,
+                                                  single_flight, source)
         else:
-            return _resolve_arg_str_parse(idx, arg, observations, cur_task, tasks_temporary_save, cur_field)
-
-
-def _resolve_arg_str_parse(idx: int, arg: str, observations: Dict[int, Any], cur_task: Task,
-                           tasks_temporary_save: List[Task],
-                           cur_field: str = None):
-    """基于IDX解析参数，一个字段单个参数"""
-    value = observations.get(idx, arg)
-    if isinstance(value, ActionOutput) and _is_match_arg(arg):
-        # JOIN机制中依赖的Task已经执行了，observations已经获取了其它Tool运行的结果
-        value, field = _tools_dag_flow_value(value.dag_kwargs, idx, tasks_temporary_save, arg, cur_field)
-        if value is not None:
-            dep_task = [tk for tk in tasks_temporary_save if tk["idx"] == idx and tk["tool"] != "join"][0]
-            RESOLVED_RAGS_DEPENDENCY[cur_field] = ResolvedArgs(
-                dep_task=dep_task, output=observations.get(idx), field=field)
-            # 如果是部分解析则将字符串替换，仅替换一次（部分替换时会将字符串其余部分保留并只替换参数部分）
-            if _execute_partial_parse(cur_task, cur_field):
-                pattern = r'\$\{[^}]+\}(?:\.[\w]+)?'
-                val = re.sub(pattern, str(value), arg, count=1)
-                return val
-            else:
-                return value
-    else:
-        return arg
-
-
-def _resolve_arg_str_parse_multi(idx_list: List[int], idx: int, arg: str, observations: Dict[int, Any], cur_task: Task,
-                                 tasks_temporary_save: List[Task],
-                                 cur_field: str = None):
-    """基于IDX解析参数，一个字段多个参数
-    eg.`average of ${2}.stock_return ceshi ${4}.ff ${5}.stock_return ceshi` - 替换后保留原始字符串
-    """
-    value = observations.get(idx, arg)
-    if isinstance(value, ActionOutput) and _is_match_arg(arg):
-        # JOIN机制中依赖的Task已经执行了，observations已经获取了其它Tool运行的结果
-        value, field = _tools_dag_flow_value(value.dag_kwargs, idx, tasks_temporary_save, arg, cur_field)
-        if value is not None:
-            dep_task = [tk for tk in tasks_temporary_save if tk["idx"] == idx and tk["tool"] != "join"][0]
-
-            # 处理字段依赖的上游参数
-            if cur_field in RESOLVED_RAGS_DEPENDENCY:
-                existing_value = RESOLVED_RAGS_DEPENDENCY[cur_field]
-                if not isinstance(existing_value, list):
-                    RESOLVED_RAGS_DEPENDENCY[cur_field] = [existing_value]
-                RESOLVED_RAGS_DEPENDENCY[cur_field].append(
-                    ResolvedArgs(dep_task=dep_task, output=observations.get(idx), field=field))
-            else:
-                RESOLVED_RAGS_DEPENDENCY[cur_field] = ResolvedArgs(dep_task=dep_task, output=observations.get(idx),
-                                                                   field=field)
-
-            # 递归替换
-            pattern = r'\$\{[^}]+\}(?:\.[\w]+)?'
-            match = re.search(pattern, arg)
-            if not match:
-                return arg
-            else:
-                arg = re.sub(pattern, str(value), arg, count=1)
-                next_idx = idx_list[idx_list.index(idx) + 1]
-                return _resolve_arg_str_parse_multi(idx_list, next_idx, arg, observations, cur_task,
-                                                    tasks_temporary_save, cur_field)
-    else:
-        return arg
+            observation = _execute_task(task, observations, config, charts, tasks_temporary_save, single_flight,
+                                        channel)
+    except Exception as e:
+        import traceback
 
+        observation = traceback.format_exception(type(e), e, e.__traceback__)
+    observations[task["idx"]] = observation
 
-def _execute_partial_parse(cur_task: Task, field: str) -> bool:
-    """
-    是否对当前字段执行参数部分解析，部分参数解析的含义为将`'average of ${2}.stock_return'`等类似的参数解析为真实参数值，保留原有字符串表示
-    """
-    dat = cur_task['tool'].args_schema
-    for key, value in dat.model_fields.items():
-        json_schema_extra = getattr(value, 'json_schema_extra', {})
-        if key == field and json_schema_extra:
-            resolved_args = next(iter(PARTIAL_RESOLVED_ARGS_PARSE.keys()), None)
-            if resolved_args in json_schema_extra:
-                return json_schema_extra[resolved_args]
-    return False
 
+async def aschedule_task(task: Task, observations: Dict[int, Any], charts: List[Chart],
+                         tasks_temporary_save: List[Task], config: Optional[RunnableConfig] = None,
+                         single_flight: Optional[SingleFlight] = None):
+    """`schedule_task`的异步版本"""
+    try:
+        observation = await _aexecute_task(task, observations, config, charts, tasks_temporary_save, single_flight)
+    except Exception as e:
+        import traceback
 
-def _is_match_arg(arg: str) -> bool:
-    """
-    判断是否需要进行参数值匹配
-    """
-    if '$' in arg:
-        return True
-    if arg.startswith("{") and arg.endswith("}"):
-        return True
-    if arg.startswith("<") and arg.endswith(">"):
-        return True
-    return False
+        observation = traceback.format_exception(type(e), e, e.__traceback__)
+    observations[task["idx"]] = observation
 
 
-def _resolve_arg_str_idx(arg: Any, cur_task: Task, tasks_temporary_save: List[Task]) -> Any:
-    """
-    匹配 TASK ID
-    """
-    # $1 or ${1} -> 1
-    # ${2}[0].code -> 2
-    ID_PATTERN = r"\$\{?(\d+)\}?"
+def _past(deadline: Optional[float]) -> bool:
+    return deadline is not None and time.time() >= deadline
 
-    def replace_match(match):
-        # If the string is ${123}, match.group(0) is ${123}, and match.group(1) is 123.
-        # Return the match group, in this case the index, from the string. This is the index
-        # number we get back.
-        return str(match.group(1))
 
-    idx_str = re.sub(ID_PATTERN, replace_match, arg)
-    try:
-        if idx_str != arg:
-            # 获取解析后结果
-            return int(idx_str)
-        else:
-            # 解析不到ID默认使用上一个TASK ID，不能使用当前任务的ID，不能使用Join类任务ID
-            temp_tasks = [tp for tp in tasks_temporary_save if
-                          tp["idx"] != cur_task["idx"] and isinstance(tp["tool"], BaseTool)]
-            if temp_tasks:
-                return temp_tasks[-1]["idx"]
-    except ValueError:
-        # 处理类似 ${2}[0].code -> 2[0].code 无法解析的问题
-        return _resolve_arg_str_idx_error(idx_str)
+def _failed_dependency(task: Task, observations: Dict[int, Any]) -> Optional[int]:
+    """Tool TASK已经失败的依赖，`join`总是执行"""
+    if not isinstance(task["tool"], BaseTool):
+        return None
+    for dep in task["dependencies"]:
+        if dep in observations and _task_failed(observations[dep]):
+            return dep
+    return None
 
 
-def _resolve_arg_str_idx_error(text: str) -> int:
+class TaskFetchingUnit:
     """
-    匹配字符串中第一个数字
-    处理类似 ${2}[0].code -> 2[0].code 无法解析的问题
-    <date>1.fund_date</date>
+    Task Fetching Unit：基于依赖完成信号调度任务。
+    每个等待中的任务记录尚未满足的依赖，依赖任务完成时立即通知其下游任务，最后一个依赖完成后立即派发，不再轮询等待。
+    执行服务繁忙时，就绪任务按剩余关键路径长度排队，剩余关键路径越长越先执行。
+    上游TASK按批次返回结果时，唯一未完成的依赖正在产生批次的按行调用TASK立即开始逐批执行。
+    TASK失败时其下游Tool TASK（包括间接依赖）立即记录为跳过，不再调用Tool；
+    `RunnableConfig`中设置了请求截止时间时，超时后取消尚未开始的任务，未完成的任务记录为超时，已有结果返回给Joiner。
+    每个Tool TASK有结果后立即发布TASK结果事件（回调或LangGraph自定义流），不必等待整个计划执行完成。
+    Tool实现了`_run_batch`时，同时就绪或排队等待执行、调用该Tool的任务合并为一次调用，结果按TASK拆分。
+    `RunnableConfig`中设置了会话检查点时，调用成功的Tool TASK写入检查点，与检查点一致的TASK直接复用结果。
     """
-    match = re.search(r'\d+', text)
-    if match:
-        return int(match.group())
-    else:
-        return -1
-
-
-def _tools_dag_flow_value(tool_observation: DAGFlow, idx: int, tasks_temporary_save: List[Task], arg: str = None,
-                          cur_field: str = None) -> Tuple[Any, str]:
-    """
-    获取参数值
-    :param tool_observation: 当前任务依赖的上一步Task结果
-    :param idx: 当前任务依赖的Task ID
-    :param arg: 当前Task，LLM生成的参数
-    :param cur_field: 当前Task入参字段
-    :param cur_task: 当前Task
-    获取参数值方法：
-    - 解析字段名获取【标准方法，准确率最高】
-    - 猜字段如果出错则有可能触发Replan过程
-    :return 返回解析的参数值，以及被依赖的上游字段field
-    """
-    # 1. ==============匹配字段==============
-    if '.' in arg:
-        field = arg.split('.')[-1]
-        value = tool_observation.kwargs.get(field, arg)
-        if value != arg:
-            return value, field
-    # 2. ==============猜字段：从依赖任务的输出中猜，字段全匹配==============
-    if '$' in arg:
-        value = tool_observation.kwargs.get(cur_field, arg)
-        if value != arg:
-            return value, cur_field
-    # 3. ==============猜字段：从依赖任务的输入猜字段，字段全匹配==============
-    # 从依赖的Task中尝试直接获取相同的参数
-    if tasks_temporary_save:
-        task: Task = [tk for tk in tasks_temporary_save if tk["idx"] == idx and tk["tool"] != "join"][0]
-        if task is not None:
-            value = task["args"].get(cur_field, arg)
-            if value != arg and '$' not in str(value):
-                return value, cur_field
-    # 4. ==============猜字段：匹配不到字段则猜字段，基于字段匹配度从上一个Task输出中猜字段==============
-    return _resolve_arg_parse_random(cur_field, tool_observation)
-
-
-def _resolve_arg_parse_random(cur_field: str, tool_observation: DAGFlow) -> Tuple[Any, str]:
-    min_similarity = 100
-    best_key = None
-    data = tool_observation.kwargs
-    for key in data.keys():
-        similarity = word_similarity_score(cur_field, key)  # 猜一个KEY
-        if similarity < min_similarity:
-            min_similarity = similarity
-            best_key = key
-    if best_key:
-        return data.get(best_key), best_key
 
+    def __init__(self, observations: Dict[int, Any], charts: List[Chart], tasks_temporary_save: List[Task],
+                 config: Optional[RunnableConfig] = None, service: Optional[ExecutionService] = None,
+                 request_id: Optional[Hashable] = None, single_flight: Optional[SingleFlight] = None):
+        """
+        :param service: 执行TASK的执行服务，默认使用进程级共享的执行服务
+        :param request_id: 请求级配额KEY，默认每次调度生成一个新的请求ID
+        :param single_flight: 相同Tool调用去重，为空表示不去重
+        """
+        self.service = service or get_execution_service()
+        self.request_id = request_id or uuid.uuid4().hex
+        self.observations = observations
+        self.charts = charts
+        self.tasks_temporary_save = TaskRegistry.wrap(tasks_temporary_save)
+        self.config = config
+        self.single_flight = single_flight
+        self._condition = threading.Condition()
+        # 等待中的任务：TASK ID -> TASK
+        self._waiting: Dict[int, Task] = {}
+        # 等待中的任务尚未满足的依赖：TASK ID -> 依赖的TASK ID集合
+        self._blocked_by: Dict[int, Set[int]] = {}
+        # 依赖任务完成后需要通知的下游任务：依赖的TASK ID -> 下游TASK ID列表
+        self._dependents: Dict[int, List[int]] = {}
+        self._running = 0
+        # 已派发但可能仍在执行服务中排队的任务，剩余关键路径变长时更新其优先级
+        self._futures: Dict[int, Future] = {}
+        self._critical_path = CriticalPath(on_update=self._reprioritize)
+        # 运行中的任务的批次通道
+        self._channels: Dict[int, RowChannel] = {}
+        # 尚未开始执行的合并调用：Tool名称 -> TASK列表
+        self._batches: Dict[str, List[Task]] = {}
+        # 请求截止时间，超时后关闭调度，之后完成的任务结果被丢弃
+        self.deadline = request_deadline(config)
+        self._closed = False
+        # TASK结果事件：持有锁时暂存，释放锁后发布
+        self._publish = task_result_publisher(config)
+        self._events: List[TaskResultEvent] = []
+        self._started: Dict[int, float] = {}
+        # 会话检查点，TASK完成时在锁外写入
+        self._checkpoint = task_checkpoint(config)
+        # 复用检查点结果的TASK ID
+        self.resumed: Set[int] = set()
+
+    @property
+    def expired(self) -> bool:
+        """是否已经超过请求截止时间"""
+        return self._closed
+
+    def submit(self, task: Task):
+        """提交任务：依赖已满足则立即派发，依赖已失败则跳过，否则登记到依赖任务的完成通知列表"""
+        with self._condition:
+            self._submit(task)
+        self._flush_events()
+
+    def submit_all(self, tasks: Iterable[Task]):
+        """在一次加锁中提交多个任务，同时就绪、调用同一Tool的任务可以合并调用"""
+        with self._condition:
+            for task in tasks:
+                self._submit(task)
+        self._flush_events()
+
+    def _submit(self, task: Task):
+        idx = task["idx"]
+        if self._closed or _past(self.deadline):
+            self._expire()
+            self._record(task, _timeout_observation(idx))
+            return
+        failed = _failed_dependency(task, self.observations)
+        if failed is not None:
+            self._skip(task, failed)
+            return
+        if self._resume(task):
+            return
+        self._critical_path.add(task)
+        missing = {dep for dep in task["dependencies"] if dep not in self.observations}
+        if not missing:
+            self._dispatch(task)
+            return
+        self._waiting[idx] = task
+        self._blocked_by[idx] = missing
+        for dep in missing:
+            self._dependents.setdefault(dep, []).append(idx)
+        self._try_pipeline(idx)
+
+    def join(self):
+        """等待所有已派发的任务完成，依赖永远无法满足的任务不会被执行；超过请求截止时间时不再等待"""
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._running == 0, remaining_time(self.deadline)):
+                self._expire()
+            else:
+                for idx, task in self._waiting.items():
+                    logging.error(f"Dependencies {sorted(self._blocked_by[idx])} of {_get_task_name(task)} "
+                                  f"were never satisfied, the task is not executed.")
+        self._flush_events()
+
+    def _dispatch(self, task: Task, source: Optional[Tuple[int, RowChannel]] = None):
+        """
+        派发任务，调用方需持有锁
+        :param source: 逐批执行时依赖的上游TASK ID与批次通道
+        """
+        self._running += 1
+        idx = task["idx"]
+        if source is None and _batchable(task):
+            self._dispatch_batched(task)
+            return
+        self._channels[idx] = RowChannel(on_open=functools.partial(self._on_stream_open, idx))
+        keys = (request_key(self.request_id),)
+        if isinstance(task["tool"], BaseTool) and row_call_options(task["tool"]) is None:
+            # 按行调用的Tool在每一行调用时占用Tool级配额，TASK本身不占用
+            keys += tool_quota_keys(self.service, task["tool"])
+        self._futures[idx] = self.service.submit(self._run, task, source, lane=TASK_LANE, keys=keys,
+                                                 priority=self._critical_path.remaining(idx))
+
+    def _dispatch_batched(self, task: Task):
+        """
+        派发可合并调用的任务：同一Tool尚未开始执行的合并调用未满时加入其中，否则创建新的合并调用；
+        合并调用整体占用一个Tool级配额，调用方需持有锁
+        """
+        tool_to_use = task["tool"]
+        batch = self._batches.get(tool_to_use.name)
+        if batch is not None and (tool_to_use.max_batch_size is None or len(batch) < tool_to_use.max_batch_size):
+            batch.append(task)
+            self._futures[task["idx"]] = self._futures[batch[0]["idx"]]
+            return
+        batch = self._batches[tool_to_use.name] = [task]
+        keys = (request_key(self.request_id),) + tool_quota_keys(self.service, tool_to_use)
+        self._futures[task["idx"]] = self.service.submit(self._run_batch, batch, lane=TASK_LANE, keys=keys,
+                                                         priority=self._critical_path.remaining(task["idx"]))
+
+    def _on_stream_open(self, idx: int):
+        """上游任务产生了第一个批次，尝试逐批执行等待该任务的下游任务"""
+        with self._condition:
+            for waiter in list(self._dependents.get(idx, [])):
+                self._try_pipeline(waiter)
+
+    def _try_pipeline(self, idx: int) -> bool:
+        """等待中的任务只剩一个依赖未完成，且该依赖正在按批次产生结果时，立即逐批执行，调用方需持有锁"""
+        blocked = self._blocked_by.get(idx)
+        if blocked is None or len(blocked) != 1:
+            return False
+        dep = next(iter(blocked))
+        channel = self._channels.get(dep)
+        if channel is None or not channel.streaming:
+            return False
+        task = self._waiting[idx]
+        if not _pipelinable(task, self.tasks_temporary_save.get(dep)):
+            return False
+        del self._waiting[idx]
+        del self._blocked_by[idx]
+        self._dependents[dep].remove(idx)
+        self._dispatch(task, source=(dep, channel))
+        return True
 
-@as_runnable
-def schedule_task(task_inputs, config):
-    task: Task = task_inputs["task"]
-    observations: Dict[int, Any] = task_inputs["observations"]
-    charts: List[Chart] = task_inputs["charts"]
-    tasks_temporary_save: List[Task] = task_inputs["tasks_temporary_save"]
-    try:
-        observation = _execute_task(task, observations, config, charts, tasks_temporary_save)
-    except Exception as e:
-        import traceback
+    def _reprioritize(self, idx: int, remaining: float):
+        """上游任务的剩余关键路径变长，调用方需持有锁"""
+        future = self._futures.get(idx)
+        if future is not None:
+            self.service.reprioritize(future, remaining)
 
-        observation = traceback.format_exception(type(e), e, e.__traceback__)
-    observations[task["idx"]] = observation
+    def _run(self, task: Task, source: Optional[Tuple[int, RowChannel]] = None):
+        # 任务结果先写入私有的字典，超时关闭调度后完成的任务不会再修改共享的`observations`
+        result = ChainMap({}, self.observations)
+        self._started[task["idx"]] = time.time()
+        try:
+            schedule_task.invoke(dict(task=task, observations=result, charts=self.charts,
+                                      tasks_temporary_save=self.tasks_temporary_save,
+                                      single_flight=self.single_flight, channel=self._channels.get(task["idx"]),
+                                      source=source), self.config)
+        finally:
+            self._persist(task, result.maps[0])
+            self._complete(task, result.maps[0])
+            self._flush_events()
+
+    def _run_batch(self, batch: List[Task]):
+        with self._condition:
+            # 开始执行后不再加入新的任务
+            if self._batches.get(batch[0]["tool"].name) is batch:
+                del self._batches[batch[0]["tool"].name]
+        if len(batch) == 1:
+            return self._run(batch[0])
+        results: Dict[int, Any] = {}
+        started = time.time()
+        for task in batch:
+            self._started[task["idx"]] = started
+        try:
+            results = _execute_batch(batch, self.observations, self.config, self.charts, self.tasks_temporary_save,
+                                     self.single_flight)
+        except Exception as e:
+            import traceback
+
+            error = traceback.format_exception(type(e), e, e.__traceback__)
+            results = {task["idx"]: error for task in batch}
+        finally:
+            for task in batch:
+                self._persist(task, results)
+                self._complete(task, results)
+            self._flush_events()
+
+    def _complete(self, task: Task, result: Dict[int, Any]):
+        """任务完成信号：记录任务结果，更新下游任务的依赖状态，并派发依赖全部满足的任务"""
+        idx = task["idx"]
+        with self._condition:
+            self._futures.pop(idx, None)
+            self._channels.pop(idx, None)
+            self._running -= 1
+            if not self._closed:
+                if idx in result:
+                    self._record(task, result[idx])
+                self._release(idx, failed=idx not in result or _task_failed(result[idx]))
+            self._condition.notify_all()
+
+    def _resume(self, task: Task) -> bool:
+        """检查点中有一致的TASK时直接复用其结果，调用方需持有锁"""
+        record = self._checkpoint.reusable(task, self.resumed) if self._checkpoint is not None else None
+        if record is None:
+            return False
+        self.resumed.add(task["idx"])
+        self._record(task, record["observation"])
+        self._release(task["idx"], failed=False)
+        return True
+
+    def _persist(self, task: Task, result: Dict[int, Any]):
+        """在锁外将完成的TASK写入检查点，写入后再发出任务完成信号，调度结束时检查点已经包含全部完成的TASK"""
+        if self._checkpoint is not None and not self._closed and task["idx"] in result:
+            self._checkpoint.record(task, result[task["idx"]])
+
+    def _record(self, task: Task, observation: Any):
+        """记录TASK结果并暂存TASK结果事件，调用方需持有锁"""
+        idx = task["idx"]
+        self.observations[idx] = observation
+        started = self._started.pop(idx, None)
+        if self._publish is not None and isinstance(task["tool"], BaseTool):
+            duration = time.time() - started if started is not None else 0.0
+            self._events.append(task_result_event(task, observation, duration))
+
+    def _flush_events(self):
+        """在锁外发布暂存的TASK结果事件"""
+        if self._publish is None:
+            return
+        with self._condition:
+            events, self._events = self._events, []
+        for event in events:
+            self._publish(event)
+
+    def _release(self, idx: int, failed: bool):
+        """通知等待`idx`的下游任务，依赖失败的Tool TASK直接跳过，调用方需持有锁"""
+        for waiter in self._dependents.pop(idx, []):
+            blocked = self._blocked_by.get(waiter)
+            if blocked is None:
+                continue
+            blocked.discard(idx)
+            if failed and isinstance(self._waiting[waiter]["tool"], BaseTool):
+                del self._blocked_by[waiter]
+                self._skip(self._waiting.pop(waiter), idx)
+            elif not blocked:
+                del self._blocked_by[waiter]
+                self._dispatch(self._waiting.pop(waiter))
+            else:
+                self._try_pipeline(waiter)
+
+    def _skip(self, task: Task, dep: int):
+        """依赖失败，跳过任务并继续跳过其下游任务，调用方需持有锁"""
+        self._record(task, _skipped_observation(task, dep))
+        self._release(task["idx"], failed=True)
+
+    def _expire(self):
+        """超过请求截止时间：取消尚未开始的任务，未完成与等待中的任务记录为超时，调用方需持有锁"""
+        if self._closed:
+            return
+        self._closed = True
+        unfinished = list(self._futures) + list(self._waiting)
+        for future in self._futures.values():
+            future.cancel()
+        for idx in unfinished:
+            task = self._waiting.get(idx) or self.tasks_temporary_save.get(idx)
+            if task is not None:
+                self._record(task, _timeout_observation(idx))
+            else:
+                self.observations[idx] = _timeout_observation(idx)
+        logging.warning(f"Request deadline exceeded, tasks {sorted(unfinished)} did not finish.")
+        self._condition.notify_all()
 
 
-def schedule_pending_task(
-        task: Task, observations: Dict[int, Any], charts: List[Chart],
-        tasks_temporary_save: List[Task], retry_after: float = 0.2, timeout: float = 5
-):
+class AsyncTaskFetchingUnit:
     """
-    :param task: 当前任务
-    :param observations: 观察结果，保存任务ID以及运行结果
-    :param charts: 存放中间结果
-    :param msg_pub: 消息处理对象
-    :param retry_after: 多少秒后重新判断当前任务的依赖是否满足
-    :param timeout: 依赖分析超时时间
+    Task Fetching Unit的异步版本：任务以协程运行在事件循环中，依赖等待不占用线程。
+    所有状态只在事件循环线程中修改，不需要加锁。超过请求截止时间时取消运行中的协程。
+    同一轮事件循环中就绪、调用同一个实现了`_run_batch`的Tool的任务合并为一次调用。
     """
-    start_time = time.time()
-    while True:
-        # 检查超时
-        if time.time() - start_time > timeout:
-            logging.error(
-                f"Timeout: Dependency analysis for {task['tool'].name if isinstance(task['tool'], BaseTool) else task['tool']} exceeded {timeout} seconds.")
-            break
-        # 依赖分析
-        deps = task["dependencies"]
-        if deps and (any([dep not in observations for dep in deps])):
-            if isinstance(task['tool'], BaseTool):
-                logging.warning(f"Dependencies not yet satisfied: {task['tool'].name}")
-            else:
-                logging.warning(f"Dependencies not yet satisfied: {task['tool']}")
-            time.sleep(retry_after)
-            continue
-        schedule_task.invoke({"task": task, "observations": observations, "charts": charts,
-                              "tasks_temporary_save": tasks_temporary_save})
-        break
+
+    def __init__(self, observations: Dict[int, Any], charts: List[Chart], tasks_temporary_save: List[Task],
+                 config: Optional[RunnableConfig] = None, single_flight: Optional[SingleFlight] = None):
+        self.observations = observations
+        self.charts = charts
+        self.tasks_temporary_save = tasks_temporary_save
+        self.config = config
+        self.single_flight = single_flight
+        self._waiting: Dict[int, Task] = {}
+        self._blocked_by: Dict[int, Set[int]] = {}
+        self._dependents: Dict[int, List[int]] = {}
+        # 运行中的协程 -> TASK列表，合并调用的协程对应多个TASK
+        self._running: Dict[asyncio.Task, List[Task]] = {}
+        # 尚未开始执行的合并调用：Tool名称 -> TASK列表
+        self._batches: Dict[str, List[Task]] = {}
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self.deadline = request_deadline(config)
+        self._closed = False
+        self._publish = task_result_publisher(config)
+        self._started: Dict[int, float] = {}
+        self._checkpoint = task_checkpoint(config)
+        self.resumed: Set[int] = set()
+
+    @property
+    def expired(self) -> bool:
+        """是否已经超过请求截止时间"""
+        return self._closed
+
+    def submit(self, task: Task):
+        """提交任务：依赖已满足则立即派发，依赖已失败则跳过，否则登记到依赖任务的完成通知列表"""
+        idx = task["idx"]
+        if self._closed or _past(self.deadline):
+            self._expire()
+            self._record(task, _timeout_observation(idx))
+            return
+        failed = _failed_dependency(task, self.observations)
+        if failed is not None:
+            self._skip(task, failed)
+            return
+        record = self._checkpoint.reusable(task, self.resumed) if self._checkpoint is not None else None
+        if record is not None:
+            self.resumed.add(idx)
+            self._record(task, record["observation"], persist=False)
+            self._release(idx, failed=False)
+            return
+        missing = {dep for dep in task["dependencies"] if dep not in self.observations}
+        if not missing:
+            self._dispatch(task)
+            return
+        self._waiting[idx] = task
+        self._blocked_by[idx] = missing
+        for dep in missing:
+            self._dependents.setdefault(dep, []).append(idx)
+
+    async def join(self):
+        """等待所有已派发的任务完成，依赖永远无法满足的任务不会被执行；超过请求截止时间时不再等待"""
+        if not self._idle.is_set():
+            try:
+                await asyncio.wait_for(self._idle.wait(), remaining_time(self.deadline))
+            except asyncio.TimeoutError:
+                self._expire()
+                return
+        for idx, task in self._waiting.items():
+            logging.error(f"Dependencies {sorted(self._blocked_by[idx])} of {_get_task_name(task)} "
+                          f"were never satisfied, the task is not executed.")
+
+    def _dispatch(self, task: Task):
+        self._idle.clear()
+        if not _batchable(task):
+            self._running[asyncio.ensure_future(self._run(task))] = [task]
+            return
+        tool_to_use = task["tool"]
+        batch = self._batches.get(tool_to_use.name)
+        if batch is not None and (tool_to_use.max_batch_size is None or len(batch) < tool_to_use.max_batch_size):
+            batch.append(task)
+            return
+        batch = self._batches[tool_to_use.name] = [task]
+        self._running[asyncio.ensure_future(self._run_batch(batch))] = batch
+
+    async def _run(self, task: Task):
+        result = ChainMap({}, self.observations)
+        self._started[task["idx"]] = time.time()
+        try:
+            await aschedule_task(task, result, self.charts, self.tasks_temporary_save, self.config,
+                                 self.single_flight)
+        finally:
+            self._running.pop(asyncio.current_task(), None)
+            self._complete(task, result.maps[0])
+            if not self._running:
+                self._idle.set()
+
+    async def _run_batch(self, batch: List[Task]):
+        # 协程开始执行后不再加入新的任务
+        if self._batches.get(batch[0]["tool"].name) is batch:
+            del self._batches[batch[0]["tool"].name]
+        if len(batch) == 1:
+            return await self._run(batch[0])
+        results: Dict[int, Any] = {}
+        started = time.time()
+        for task in batch:
+            self._started[task["idx"]] = started
+        try:
+            results = await _aexecute_batch(batch, self.observations, self.config, self.charts,
+                                            self.tasks_temporary_save, self.single_flight)
+        except Exception as e:
+            import traceback
+
+            error = traceback.format_exception(type(e), e, e.__traceback__)
+            results = {task["idx"]: error for task in batch}
+        finally:
+            self._running.pop(asyncio.current_task(), None)
+            for task in batch:
+                self._complete(task, results)
+            if not self._running:
+                self._idle.set()
+
+    def _complete(self, task: Task, result: Dict[int, Any]):
+        if self._closed:
+            return
+        idx = task["idx"]
+        if idx in result:
+            self._record(task, result[idx])
+        self._release(idx, failed=idx not in result or _task_failed(result[idx]))
+
+    def _record(self, task: Task, observation: Any, persist: bool = True):
+        """记录TASK结果，写入检查点并发布TASK结果事件"""
+        idx = task["idx"]
+        self.observations[idx] = observation
+        started = self._started.pop(idx, None)
+        if persist and self._checkpoint is not None:
+            self._checkpoint.record(task, observation)
+        if self._publish is not None and isinstance(task["tool"], BaseTool):
+            self._publish(task_result_event(task, observation, time.time() - started if started else 0.0))
+
+    def _release(self, idx: int, failed: bool):
+        for waiter in self._dependents.pop(idx, []):
+            blocked = self._blocked_by.get(waiter)
+            if blocked is None:
+                continue
+            blocked.discard(idx)
+            if failed and isinstance(self._waiting[waiter]["tool"], BaseTool):
+                del self._blocked_by[waiter]
+                self._skip(self._waiting.pop(waiter), idx)
+            elif not blocked:
+                del self._blocked_by[waiter]
+                self._dispatch(self._waiting.pop(waiter))
+
+    def _skip(self, task: Task, dep: int):
+        self._record(task, _skipped_observation(task, dep))
+        self._release(task["idx"], failed=True)
+
+    def _expire(self):
+        if self._closed:
+            return
+        self._closed = True
+        unfinished = [task for tasks in self._running.values() for task in tasks] + list(self._waiting.values())
+        for future in list(self._running):
+            future.cancel()
+        for task in unfinished:
+            self._record(task, _timeout_observation(task["idx"]))
+        logging.warning(f"Request deadline exceeded, tasks {sorted(task['idx'] for task in unfinished)} "
+                        f"did not finish.")
 
 
 TOOL_RESPONSE_PROMPT = PromptTemplate(input_variables=["response", "input"], template=TOOL_MESSAGE_TEMPLATE)
 
 
 @as_runnable
-def schedule_tasks(scheduler_input: SchedulerInput) -> Dict[str, List[ToolMessage]]:
+def schedule_tasks(scheduler_input: SchedulerInput, config: RunnableConfig) -> Dict[str, List[ToolMessage]]:
     """Group the tasks into a DAG schedule."""
     # For streaming, we are making a few simplifying assumption:
     # 1. The LLM does not create cyclic dependencies
@@ -517,7 +1331,7 @@ def schedule_tasks(scheduler_input: SchedulerInput) -> Dict[str, List[ToolMessag
     # adjust to do a proper topological sort (not-stream)
     # or use a more complicated data structure
     charts = scheduler_input["charts"]
-    tasks_temporary_save = scheduler_input["tasks_temporary_save"]
+    tasks_temporary_save = TaskRegistry.wrap(scheduler_input["tasks_temporary_save"])
     tasks = scheduler_input["tasks"]
     args_for_tasks = {}
     messages = scheduler_input["messages"]
@@ -528,42 +1342,111 @@ def schedule_tasks(scheduler_input: SchedulerInput) -> Dict[str, List[ToolMessag
     originals = set(observations)
     # ^^ We assume each task inserts a different key above to
     # avoid race conditions...
-    futures = []
-    retry_after = 0.1  # Retry every quarter second
-    timeout = 60 * 60
-    with ThreadPoolExecutor() as executor:
-        for task in tasks:
-            tasks_temporary_save.append(task)
-            deps = task["dependencies"]
-            task_names[task["idx"]] = (
-                task["tool"] if isinstance(task["tool"], str) else task["tool"].name
-            )
-            args_for_tasks[task["idx"]] = (task["args"])
-            if (
-                    # Depends on other tasks
-                    deps
-                    and (any([dep not in observations for dep in deps]))
-            ):
-                futures.append(
-                    executor.submit(
-                        schedule_pending_task, task, observations, charts, tasks_temporary_save, retry_after,
-                        timeout
-                    )
-                )
-            else:
-                # No deps or all deps satisfied
-                # can schedule now
-                # schedule_task.invoke(dict(task=task, observations=observations, charts=charts,
-                #                           tasks_temporary_save=tasks_temporary_save))
-                # futures.append(executor.submit(schedule_task.invoke dict(task=task, observations=observations)))
-                futures.append(executor.submit(
-                    schedule_task.invoke, dict(task=task, observations=observations, charts=charts,
-                                               tasks_temporary_save=tasks_temporary_save)))
-
-        # All tasks have been submitted or enqueued
-        # Wait for them to complete
-        wait(futures)
-    # Convert observations to new tool messages to add to the state
+    unit = TaskFetchingUnit(observations, charts, tasks_temporary_save, config,
+                            request_id=config.get("configurable", {}).get("thread_id"),
+                            single_flight=scheduler_input.get("single_flight") or new_single_flight())
+    for task in tasks:
+        tasks_temporary_save.append(task)
+        task_names[task["idx"]] = (
+            task["tool"] if isinstance(task["tool"], str) else task["tool"].name
+        )
+        args_for_tasks[task["idx"]] = (task["args"])
+        # No deps or all deps satisfied can schedule now,
+        # otherwise the task is dispatched as soon as its last dependency completes.
+        unit.submit(task)
+        if unit.expired:
+            # 超过请求截止时间，不再等待Planner生成剩余的TASK
+            break
+
+    # All tasks have been submitted or enqueued
+    # Wait for them to complete
+    unit.join()
+    # 复用检查点结果的TASK与新执行的TASK一样生成Tool消息
+    return _scheduled_tool_messages(scheduler_input, observations, originals - unit.resumed, task_names,
+                                    args_for_tasks)
+
+
+@as_runnable
+async def aschedule_tasks(scheduler_input: SchedulerInput, config: RunnableConfig) -> Dict[str, List[ToolMessage]]:
+    """`schedule_tasks`的异步版本：`tasks`为异步迭代器，Tool通过`ainvoke`调用，依赖等待使用asyncio实现"""
+    charts = scheduler_input["charts"]
+    tasks_temporary_save = TaskRegistry.wrap(scheduler_input["tasks_temporary_save"])
+    tasks = scheduler_input["tasks"]
+    args_for_tasks = {}
+    observations = scheduler_input["observations"]
+    task_names = {}
+    originals = set(observations)
+    unit = AsyncTaskFetchingUnit(observations, charts, tasks_temporary_save, config,
+                                 single_flight=scheduler_input.get("single_flight") or new_single_flight())
+    async for task in tasks:
+        tasks_temporary_save.append(task)
+        task_names[task["idx"]] = (
+            task["tool"] if isinstance(task["tool"], str) else task["tool"].name
+        )
+        args_for_tasks[task["idx"]] = (task["args"])
+        unit.submit(task)
+        if unit.expired:
+            break
+    await unit.join()
+    return _scheduled_tool_messages(scheduler_input, observations, originals - unit.resumed, task_names,
+                                    args_for_tasks)
+
+
+def execute_plan(tasks: Sequence[Task], observations: Optional[MutableMapping[int, Any]] = None,
+                 charts: Optional[List[Chart]] = None,
+                 tasks_temporary_save: Union[TaskRegistry, List[Task], None] = None,
+                 config: Optional[RunnableConfig] = None, single_flight: Optional[SingleFlight] = None,
+                 by_level: bool = False) -> Dict[int, Any]:
+    """
+    执行完整的计划（非流式）：先校验计划（TASK ID重复、依赖的TASK不存在、循环依赖），校验失败抛出`PlanValidationError`；
+    再按拓扑顺序提交，依赖满足的TASK立即派发，`by_level=True`时逐层执行，上一层全部完成后再执行下一层。
+    :param observations: 已有的TASK结果，计划中的TASK可以依赖这些结果，执行结果也写入其中
+    :return: 计划中每个TASK的结果，KEY为TASK ID
+    """
+    observations = {} if observations is None else observations
+    levels = topological_levels(tasks, known=observations.keys())
+    by_idx = {task["idx"]: task for task in tasks}
+    tasks_temporary_save = TaskRegistry.wrap(tasks_temporary_save)
+    unit = TaskFetchingUnit(observations, [] if charts is None else charts, tasks_temporary_save, config,
+                            request_id=(config or {}).get("configurable", {}).get("thread_id"),
+                            single_flight=single_flight or new_single_flight())
+    for level in levels:
+        for idx in level:
+            tasks_temporary_save.append(by_idx[idx])
+        # 同一层的TASK一起提交，调用同一个批量Tool的TASK合并调用
+        unit.submit_all(by_idx[idx] for idx in level)
+        if by_level:
+            unit.join()
+    unit.join()
+    return {idx: observations.get(idx) for idx in by_idx}
+
+
+async def aexecute_plan(tasks: Sequence[Task], observations: Optional[MutableMapping[int, Any]] = None,
+                        charts: Optional[List[Chart]] = None,
+                        tasks_temporary_save: Union[TaskRegistry, List[Task], None] = None,
+                        config: Optional[RunnableConfig] = None, single_flight: Optional[SingleFlight] = None,
+                        by_level: bool = False) -> Dict[int, Any]:
+    """`execute_plan`的异步版本"""
+    observations = {} if observations is None else observations
+    levels = topological_levels(tasks, known=observations.keys())
+    by_idx = {task["idx"]: task for task in tasks}
+    tasks_temporary_save = TaskRegistry.wrap(tasks_temporary_save)
+    unit = AsyncTaskFetchingUnit(observations, [] if charts is None else charts, tasks_temporary_save, config,
+                                 single_flight=single_flight or new_single_flight())
+    for level in levels:
+        for idx in level:
+            tasks_temporary_save.append(by_idx[idx])
+            unit.submit(by_idx[idx])
+        if by_level:
+            await unit.join()
+    await unit.join()
+    return {idx: observations.get(idx) for idx in by_idx}
+
+
+def _scheduled_tool_messages(scheduler_input: SchedulerInput, observations: Dict[int, Any], originals: Set[int],
+                             task_names: Dict[int, str], args_for_tasks: Dict[int, Any]
+                             ) -> Dict[str, List[BaseMessage]]:
+    """Convert observations to new tool messages to add to the state"""
     new_observations = {
         k: (task_names[k], args_for_tasks[k], observations[k])
         for k in sorted(observations.keys() - originals)
@@ -579,11 +1462,11 @@ def schedule_tasks(scheduler_input: SchedulerInput) -> Dict[str, List[ToolMessag
                                                  response=modify_action_output(obs), input=""),
                                              additional_kwargs={"idx": k, 'args': task_args}))
     if scheduler_input['print_dag']:
-        _print_dag(tasks_temporary_save)
+        _print_dag(TaskRegistry.wrap(scheduler_input["tasks_temporary_save"]))
     return {"messages": tool_messages}
 
 
-def _print_dag(tasks_temporary_save: List[Task]):
+def _print_dag(tasks_temporary_save: TaskRegistry):
     """打印DAG"""
     print("We can convert a graph class into Mermaid syntax.")
     print("On https://www.min2k.com/tools/mermaid/, you can view visual results of Mermaid syntax.")
@@ -608,7 +1491,9 @@ def _print_dag(tasks_temporary_save: List[Task]):
         if not task['dependencies']:
             edges.append(Edge(source='__start__', target=str(task['idx'])))
 
-    edges.append(Edge(source=str(tasks_temporary_save[-1]['idx']), target='__end__'))
+    last_task = tasks_temporary_save.last()
+    if last_task is not None:
+        edges.append(Edge(source=str(last_task['idx']), target='__end__'))
 
     dag = Graph(nodes, edges)
     print(dag.draw_mermaid())
@@ -682,18 +1567,56 @@ class PlanAndSchedule:
 
     def __init__(self, llm: Union[SwitchLLM, List[SwitchLLM]], tools: Sequence[BaseTool],
                  re_llm: Union[SwitchLLM, List[SwitchLLM]] = None, print_dag: bool = True,
-                 custom_prompts: dict[str, str] = None):
+                 custom_prompts: dict[str, str] = None, observation_budget: int = DEFAULT_OBSERVATION_BUDGET,
+                 checkpoint_store: Optional[CheckpointStore] = None):
+        """
+        :param observation_budget: 内存中保留的TASK结果字节数上限，超过后较大的结果落盘，被引用时再读取
+        :param checkpoint_store: 检查点存储，`RunnableConfig`中有`thread_id`时记录完成的TASK，
+        进程重启或在其它进程中恢复会话时不再重复调用已经完成的Tool
+        """
         self.llm = llm
         self.re_llm = re_llm
         self.tools = tools
         self.charts = []
-        self.tasks_temporary_save = []
-        self.observations = {}  # Save all previous tool responses
+        self.tasks_temporary_save = TaskRegistry()
+        # 多次Replan之间共享，Replan重复已经执行过的Tool调用时直接复用结果
+        self.single_flight = new_single_flight()
+        self.observations = ObservationStore(observation_budget)  # Save all previous tool responses
         self.print_dag = print_dag
         self.custom_prompts = custom_prompts
+        self.checkpoint_store = checkpoint_store
+        self._checkpoints: Dict[str, TaskCheckpoint] = {}
+
+    def _checkpointed(self, config: Optional[RunnableConfig]) -> Optional[RunnableConfig]:
+        """
+        设置了检查点存储且`RunnableConfig`中有`thread_id`时，第一次执行该会话前恢复检查点中的TASK与结果，
+        并在`RunnableConfig`中设置会话检查点
+        """
+        thread_id = (config or {}).get("configurable", {}).get("thread_id")
+        if self.checkpoint_store is None or thread_id is None:
+            return config
+        checkpoint = self._checkpoints.get(thread_id)
+        if checkpoint is None:
+            records = self.checkpoint_store.load(thread_id)
+            self._restore(records)
+            checkpoint = self._checkpoints[thread_id] = TaskCheckpoint(self.checkpoint_store, thread_id, records)
+        return with_task_checkpoint(config, checkpoint)
+
+    def _restore(self, records: Dict[int, TaskRecord]):
+        """恢复检查点中的结果，Replan的TASK可以继续依赖；Tool仍然存在的TASK同时恢复到TASK索引表"""
+        tools = {tool.name: tool for tool in self.tools}
+        for idx, record in sorted(records.items()):
+            if idx in self.observations:
+                continue
+            self.observations[idx] = record["observation"]
+            if record["tool"] in tools and self.tasks_temporary_save.get(idx) is None:
+                self.tasks_temporary_save.append(
+                    Task(idx=idx, tool=tools[record["tool"]], args=record["args"],
+                         dependencies=record["dependencies"], thought=record["thought"], programs=None))
 
     # @as_runnable
     def init(self, messages: List[BaseMessage], config):
+        config = self._checkpointed(config)
         planner = Planer(self.llm, self.tools, self.re_llm, self.custom_prompts).init()
         tasks = planner.stream(messages, config)
         # Begin executing the planner immediately
@@ -705,7 +1628,20 @@ class PlanAndSchedule:
         scheduled_tasks = schedule_tasks.invoke(
             SchedulerInput(messages=messages, tasks=tasks, charts=self.charts,
                            tasks_temporary_save=self.tasks_temporary_save, observations=self.observations,
-                           print_dag=self.print_dag),
+                           print_dag=self.print_dag, single_flight=self.single_flight),
+            config,
+        )
+        return scheduled_tasks
+
+    async def ainit(self, messages: List[BaseMessage], config):
+        """`init`的异步版本，可作为LangGraph的异步节点使用"""
+        config = self._checkpointed(config)
+        planner = Planer(self.llm, self.tools, self.re_llm, self.custom_prompts).init()
+        tasks = planner.astream(messages, config)
+        scheduled_tasks = await aschedule_tasks.ainvoke(
+            SchedulerInput(messages=messages, tasks=tasks, charts=self.charts,
+                           tasks_temporary_save=self.tasks_temporary_save, observations=self.observations,
+                           print_dag=self.print_dag, single_flight=self.single_flight),
             config,
         )
         return scheduled_tasks
@@ -718,17 +1654,13 @@ class PlanAndSchedule:
 
     def plan_output(self, messages: List[BaseMessage], config: Optional[RunnableConfig] = None) -> List[
         Tuple[Task, Any]]:
-        """生成计划，并执行TASK"""
+        """生成计划，并执行TASK：完整的计划校验后按依赖就绪执行，结果按TASK ID对应"""
+        config = self._checkpointed(config)
         planner = Planer(self.llm, self.tools, self.re_llm).init()
         tasks = planner.invoke(messages, config)
         # 执行TASK调用
-        schedule_tasks.invoke(
-            SchedulerInput(messages=messages, tasks=tasks, charts=self.charts,
-                           tasks_temporary_save=self.tasks_temporary_save, observations=self.observations,
-                           print_dag=self.print_dag),
-            config,
-        )
-        results = []
-        for index, task in enumerate(tasks):
-            results.append((task, self.observations.get(index + 1)))
-        return results
+        results = execute_plan(tasks, self.observations, self.charts, self.tasks_temporary_save, config,
+                               self.single_flight)
+        if self.print_dag:
+            _print_dag(self.tasks_temporary_save)
+        return [(task, results.get(task["idx"])) for task in tasks]
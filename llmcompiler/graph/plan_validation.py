@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""
+@Author  : Yc-Ma
+@Desc    : Validation and topological levels of a complete plan.
+@Time    : 2026-10-18 17:42:19
+"""
+from typing import Dict, Iterable, List, Sequence
+
+from llmcompiler.graph.output_parser import Task
+
+
+class PlanValidationError(ValueError):
+    """计划无法执行：TASK ID重复、依赖的TASK不存在或存在循环依赖"""
+
+
+def validate_plan(tasks: Sequence[Task], known: Iterable[int] = ()) -> Dict[int, Task]:
+    """
+    校验完整的计划并返回TASK ID到TASK的映射
+    :param known: 已经有结果的TASK ID（例如之前计划的TASK），可以被依赖
+    """
+    by_idx: Dict[int, Task] = {}
+    for task in tasks:
+        idx = task["idx"]
+        if idx in by_idx:
+            raise PlanValidationError(f"Duplicate task idx {idx}.")
+        by_idx[idx] = task
+    known = set(known)
+    for idx, task in by_idx.items():
+        dangling = sorted(dep for dep in task["dependencies"] if dep not in by_idx and dep not in known)
+        if dangling:
+            raise PlanValidationError(f"Task {idx} depends on unknown tasks {dangling}.")
+    return by_idx
+
+
+def topological_levels(tasks: Sequence[Task], known: Iterable[int] = ()) -> List[List[int]]:
+    """
+    校验计划并按拓扑层级分组：第一层没有计划内的依赖，其它TASK位于其最深依赖的下一层，同一层的TASK可以并行执行
+    """
+    by_idx = validate_plan(tasks, known)
+    indegree: Dict[int, int] = {idx: 0 for idx in by_idx}
+    dependents: Dict[int, List[int]] = {}
+    for idx, task in by_idx.items():
+        for dep in set(task["dependencies"]):
+            if dep in by_idx:
+                indegree[idx] += 1
+                dependents.setdefault(dep, []).append(idx)
+    levels = []
+    level = sorted(idx for idx, degree in indegree.items() if degree == 0)
+    while level:
+        levels.append(level)
+        following = []
+        for idx in level:
+            for waiter in dependents.get(idx, []):
+                indegree[waiter] -= 1
+                if indegree[waiter] == 0:
+                    following.append(waiter)
+        level = sorted(following)
+    if sum(len(level) for level in levels) != len(by_idx):
+        cyclic = sorted(idx for idx, degree in indegree.items() if degree > 0)
+        raise PlanValidationError(f"Tasks {cyclic} are part of or depend on a dependency cycle.")
+    return levels
@@ -5,12 +5,15 @@
 @Time    : 2024-08-02 09:30:49
 """
 import json
-from typing import Sequence, List, Union
+import functools
+import threading
+from collections import OrderedDict
+from typing import Any, Sequence, List, Tuple, Union
 
 from langchain_core.language_models import BaseLanguageModel
 from langchain_core.prompt_values import PromptValue
 from langchain_core.prompts import ChatPromptTemplate, SystemMessagePromptTemplate, PromptTemplate, MessagesPlaceholder
-from langchain_core.runnables import RunnableBranch
+from langchain_core.runnables import Runnable, RunnableBranch
 from langchain_core.tools import BaseTool
 from langchain_core.messages import (
     SystemMessage, ToolMessage, BaseMessage, HumanMessage,
@@ -20,7 +23,27 @@ from llmcompiler.graph.prompt import PLANER_SYSTEM_PROMPT_1, PLANER_SYSTEM_PROMP
 from llmcompiler.tools.dag.dag_flow_params import DAGFlowParams
 from llmcompiler.utils.date.date import formatted_dt_now
 from llmcompiler.graph.token_calculate import SwitchLLM, auto_switch_llm
-from llmcompiler.utils.prompt.prompt import get_custom_or_default
+from llmcompiler.tools.tool_index import ToolIndex, tool_index
+from llmcompiler.utils.prompt.prompt import get_custom_or_default, custom_prompts_key
+
+
+_PLANNERS: "OrderedDict[Tuple[Any, ...], Runnable]" = OrderedDict()
+_PLANNERS_LOCK = threading.Lock()
+_PLANNERS_SIZE = 32
+
+
+@functools.lru_cache(maxsize=32)
+def planner_tool_descriptions(tools: ToolIndex) -> str:
+    """计划提示词中的Tool描述，同一组Tool只渲染一次（`tool.args`需要生成JSON Schema）"""
+    tool_desc_list = []
+    for i, tool in enumerate(tools):
+        tool_desc = "\n"
+        tool_desc += f"{i + 1}. **Tool Name**: `{tool.name}`\n"
+        tool_desc += f"**Description**:\n {tool.description} args: {str(tool.args)}"
+        if isinstance(tool, DAGFlowParams) and tool.dag_flow_paras():
+            tool_desc += f"\n**Output Parameters that can be used by other tools**:\n{json.dumps([flow.dict() for flow in tool.dag_flow_paras()], ensure_ascii=False)}"
+        tool_desc_list.append(tool_desc)
+    return "\n".join(tool_desc_list)
 
 
 class Planer:
@@ -40,6 +63,24 @@ class Planer:
         self.custom_prompts = custom_prompts
 
     def init(self):
+        """
+        计划的执行链，按Tool列表的指纹、自定义提示词与模型缓存，图的每一步不再重新渲染Tool描述与构建提示词
+        """
+        key = (tool_index(self.tools), custom_prompts_key(self.custom_prompts), id(self.llm), id(self.re_llm))
+        with _PLANNERS_LOCK:
+            planner = _PLANNERS.get(key)
+            if planner is not None:
+                _PLANNERS.move_to_end(key)
+                return planner
+        # 执行链持有模型与Tool，缓存期间`id`不会被复用
+        planner = self._init()
+        with _PLANNERS_LOCK:
+            _PLANNERS[key] = planner
+            while len(_PLANNERS) > _PLANNERS_SIZE:
+                _PLANNERS.popitem(last=False)
+        return planner
+
+    def _init(self):
         base_prompt = ChatPromptTemplate.from_messages(
             [
                 SystemMessagePromptTemplate(
@@ -50,22 +91,16 @@ class Planer:
             ]
         )
         # print(base_prompt.pretty_print())
-        tool_desc_list = []
-        for i, tool in enumerate(self.tools):
-            tool_desc = "\n"
-            tool_desc += f"{i + 1}. **Tool Name**: `{tool.name}`\n"
-            tool_desc += f"**Description**:\n {tool.description} args: {str(tool.args)}"
-            if isinstance(tool, DAGFlowParams) and tool.dag_flow_paras():
-                tool_desc += f"\n**Output Parameters that can be used by other tools**:\n{json.dumps([flow.dict() for flow in tool.dag_flow_paras()], ensure_ascii=False)}"
-            tool_desc_list.append(tool_desc)
-        tool_descriptions = "\n".join(tool_desc_list)
-
-        dt_now = formatted_dt_now()
+        tool_descriptions = planner_tool_descriptions(tool_index(self.tools))
+        # 消息转为文本计算Token时Tool描述中的换行等字符被转义
+        cached_texts = (repr(tool_descriptions)[1:-1],)
+
+        # 当前时间在每次生成提示词时获取
         planner_prompt = base_prompt.partial(
             replan="",
             num_tools=len(self.tools) + 1,  # Add one because we're adding the join() tool at the end.
             tool_descriptions=tool_descriptions,
-            formatted_dt_now=dt_now,
+            formatted_dt_now=formatted_dt_now,
         )
         replanner_prompt = base_prompt.partial(
             replan=' - You are given "Previous Plan" which is the plan that the previous agent created along with the execution results '
@@ -76,7 +111,7 @@ class Planer:
                    " - You must continue the task index from the end of the previous one. Do not repeat task indices.",
             num_tools=len(self.tools) + 1,
             tool_descriptions=tool_descriptions,
-            formatted_dt_now=dt_now,
+            formatted_dt_now=formatted_dt_now,
         )
 
         def should_replan(state: dict[str,list[BaseMessage]]):
@@ -109,10 +144,10 @@ class Planer:
         def select_llm(prompt: PromptValue):
             messages = prompt.to_messages()
             if should_replan_llm(messages):
-                llm = auto_switch_llm(self.llm, messages)
+                llm = auto_switch_llm(self.llm, messages, cached_texts)
                 return llm
             else:
-                re_llm = auto_switch_llm(self.re_llm, messages)
+                re_llm = auto_switch_llm(self.re_llm, messages, cached_texts)
                 return re_llm
 
         def should_replan_llm(messages: List[BaseMessage]):
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+@Author  : Yc-Ma
+@Desc    : Per-task result events published while a plan is executing.
+@Time    : 2026-10-18 17:05:52
+"""
+import logging
+from typing import Any, Callable, List, Optional
+
+from typing_extensions import TypedDict
+from langchain_core.runnables import RunnableConfig
+from langchain_core.runnables.config import patch_config
+from langchain_core.tools import BaseTool
+from langgraph.config import get_stream_writer
+
+from llmcompiler.graph.output_parser import Task
+from llmcompiler.tools.generic.action_output import ActionOutput, Chart
+
+logger = logging.getLogger(__name__)
+
+# 放在`RunnableConfig["configurable"]`中的TASK结果回调
+TASK_RESULT_CALLBACK_VAR = "on_task_result"
+# LangGraph自定义流事件类型，`graph.stream(..., stream_mode="custom")`可以收到
+TASK_RESULT_EVENT = "task_result"
+
+# TASK结果状态
+TASK_SUCCESS = "success"
+TASK_FAILED = "failed"
+TASK_ERROR = "error"
+TASK_SKIPPED = "skipped"
+TASK_TIMEOUT = "timeout"
+
+
+class TaskResultEvent(TypedDict):
+    type: str
+    idx: int
+    tool: str
+    args: Any
+    status: str
+    # TASK开始执行到完成的秒数，被跳过或尚未开始执行的TASK为0
+    duration: float
+    charts: List[Chart]
+    observation: Any
+
+
+def observation_status(observation: Any) -> str:
+    """TASK结果状态：成功、Tool返回失败状态、调用出错、依赖失败被跳过、超过请求截止时间"""
+    if isinstance(observation, ActionOutput):
+        return TASK_SUCCESS if observation.status else TASK_FAILED
+    if isinstance(observation, str):
+        if observation.startswith("ERROR("):
+            return TASK_ERROR
+        if observation.startswith("SKIPPED("):
+            return TASK_SKIPPED
+        if observation.startswith("TIMEOUT("):
+            return TASK_TIMEOUT
+        return TASK_SUCCESS
+    # `schedule_task`捕获的异常堆栈
+    if isinstance(observation, list) and observation and str(observation[0]).startswith("Traceback"):
+        return TASK_ERROR
+    return TASK_SUCCESS
+
+
+def output_charts(action_output: Any) -> List[Chart]:
+    """调用成功的结果中的图表对象，支持`Chart`、`List[Chart]`、`List[List[Chart]]`"""
+    charts = []
+    if isinstance(action_output, ActionOutput) and action_output.status:
+        value = action_output.any
+        if isinstance(value, Chart):
+            charts.append(value)
+        elif isinstance(value, List):
+            for chart in value:
+                if isinstance(chart, Chart):
+                    charts.append(chart)
+                # List[List[Chart]]
+                elif isinstance(chart, List):
+                    charts.extend(ch for ch in chart if isinstance(ch, Chart))
+    return charts
+
+
+def task_result_event(task: Task, observation: Any, duration: float = 0.0) -> TaskResultEvent:
+    tool = task["tool"]
+    return TaskResultEvent(
+        type=TASK_RESULT_EVENT,
+        idx=task["idx"],
+        tool=tool.name if isinstance(tool, BaseTool) else tool,
+        args=task["args"],
+        status=observation_status(observation),
+        duration=round(duration, 6),
+        charts=output_charts(observation),
+        observation=observation,
+    )
+
+
+def with_task_result_callback(config: Optional[RunnableConfig],
+                              callback: Callable[[TaskResultEvent], None]) -> RunnableConfig:
+    """设置TASK结果回调，每个Tool TASK完成、被跳过或超时时调用一次"""
+    return patch_config(config, configurable={TASK_RESULT_CALLBACK_VAR: callback})
+
+
+def task_result_publisher(config: Optional[RunnableConfig]) -> Optional[Callable[[TaskResultEvent], None]]:
+    """
+    TASK结果的发布函数：调用`RunnableConfig`中设置的回调，并在LangGraph图中运行时写入自定义流；
+    需要在调度器的调用上下文中获取，两者都没有时返回None
+    """
+    sinks = []
+    callback = (config or {}).get("configurable", {}).get(TASK_RESULT_CALLBACK_VAR)
+    if callback is not None:
+        sinks.append(callback)
+    try:
+        sinks.append(get_stream_writer())
+    except (RuntimeError, KeyError):
+        # 不在LangGraph图中运行
+        pass
+    if not sinks:
+        return None
+
+    def publish(event: TaskResultEvent):
+        for sink in sinks:
+            try:
+                sink(event)
+            except Exception as e:
+                logger.warning(f"Failed to publish result of task {event['idx']}: {repr(e)}")
+
+    return publish
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""
+@Author  : Yc-Ma
+@Desc    : Task table keyed by idx.
+@Time    : 2026-10-18 12:05:36
+"""
+import bisect
+import threading
+from typing import Dict, Iterator, List, Optional, Union
+
+from langchain_core.tools import BaseTool
+
+from llmcompiler.graph.output_parser import Task
+
+
+class TaskRegistry:
+    """
+    已生成TASK的索引表，兼容原有`tasks_temporary_save`列表的用法（`append`、遍历、`len`、下标访问），
+    并按TASK ID维护索引，参数解析时查询依赖TASK、上一个Tool TASK、下游TASK都不再遍历全部TASK。
+    - 多次Replan时TASK会持续累加，同一个TASK ID重复出现时以最新的TASK为准；
+    - `join`不会被依赖，不进入TASK ID索引。
+    """
+
+    def __init__(self, tasks: Optional[List[Task]] = None):
+        """
+        :param tasks: 作为底层存储的TASK列表，追加的TASK同时写入该列表
+        """
+        self._tasks: List[Task] = tasks if tasks is not None else []
+        self._by_idx: Dict[int, Task] = {}
+        # 有序的Tool TASK ID，用于查询指定TASK之前最近的Tool TASK
+        self._tool_ids: List[int] = []
+        self._dependents: Dict[int, List[int]] = {}
+        self._lock = threading.Lock()
+        for task in self._tasks:
+            self._index(task)
+
+    @classmethod
+    def wrap(cls, tasks: Union["TaskRegistry", List[Task], None]) -> "TaskRegistry":
+        """将TASK列表包装为索引表，已经是索引表时直接返回"""
+        if isinstance(tasks, TaskRegistry):
+            return tasks
+        return cls(tasks)
+
+    def append(self, task: Task):
+        with self._lock:
+            self._tasks.append(task)
+            self._index(task)
+
+    def get(self, idx: int) -> Optional[Task]:
+        """按TASK ID获取Tool TASK"""
+        return self._by_idx.get(idx)
+
+    def last(self) -> Optional[Task]:
+        """最后生成的TASK"""
+        return self._tasks[-1] if self._tasks else None
+
+    def previous_tool_idx(self, idx: int) -> Optional[int]:
+        """TASK ID小于`idx`的最近一个Tool TASK"""
+        with self._lock:
+            position = bisect.bisect_left(self._tool_ids, idx)
+            return self._tool_ids[position - 1] if position > 0 else None
+
+    def dependents(self, idx: int) -> List[int]:
+        """直接依赖`idx`的TASK ID"""
+        return list(self._dependents.get(idx, ()))
+
+    def clear(self):
+        with self._lock:
+            self._tasks.clear()
+            self._by_idx.clear()
+            self._tool_ids.clear()
+            self._dependents.clear()
+
+    def _index(self, task: Task):
+        idx = task["idx"]
+        for dep in task["dependencies"]:
+            dependents = self._dependents.setdefault(dep, [])
+            if idx not in dependents:
+                dependents.append(idx)
+        if not isinstance(task["tool"], BaseTool):
+            return
+        if idx not in self._by_idx:
+            bisect.insort(self._tool_ids, idx)
+        self._by_idx[idx] = task
+
+    def __iter__(self) -> Iterator[Task]:
+        return iter(list(self._tasks))
+
+    def __len__(self) -> int:
+        return len(self._tasks)
+
+    def __getitem__(self, item):
+        return self._tasks[item]
+
+    def __bool__(self) -> bool:
+        return bool(self._tasks)
+
+    def __repr__(self) -> str:
+        return f"TaskRegistry({self._tasks!r})"
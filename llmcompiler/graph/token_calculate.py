@@ -4,7 +4,8 @@
 @Desc    : LLMCompiler
 @Time    : 2024-08-02 09:30:49
 """
-from typing import Tuple, List, Union, Any
+import functools
+from typing import Tuple, List, Sequence, Union, Any
 
 import tiktoken
 import logging
@@ -25,19 +26,20 @@ class SwitchLLM(BaseModel):
 
 
 def auto_switch_llm(switch_llms: Union[BaseLanguageModel, List[BaseLanguageModel], SwitchLLM, List[SwitchLLM]],
-                    input_message: Any) -> BaseLanguageModel:
+                    input_message: Any, cached_texts: Sequence[str] = ()) -> BaseLanguageModel:
     """
     自动切换LLM
     :param switch_llms: 模型列表，按照列表传入的顺序进行切换，例如如果LLM1不满足Token长度限制，则切换到LLM2依次类推
     :param input_message: 需要计算Token的文本
+    :param cached_texts: 文本中每次请求都相同的片段，片段的Token数量只计算一次
     TODO:目前仅支持通过计算GPT4和GPT35的Token然后判断是否切换到其它模型，不支持其它模型的Token计算
     """
-    llm = auto_switch_llm_select(switch_llms, input_message)
+    llm = auto_switch_llm_select(switch_llms, input_message, cached_texts)
     return llm
 
 
 def auto_switch_llm_select(switch_llms: Union[BaseLanguageModel, List[BaseLanguageModel], SwitchLLM, List[SwitchLLM]],
-                           input_message: Any) -> BaseLanguageModel:
+                           input_message: Any, cached_texts: Sequence[str] = ()) -> BaseLanguageModel:
     if isinstance(switch_llms, SwitchLLM):
         return switch_llms.llm
     elif isinstance(switch_llms, BaseLanguageModel):
@@ -49,7 +51,7 @@ def auto_switch_llm_select(switch_llms: Union[BaseLanguageModel, List[BaseLangua
                 for switch_llm in sort_switch_llms:
                     llm = switch_llm.llm
                     # 计算GPT4和GPT35的Token是否超过限制，如果没有超过限制则使用GPT模型，否则默认获取最后一个可切换模型
-                    token = openai_gpt_model_token(str(input_message), llm.model)
+                    token = openai_gpt_model_token(str(input_message), llm.model, cached_texts)
                     if token[1]:
                         token_num = token[0]
                         if token_num + switch_llm.out_token < switch_llm.max_token:
@@ -72,19 +74,39 @@ def auto_switch_llm_select(switch_llms: Union[BaseLanguageModel, List[BaseLangua
         raise ValueError("No BaseLanguageModel objects found in the list")
 
 
-def openai_gpt_model_token(text: str, model: str) -> Tuple[int, bool]:
+def openai_gpt_model_token(text: str, model: str, cached_texts: Sequence[str] = ()) -> Tuple[int, bool]:
     """
     使用模型名称获取文本的Token数量，返回Token长度和是否支持当前模型计算Token的标记
     :param text: 文本
     :param model: GPT模型名称，例如`gpt-4`、`gpt-3.5-turbo`、`gpt-3.5`
+    :param cached_texts: 文本中每次请求都相同的片段（例如Tool描述），片段的Token数量只计算一次
     """
     model = extract_text_cn_en_num(model)
     if model.startswith('gpt4') or model.startswith('gpt35'):
-        encoding = tiktoken.get_encoding("cl100k_base")
-        # encoding = tiktoken.encoding_for_model(model)
-        num_tokens = len(encoding.encode(text))
+        num_tokens = 0
+        for cached_text in cached_texts:
+            if cached_text and cached_text in text:
+                text = text.replace(cached_text, "", 1)
+                num_tokens += text_token_count(cached_text)
+        num_tokens += text_token_count(text, cache=False)
         return num_tokens, True
     else:
         return 0, False
 
 
+@functools.lru_cache(maxsize=64)
+def _cached_token_count(text: str) -> int:
+    return len(tiktoken.get_encoding("cl100k_base").encode(text))
+
+
+def text_token_count(text: str, cache: bool = True) -> int:
+    """
+    `cl100k_base`编码的Token数量
+    :param cache: 是否缓存结果，重复出现的长文本只编码一次
+    """
+    if cache:
+        return _cached_token_count(text)
+    # encoding = tiktoken.encoding_for_model(model)
+    return len(tiktoken.get_encoding("cl100k_base").encode(text))
+
+
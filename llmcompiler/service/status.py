@@ -9,6 +9,8 @@ from typing import List, Sequence
 from langchain_core.tools import BaseTool
 from pydantic import BaseModel, Field
 
+from llmcompiler.tools.tool_index import tool_index
+
 
 class ToolCallStatus(BaseModel):
     tool_name: str = Field(description="工具名称")
@@ -75,10 +77,6 @@ def long_match_tool(text: str, tools: Sequence[BaseTool]) -> ToolCallStatus:
     """
     匹配Tool-Name按照Tool-Name长度降序排序拿First
     """
-    call = []
-    for tool in tools:
-        if tool.name in text:
-            call.append(ToolCallStatus(tool_name=tool.name, text=text))
-    sorted_contents = sorted(call, key=lambda x: len(x.tool_name), reverse=True)
-    if sorted_contents:
-        return sorted_contents[0]
+    tool = tool_index(tools).longest_match(text)
+    if tool is not None:
+        return ToolCallStatus(tool_name=tool.name, text=text)
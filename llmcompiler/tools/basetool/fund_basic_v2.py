@@ -85,6 +85,11 @@ class FundBasicV2(CompilerBaseTool):
 
     output_model: Type[BaseModel] = OutputSchema
     dag_flow_kwargs: List[str] = ['ts_code', 'found_date']
+    # 基金基础信息每日更新，缓存半天
+    cache_ttl: Optional[float] = 12 * 60 * 60
+    # tushare接口按分钟限制调用次数
+    rate_limit: Optional[Union[str, float]] = "200/min"
+    rate_limit_burst: Optional[int] = 10
 
     @tool_set_pydantic_default
     @tool_kwargs_filter
@@ -9,7 +9,7 @@ import inspect
 import logging
 import importlib
 from abc import ABC, abstractmethod
-from typing import List, Dict, Any, Tuple, Optional, Union
+from typing import List, Dict, Any, Tuple, Optional, Union, Literal
 
 import pandas as pd
 from langchain_core.tools import StructuredTool
@@ -18,6 +18,7 @@ from pydantic import BaseModel
 from langchain.tools import BaseTool
 
 from llmcompiler.tools.dag.dag_flow_params import DAGFlowParams
+from llmcompiler.tools.configure.retry_policy import RetryPolicy
 from llmcompiler.tools.generic.action_output import DAGFlow, DAGFlowKwargs, ActionOutput
 
 logger = logging.getLogger(__name__)
@@ -38,6 +39,34 @@ class CompilerBaseTool(BaseTool, DAGFlowParams, ABC):
     dag_flow_kwargs: List[str] = None
     """Parameters that may be relied upon by downstream interfaces."""
 
+    cache_ttl: Optional[float] = None
+    """Seconds to cache successful results across requests, `None` disables the cache."""
+
+    cache_key_fields: Optional[List[str]] = None
+    """Arguments that identify a cached result, `None` means all arguments."""
+
+    max_concurrency: Optional[int] = None
+    """Maximum concurrent backend calls of this tool in the process, `None` means unlimited."""
+
+    rate_limit: Optional[Union[str, float]] = None
+    """Backend call rate shared by all requests, e.g. `200/min`, `10/s`, or calls per second."""
+
+    rate_limit_burst: Optional[int] = None
+    """Calls allowed at once after the tool has been idle, defaults to 1."""
+
+    retry_policy: Optional[RetryPolicy] = None
+    """Retry transient failures with backoff, `None` calls the backend once."""
+
+    idempotent: bool = False
+    """Calls can safely run twice, a hedged attempt is issued when a call exceeds the observed p95 latency."""
+
+    max_batch_size: Optional[int] = None
+    """Maximum tasks fused into one `_run_batch` call, `None` means unlimited."""
+
+    execution: Literal["thread", "process", "remote"] = "thread"
+    """Where `_run` executes, `process` ships validated args to a warm worker process for CPU-bound tools,
+    `remote` enqueues them to the broker set by `configure_remote_broker` for remote workers."""
+
     def flow(self, data: Union[List[BaseModel], pd.DataFrame, BaseModel, Dict[str, Any]]) -> DAGFlow:
         """
         从Data封装DAGFlow对象.
@@ -98,6 +127,19 @@ class CompilerBaseTool(BaseTool, DAGFlowParams, ABC):
         to child implementations to enable tracing.
         """
 
+    def _run_batch(self, batch_kwargs: List[Dict[str, Any]]) -> List[ActionOutput]:
+        """
+        可选：一次后端调用处理多组参数（例如SQL的IN条件、HTTP的批量接口），按参数顺序返回每组参数的结果。
+        子类实现后，调度器会将同时就绪、调用该Tool的多个TASK合并为一次调用，再按TASK拆分结果。
+        :param batch_kwargs: 每个TASK经过`args_schema`校验后的参数
+        """
+        raise NotImplementedError
+
+
+def supports_batch(tool: BaseTool) -> bool:
+    """Tool是否实现了`_run_batch`"""
+    return isinstance(tool, CompilerBaseTool) and type(tool)._run_batch is not CompilerBaseTool._run_batch
+
 
 class Tools(ABC):
     """
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""
+@Author  : Yc-Ma
+@Desc    : Tool result cache interface.
+@Time    : 2026-10-18 13:02:44
+"""
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Optional
+
+
+class BaseToolCache(ABC):
+    """
+    跨请求的Tool结果缓存，缓存KEY由Tool名称与参数KEY组成。
+    缓存命中与未命中次数按Tool统计（进程内统计）。
+    """
+
+    def __init__(self):
+        self._stats: Dict[str, Dict[str, int]] = {}
+        self._stats_lock = threading.Lock()
+
+    def lookup(self, tool_name: str, key: str) -> Optional[Any]:
+        """读取缓存并记录命中情况，未命中或已过期返回None"""
+        value = self.get(tool_name, key)
+        with self._stats_lock:
+            stats = self._stats.setdefault(tool_name, {"hits": 0, "misses": 0})
+            stats["hits" if value is not None else "misses"] += 1
+        return value
+
+    def stats(self, tool_name: str = None) -> Dict[str, Any]:
+        """
+        缓存命中统计
+        :param tool_name: 为空时返回全部Tool的统计，KEY为Tool名称
+        """
+        with self._stats_lock:
+            if tool_name is not None:
+                return self._with_rate(self._stats.get(tool_name, {"hits": 0, "misses": 0}))
+            return {name: self._with_rate(stats) for name, stats in self._stats.items()}
+
+    def reset_stats(self):
+        with self._stats_lock:
+            self._stats.clear()
+
+    @staticmethod
+    def _with_rate(stats: Dict[str, int]) -> Dict[str, Any]:
+        total = stats["hits"] + stats["misses"]
+        return {**stats, "hit_rate": stats["hits"] / total if total else 0.0}
+
+    @abstractmethod
+    def get(self, tool_name: str, key: str) -> Optional[Any]:
+        """读取缓存，未命中或已过期返回None"""
+
+    @abstractmethod
+    def set(self, tool_name: str, key: str, value: Any, ttl: float):
+        """
+        写入缓存
+        :param ttl: 过期时间（秒）
+        """
+
+    @abstractmethod
+    def invalidate(self, tool_name: str = None):
+        """删除指定Tool的全部缓存，为空时清空缓存"""
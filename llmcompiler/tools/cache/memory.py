@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""
+@Author  : Yc-Ma
+@Desc    : In-memory LRU tool result cache.
+@Time    : 2026-10-18 13:05:12
+"""
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+
+from llmcompiler.tools.cache.base import BaseToolCache
+
+
+class MemoryToolCache(BaseToolCache):
+    """进程内LRU缓存，超过`max_entries`时淘汰最久未使用的结果"""
+
+    def __init__(self, max_entries: int = 1024):
+        super().__init__()
+        self.max_entries = max_entries
+        # (Tool名称, 参数KEY) -> (过期时间, 结果)
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, tool_name: str, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get((tool_name, key))
+            if entry is None:
+                return None
+            expire_at, value = entry
+            if expire_at <= time.time():
+                del self._entries[(tool_name, key)]
+                return None
+            self._entries.move_to_end((tool_name, key))
+            return value
+
+    def set(self, tool_name: str, key: str, value: Any, ttl: float):
+        with self._lock:
+            self._entries[(tool_name, key)] = (time.time() + ttl, value)
+            self._entries.move_to_end((tool_name, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, tool_name: str = None):
+        with self._lock:
+            if tool_name is None:
+                self._entries.clear()
+            else:
+                for entry_key in [k for k in self._entries if k[0] == tool_name]:
+                    del self._entries[entry_key]
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""
+@Author  : Yc-Ma
+@Desc    : SQLite tool result cache shared by worker processes.
+@Time    : 2026-10-18 13:11:37
+"""
+import os
+import time
+import pickle
+import logging
+import sqlite3
+import threading
+from typing import Any, Optional
+
+from llmcompiler.tools.cache.base import BaseToolCache
+
+logger = logging.getLogger(__name__)
+
+
+class SqliteToolCache(BaseToolCache):
+    """
+    本地SQLite缓存，同一台机器上的多个工作进程可以共享同一个数据库文件。
+    结果使用pickle序列化，无法序列化的结果不缓存；过期的结果在读取时不返回，
+    每写入`cleanup_every`次或距上次清理超过`cleanup_interval`秒时删除过期结果，并淘汰超过`max_entries`的最久未访问的结果。
+    """
+
+    def __init__(self, path: str, max_entries: int = 100000, cleanup_every: int = 256,
+                 cleanup_interval: float = 60.0):
+        """
+        :param path: 数据库文件路径
+        :param max_entries: 最多缓存的结果数量，清理之间的写入可能暂时超出
+        :param cleanup_every: 每个实例写入多少次后清理一次
+        :param cleanup_interval: 两次清理之间的最长秒数
+        """
+        super().__init__()
+        self.path = os.path.abspath(path)
+        self.max_entries = max_entries
+        self.cleanup_every = cleanup_every
+        self.cleanup_interval = cleanup_interval
+        self._writes = 0
+        self._cleaned_at = time.time()
+        self._cleanup_lock = threading.Lock()
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._connection().execute(
+            "CREATE TABLE IF NOT EXISTS tool_cache ("
+            "tool TEXT NOT NULL, key TEXT NOT NULL, expire_at REAL NOT NULL, accessed_at REAL NOT NULL, "
+            "value BLOB NOT NULL, PRIMARY KEY (tool, key))")
+        self._connection().execute("CREATE INDEX IF NOT EXISTS tool_cache_accessed ON tool_cache (accessed_at)")
+        self._connection().execute("CREATE INDEX IF NOT EXISTS tool_cache_expire ON tool_cache (expire_at)")
+
+    def _connection(self) -> sqlite3.Connection:
+        """每个线程使用独立的连接"""
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            self._local.connection = connection
+        return connection
+
+    def get(self, tool_name: str, key: str) -> Optional[Any]:
+        now = time.time()
+        connection = self._connection()
+        row = connection.execute("SELECT expire_at, value FROM tool_cache WHERE tool = ? AND key = ?",
+                                 (tool_name, key)).fetchone()
+        if row is None:
+            return None
+        expire_at, value = row
+        if expire_at <= now:
+            connection.execute("DELETE FROM tool_cache WHERE tool = ? AND key = ? AND expire_at <= ?",
+                               (tool_name, key, now))
+            return None
+        try:
+            result = pickle.loads(value)
+        except Exception as e:
+            logger.warning(f"Failed to load cached result of {tool_name}: {repr(e)}")
+            connection.execute("DELETE FROM tool_cache WHERE tool = ? AND key = ?", (tool_name, key))
+            return None
+        connection.execute("UPDATE tool_cache SET accessed_at = ? WHERE tool = ? AND key = ?", (now, tool_name, key))
+        return result
+
+    def set(self, tool_name: str, key: str, value: Any, ttl: float):
+        try:
+            blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception as e:
+            logger.warning(f"Result of {tool_name} can not be cached: {repr(e)}")
+            return
+        now = time.time()
+        connection = self._connection()
+        connection.execute("INSERT OR REPLACE INTO tool_cache (tool, key, expire_at, accessed_at, value) "
+                           "VALUES (?, ?, ?, ?, ?)", (tool_name, key, now + ttl, now, sqlite3.Binary(blob)))
+        if self._cleanup_due(now):
+            self.cleanup(now)
+
+    def _cleanup_due(self, now: float) -> bool:
+        with self._cleanup_lock:
+            self._writes += 1
+            if self._writes < self.cleanup_every and now - self._cleaned_at < self.cleanup_interval:
+                return False
+            self._writes = 0
+            self._cleaned_at = now
+            return True
+
+    def cleanup(self, now: Optional[float] = None):
+        """删除过期的结果，并淘汰超过`max_entries`的最久未访问的结果"""
+        now = time.time() if now is None else now
+        connection = self._connection()
+        connection.execute("DELETE FROM tool_cache WHERE expire_at <= ?", (now,))
+        overflow = connection.execute("SELECT COUNT(*) FROM tool_cache").fetchone()[0] - self.max_entries
+        if overflow > 0:
+            connection.execute("DELETE FROM tool_cache WHERE rowid IN "
+                               "(SELECT rowid FROM tool_cache ORDER BY accessed_at LIMIT ?)", (overflow,))
+
+    def invalidate(self, tool_name: str = None):
+        if tool_name is None:
+            self._connection().execute("DELETE FROM tool_cache")
+        else:
+            self._connection().execute("DELETE FROM tool_cache WHERE tool = ?", (tool_name,))
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+"""
+@Author  : Yc-Ma
+@Desc    : Process-wide tool result cache.
+@Time    : 2026-10-18 13:20:05
+"""
+import threading
+from typing import Any, Dict, Optional
+
+from llmcompiler.tools.cache.base import BaseToolCache
+from llmcompiler.tools.cache.memory import MemoryToolCache
+
+_CACHE: Optional[BaseToolCache] = None
+_CACHE_LOCK = threading.Lock()
+
+
+def get_tool_cache() -> BaseToolCache:
+    """获取进程级共享的Tool结果缓存，默认使用进程内LRU缓存"""
+    global _CACHE
+    if _CACHE is None:
+        with _CACHE_LOCK:
+            if _CACHE is None:
+                _CACHE = MemoryToolCache()
+    return _CACHE
+
+
+def configure_tool_cache(cache: BaseToolCache) -> BaseToolCache:
+    """
+    替换进程级共享的Tool结果缓存，例如多个工作进程共享缓存：
+    `configure_tool_cache(SqliteToolCache('/data/llmcompiler/tool_cache.db'))`
+    """
+    global _CACHE
+    with _CACHE_LOCK:
+        _CACHE = cache
+    return _CACHE
+
+
+def invalidate_tool_cache(tool_name: str = None):
+    """删除指定Tool的缓存结果，为空时清空缓存"""
+    get_tool_cache().invalidate(tool_name)
+
+
+def tool_cache_stats(tool_name: str = None) -> Dict[str, Any]:
+    """缓存命中统计"""
+    return get_tool_cache().stats(tool_name)
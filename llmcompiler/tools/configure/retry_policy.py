@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+@Author  : Yc-Ma
+@Desc    : Tool retry policy with exponential backoff and jitter.
+@Time    : 2026-10-18 15:58:20
+"""
+import time
+import random
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Optional, Tuple, Type
+
+from pydantic import BaseModel, Field
+
+from llmcompiler.tools.generic.action_output import ActionOutput
+
+logger = logging.getLogger(__name__)
+
+
+class RetryPolicy(BaseModel):
+    """
+    Tool调用重试策略：第`n`次重试前等待`initial_delay * multiplier ** (n - 1)`秒（不超过`max_delay`），
+    并按`jitter`比例随机缩短等待时间，避免多个请求同时重试冲击后端。
+    """
+    max_attempts: int = Field(default=3, description="最多调用次数，包括第一次调用")
+    initial_delay: float = Field(default=0.2, description="第一次重试前的等待秒数")
+    max_delay: float = Field(default=5.0, description="重试前的最长等待秒数")
+    multiplier: float = Field(default=2.0, description="每次重试等待时间的增长倍数")
+    jitter: float = Field(default=1.0, description="等待时间随机缩短的最大比例，0表示不随机")
+    retry_on: Tuple[Type[BaseException], ...] = Field(default=(Exception,), description="需要重试的异常类型")
+    retry_on_failed_output: bool = Field(default=False, description="Tool返回失败状态的ActionOutput时是否重试")
+
+    def retryable(self, error: BaseException) -> bool:
+        return isinstance(error, self.retry_on)
+
+    def delay(self, attempt: int) -> float:
+        """第`attempt`次调用失败后，下一次调用前的等待秒数"""
+        delay = min(self.max_delay, self.initial_delay * self.multiplier ** (attempt - 1))
+        return delay * (1 - random.uniform(0, min(1.0, max(0.0, self.jitter))))
+
+    def should_retry_output(self, output: Any) -> bool:
+        return self.retry_on_failed_output and isinstance(output, ActionOutput) and not output.status
+
+
+def _next_delay(policy: RetryPolicy, attempt: int, deadline: Optional[float]) -> Optional[float]:
+    """下一次调用前的等待秒数，没有剩余调用次数或等待后会超过截止时间时返回None"""
+    if attempt >= policy.max_attempts:
+        return None
+    delay = policy.delay(attempt)
+    if deadline is not None and time.time() + delay >= deadline:
+        return None
+    return delay
+
+
+def call_with_retry(fn: Callable[[], Any], policy: Optional[RetryPolicy], deadline: Optional[float] = None,
+                    name: str = "") -> Any:
+    """
+    按重试策略调用`fn`，重试次数用完后返回最后一次的结果或抛出最后一次的异常
+    :param deadline: 请求截止时间，等待重试会超过截止时间时不再重试
+    """
+    if policy is None:
+        return fn()
+    attempt = 1
+    while True:
+        try:
+            output = fn()
+        except Exception as e:
+            delay = _next_delay(policy, attempt, deadline) if policy.retryable(e) else None
+            if delay is None:
+                raise
+            logger.warning(f"Retry {name} in {delay:.2f} seconds after attempt {attempt} failed: {repr(e)}")
+        else:
+            delay = _next_delay(policy, attempt, deadline) if policy.should_retry_output(output) else None
+            if delay is None:
+                return output
+            logger.warning(f"Retry {name} in {delay:.2f} seconds after attempt {attempt} returned a failure.")
+        time.sleep(delay)
+        attempt += 1
+
+
+async def acall_with_retry(fn: Callable[[], Awaitable[Any]], policy: Optional[RetryPolicy],
+                           deadline: Optional[float] = None, name: str = "") -> Any:
+    """`call_with_retry`的异步版本，`fn`返回协程"""
+    if policy is None:
+        return await fn()
+    attempt = 1
+    while True:
+        try:
+            output = await fn()
+        except Exception as e:
+            delay = _next_delay(policy, attempt, deadline) if policy.retryable(e) else None
+            if delay is None:
+                raise
+            logger.warning(f"Retry {name} in {delay:.2f} seconds after attempt {attempt} failed: {repr(e)}")
+        else:
+            delay = _next_delay(policy, attempt, deadline) if policy.should_retry_output(output) else None
+            if delay is None:
+                return output
+            logger.warning(f"Retry {name} in {delay:.2f} seconds after attempt {attempt} returned a failure.")
+        await asyncio.sleep(delay)
+        attempt += 1
@@ -11,18 +11,21 @@ import numpy as np
 import pandas as pd
 import threading
 import functools
-from concurrent.futures import ThreadPoolExecutor
 from typing import List, Optional, Any, Dict, Union
+from langchain_core.runnables.config import ensure_config
 from langchain_core.tools import BaseTool
 
 from llmcompiler.graph.output_parser import Task
-from llmcompiler.graph.plan_and_schedule import ResolvedArgs
+from llmcompiler.graph.arg_resolver import ResolvedArgs
 from llmcompiler.tools.basic import CompilerBaseTool
 from llmcompiler.tools.configure.kwargs_clear import kwargs_filter_placeholder, kwargs_clear, kwargs_filter
 from llmcompiler.tools.dag.dag_flow_params import RESOLVED_RAGS_DEPENDENCY_VAR, DISABLE_ROW_CALL
 # from llmcompiler.tools.dag.dag_flow_params import DISABLE_ROW_CALL
 from llmcompiler.tools.generic.action_output import ActionOutput, DAGFlow, ActionOutputError
-from llmcompiler.utils.thread.pool_executor import max_worker
+from llmcompiler.utils.thread.execution_service import get_execution_service, tool_quota_keys, ROW_LANE
+from llmcompiler.utils.thread.rate_limit import acquire_tool_rate
+from llmcompiler.tools.configure.retry_policy import call_with_retry
+from llmcompiler.utils.thread.deadline import request_deadline, remaining_time
 
 
 def tool_kwargs_filter(invalid_value: Optional[List[Any]] = None, pattern_str: Optional[str] = None):
@@ -31,6 +34,7 @@ def tool_kwargs_filter(invalid_value: Optional[List[Any]] = None, pattern_str: O
     """
 
     def decorator(func):
+        @functools.wraps(func)
         def wrapper(*args, **kwargs):
             kwargs = kwargs_filter(kwargs, invalid_value, pattern_str)
             result = func(*args, **kwargs)
@@ -53,6 +57,7 @@ def tool_kwargs_clear(invalid_value: List[Any]):
     """
 
     def decorator(func):
+        @functools.wraps(func)
         def wrapper(*args, **kwargs):
             kwargs = kwargs_clear(kwargs, invalid_value)
             result = func(*args, **kwargs)
@@ -74,6 +79,7 @@ def tool_kwargs_filter_placeholder(pattern_str: str):
     """
 
     def decorator(func):
+        @functools.wraps(func)
         def wrapper(*args, **kwargs):
             kwargs = kwargs_filter_placeholder(kwargs, pattern_str)
             result = func(*args, **kwargs)
@@ -95,6 +101,7 @@ def tool_set_pydantic_default(func):
     Set default values for parameters that are not input.
     """
 
+    @functools.wraps(func)
     def wrapper(*args, **kwargs):
         tool: BaseTool = args[0]
         if not hasattr(tool, 'args') or not isinstance(tool.args, dict):
@@ -256,6 +263,38 @@ def _has_disable_row_call_fields(dict: Dict[str, ResolvedArgs]) -> List[str]:
     return fields
 
 
+def disable_row_call_output_fields(tool: BaseTool) -> List[str]:
+    """Fields with the DISABLE_ROW_CALL=True parameter in the OUTPUTSCHEMA of the tool."""
+    output_model = getattr(tool, 'output_model', None)
+    if output_model is None:
+        return []
+    disable_row_call = next(iter(DISABLE_ROW_CALL.keys()), None)
+    fields = []
+    for key, value in output_model.model_fields.items():
+        json_schema_extra = getattr(value, 'json_schema_extra', {})
+        if isinstance(json_schema_extra, dict) and json_schema_extra.get(disable_row_call):
+            fields.append(key)
+    return fields
+
+
+def row_call_options(tool: BaseTool) -> Optional[Dict[str, Any]]:
+    """The `tool_call_by_row_pass_parameters` options of the tool, None if the tool is not called by row."""
+    return getattr(getattr(tool, '_run', None), 'row_call', None)
+
+
+def resolved_args_dependency(tool: BaseTool) -> Optional[Dict[str, ResolvedArgs]]:
+    """
+    Get the upstream dependency of each resolved parameter of the running task.
+    The scheduler passes it through the `RunnableConfig` of the current tool call, so tool instances can be shared
+    between concurrent tasks and requests. `tool.metadata` is still read for tools called outside the scheduler.
+    """
+    config = ensure_config()
+    tool_dep_var = config.get('configurable', {}).get(RESOLVED_RAGS_DEPENDENCY_VAR, None)
+    if tool_dep_var is None and tool.metadata:
+        tool_dep_var = tool.metadata.get(RESOLVED_RAGS_DEPENDENCY_VAR, None)
+    return tool_dep_var
+
+
 def tool_call_by_row_pass_parameters(fill_non_list_row: bool = False, detect_disable_row_call: bool = False,
                                      limit: int = -1):
     """
@@ -270,12 +309,11 @@ def tool_call_by_row_pass_parameters(fill_non_list_row: bool = False, detect_dis
     """
 
     def decorator(func):
+        @functools.wraps(func)
         def wrapper(*args, **kwargs):
             print('Parsing and executing multirow parameters...')
             tool: BaseTool = args[0]
-            if tool.metadata is None:
-                tool.metadata = {}
-            tool_dep_var = tool.metadata.get(RESOLVED_RAGS_DEPENDENCY_VAR, None)
+            tool_dep_var = resolved_args_dependency(tool)
             disable_row_call_fields = _has_disable_row_call_fields(tool_dep_var)
             if tool_dep_var and disable_row_call_fields and detect_disable_row_call:
                 df = kwargs_convert_df(kwargs, True, fill_non_list_row, disable_row_call_fields)
@@ -289,12 +327,28 @@ def tool_call_by_row_pass_parameters(fill_non_list_row: bool = False, detect_dis
                 row_dict = row.to_dict()
                 params.append(row_dict)
                 print(row_dict)
-            with ThreadPoolExecutor(max_workers=max_worker()) as executor:
-                results = list(executor.map(lambda x: func(*args, **x), params))
+            # 按行调用提交到进程级共享的执行服务，线程数量与每个Tool的并发数量都有上限
+            # 每一行调用前获取令牌，失败时按重试策略重试这一行
+            # 超过请求截止时间后取消尚未开始的按行调用
+            deadline = request_deadline()
+
+            def call(row):
+                def attempt():
+                    acquire_tool_rate(tool, remaining_time(deadline))
+                    return func(*args, **row)
+
+                return call_with_retry(attempt, getattr(tool, "retry_policy", None), deadline, tool.name)
+
+            service = get_execution_service()
+            results = service.map(call, params, lane=ROW_LANE, keys=tool_quota_keys(service, tool),
+                                  timeout=remaining_time(deadline))
 
             output = merge_output(results)
             return output
 
+        # 调度器据此判断下游TASK能否在上游按批次返回结果时逐批执行
+        wrapper.row_call = dict(fill_non_list_row=fill_non_list_row, detect_disable_row_call=detect_disable_row_call,
+                                limit=limit)
         return wrapper
 
     if callable(fill_non_list_row):
@@ -312,6 +366,7 @@ def tool_set_default_value(**kwargs_v):
     """
 
     def decorator(func):
+        @functools.wraps(func)
         def wrapper(*args, **kwargs):
             if not kwargs_v:
                 raise ValueError("The user must define at least one default value.")
@@ -338,6 +393,7 @@ def tool_symbol_separated_string(fields: List[str], symbol: str = ','):
     """
 
     def decorator(func):
+        @functools.wraps(func)
         def wrapper(*args, **kwargs):
             for field in fields:
                 if field in kwargs:
@@ -360,6 +416,7 @@ def tool_remove_suffix(fields: List[str], suffix: List[str]):
     """
 
     def decorator(func):
+        @functools.wraps(func)
         def wrapper(*args, **kwargs):
             for field in fields:
                 if field in kwargs:
@@ -397,6 +454,7 @@ def tool_remove_prefix(fields: List[str], prefix: List[str]):
     """
 
     def decorator(func):
+        @functools.wraps(func)
         def wrapper(*args, **kwargs):
             for field in fields:
                 if field in kwargs:
@@ -434,6 +492,7 @@ def tool_string_spilt(fields: List[str], split: str, index: int = 0):
     """
 
     def decorator(func):
+        @functools.wraps(func)
         def wrapper(*args, **kwargs):
             for field in fields:
                 if field in kwargs:
@@ -535,6 +594,7 @@ def tool_timeit(format_str: str = None):
     """
 
     def decorator(func):
+        @functools.wraps(func)
         def wrapper(*args, **kwargs):
             start_time = time.time()
             result = func(*args, **kwargs)
@@ -5,7 +5,7 @@
 @Time    : 2024-08-02 09:30:49
 """
 from enum import Enum
-from typing import Any, List, Dict, Tuple, Union
+from typing import Any, List, Dict, Tuple, Union, Iterable, Iterator
 
 import pandas as pd
 from pydantic import BaseModel, Field
@@ -108,3 +108,74 @@ def action_output_charts_df_parse(
                 else:
                     dfs.append(df)
     return charts, dfs
+
+
+class ActionOutputStream:
+    """
+    按批次返回的Tool结果（例如分页接口），`batches`依次产生ActionOutput，每个批次包含部分行。
+    调度器在批次到达时即可启动下游按行调用的TASK，全部批次按行合并后作为TASK的最终结果。
+    eg.`return ActionOutputStream(self._pages(**kwargs), tool_name=self.name)`
+    """
+
+    def __init__(self, batches: Iterable[ActionOutput], tool_name: str = ""):
+        self.batches = batches
+        self.tool_name = tool_name
+
+    def __iter__(self) -> Iterator[ActionOutput]:
+        return iter(self.batches)
+
+    def collect(self, channel: Any = None) -> ActionOutput:
+        """
+        读取全部批次并合并
+        :param channel: 批次到达时写入的`RowChannel`，读取结束或出错时关闭
+        """
+        outputs = []
+        try:
+            for batch in self.batches:
+                outputs.append(batch)
+                if channel is not None:
+                    channel.put(batch)
+        except BaseException as e:
+            if channel is not None:
+                channel.close(e)
+            raise
+        if channel is not None:
+            channel.close()
+        return concat_output(outputs, self.tool_name)
+
+
+def concat_output(outputs: List[ActionOutput], tool_name: str = "") -> ActionOutput:
+    """
+    按行拼接多个批次的结果：`any`为列表时拼接列表，`dag_kwargs`中相同KEY的值拼接为一个列表
+    :param tool_name: 没有任何批次时使用的Tool名称
+    """
+    outputs = [output for output in outputs if isinstance(output, ActionOutput)]
+    if not outputs:
+        return ActionOutput(any=[], dag_kwargs=DAGFlow(tool_name=tool_name))
+    first = outputs[0]
+    merged_any = []
+    merged_msg = []
+    merged_labels = []
+    merged_source = []
+    merged_dag_kwargs = {}
+    for output in outputs:
+        if isinstance(output.any, list):
+            merged_any.extend(output.any)
+        elif output.any is not None:
+            merged_any.append(output.any)
+        if output.msg and output.msg not in merged_msg:
+            merged_msg.append(output.msg)
+        merged_labels.extend(lb for lb in output.labels if lb not in merged_labels)
+        merged_source.extend(sc for sc in output.source if sc not in merged_source)
+        for key, value in output.dag_kwargs.kwargs.items():
+            merged_dag_kwargs.setdefault(key, []).extend(value if isinstance(value, list) else [value])
+    return ActionOutput(
+        status=first.status,
+        any_to_prompt=first.any_to_prompt,
+        any=merged_any,
+        msg=' '.join(merged_msg),
+        labels=merged_labels,
+        source=merged_source,
+        dag_kwargs=DAGFlow(tool_name=first.dag_kwargs.tool_name or tool_name, kwargs=merged_dag_kwargs,
+                           desc=first.dag_kwargs.desc)
+    )
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""
+@Author  : Yc-Ma
+@Desc    : Immutable name index of a tool set for task parsing and tool-name matching in text.
+@Time    : 2026-10-18 21:06:34
+"""
+import threading
+from collections import OrderedDict, deque
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple, Union, overload
+
+from langchain_core.tools import BaseTool
+
+
+class ToolIndex(Sequence[BaseTool]):
+    """
+    一组Tool的只读索引：Tool名称到Tool的映射，以及全部Tool名称构建的Aho–Corasick自动机；
+    按名称查找Tool为O(1)，在文本中查找Tool名称只扫描一遍文本，与Tool数量无关。
+    可以作为Tool列表使用，名称重复时与`list.index`一致取第一个Tool。
+    """
+
+    def __init__(self, tools: Sequence[BaseTool]):
+        self._tools: Tuple[BaseTool, ...] = tuple(tools)
+        self.names: Tuple[str, ...] = tuple(tool.name for tool in self._tools)
+        self._by_name: Dict[str, BaseTool] = {}
+        # Tool名称在列表中的位置，长度相同的名称优先返回靠前的Tool
+        self._rank: Dict[str, int] = {}
+        for position, tool in enumerate(self._tools):
+            if tool.name not in self._by_name:
+                self._by_name[tool.name] = tool
+                self._rank[tool.name] = position
+        self._build_automaton()
+
+    def _build_automaton(self):
+        # 状态转移、失败指针、以状态结尾的最长Tool名称
+        goto: List[Dict[str, int]] = [{}]
+        terminal: List[Optional[str]] = [None]
+        for name in self._by_name:
+            if not name:
+                continue
+            state = 0
+            for char in name:
+                following = goto[state].get(char)
+                if following is None:
+                    following = len(goto)
+                    goto[state][char] = following
+                    goto.append({})
+                    terminal.append(None)
+                state = following
+            terminal[state] = name
+        fail = [0] * len(goto)
+        output: List[Optional[str]] = list(terminal)
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, following in goto[state].items():
+                fallback = fail[state]
+                while fallback and char not in goto[fallback]:
+                    fallback = fail[fallback]
+                fail[following] = goto[fallback].get(char, 0)
+                # 自身是名称结尾时最长；否则沿失败指针取较短的名称
+                if output[following] is None:
+                    output[following] = output[fail[following]]
+                queue.append(following)
+        self._goto, self._fail, self._output = goto, fail, output
+
+    def get(self, name: str) -> Optional[BaseTool]:
+        return self._by_name.get(name)
+
+    def _matches(self, text: str) -> Iterator[str]:
+        """文本中每个位置结尾的最长Tool名称"""
+        goto, fail, output = self._goto, self._fail, self._output
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state] is not None:
+                yield output[state]
+
+    def longest_match(self, text: str) -> Optional[BaseTool]:
+        """文本中出现的名称最长的Tool，长度相同时取列表中靠前的Tool"""
+        best = None
+        for name in self._matches(text):
+            if best is None or (len(name), -self._rank[name]) > (len(best), -self._rank[best]):
+                best = name
+        return None if best is None else self._by_name[best]
+
+    def contains_any(self, text: str) -> bool:
+        """文本中是否出现任意Tool名称"""
+        return next(self._matches(text), None) is not None
+
+    @overload
+    def __getitem__(self, index: int) -> BaseTool: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> Sequence[BaseTool]: ...
+
+    def __getitem__(self, index: Union[int, slice]):
+        return self._tools[index]
+
+    def __len__(self) -> int:
+        return len(self._tools)
+
+    def __iter__(self) -> Iterator[BaseTool]:
+        return iter(self._tools)
+
+
+_INDEXES: "OrderedDict[Tuple[Tuple[int, str, str], ...], ToolIndex]" = OrderedDict()
+_INDEXES_LOCK = threading.Lock()
+_INDEXES_SIZE = 32
+
+
+def tools_fingerprint(tools: Sequence[BaseTool]) -> Tuple[Tuple[int, str, str], ...]:
+    """Tool列表的指纹：Tool实例、名称与描述"""
+    return tuple((id(tool), tool.name, tool.description) for tool in tools)
+
+
+def tool_index(tools: Sequence[BaseTool]) -> ToolIndex:
+    """
+    获取Tool列表的索引：已经是索引时直接返回；否则按Tool列表的指纹复用最近构建的索引，
+    同一组Tool在多次请求中只构建一次，可以作为按Tool列表缓存的键
+    """
+    if isinstance(tools, ToolIndex):
+        return tools
+    key = tools_fingerprint(tools)
+    with _INDEXES_LOCK:
+        index = _INDEXES.get(key)
+        if index is not None:
+            _INDEXES.move_to_end(key)
+            return index
+    # 索引持有Tool实例，缓存期间`id`不会被复用
+    index = ToolIndex(tools)
+    with _INDEXES_LOCK:
+        _INDEXES[key] = index
+        while len(_INDEXES) > _INDEXES_SIZE:
+            _INDEXES.popitem(last=False)
+    return index
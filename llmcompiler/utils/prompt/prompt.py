@@ -3,3 +3,8 @@
 def get_custom_or_default(custom_prompts: dict[str, str], key: str, default_value: str) -> str:
     """Helper function to return custom prompt if available, otherwise default."""
     return custom_prompts[key] if custom_prompts and key in custom_prompts else default_value
+
+
+def custom_prompts_key(custom_prompts: dict[str, str]) -> tuple[tuple[str, str], ...]:
+    """Hashable form of the custom prompts, used as a cache key."""
+    return tuple(sorted((custom_prompts or {}).items()))
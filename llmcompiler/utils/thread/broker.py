@@ -0,0 +1,322 @@
+# -*- coding: utf-8 -*-
+"""
+@Author  : Yc-Ma
+@Desc    : Task broker and remote tool workers with leases, heartbeats and tool affinity.
+@Time    : 2026-10-18 19:03:45
+"""
+import time
+import uuid
+import logging
+import argparse
+import itertools
+import threading
+import traceback
+from abc import ABC, abstractmethod
+from collections import deque
+from multiprocessing.managers import BaseManager
+from typing import Any, Deque, Dict, Optional, Sequence, Tuple
+
+from llmcompiler.utils.thread.process_pool import run_envelope
+
+logger = logging.getLogger(__name__)
+
+# 没有请求截止时间时等待远程结果的最长秒数，避免没有可用工作进程时调用方一直等待
+REMOTE_TIMEOUT = 300.0
+
+
+class RemoteToolError(RuntimeError):
+    """远程工作进程执行Tool失败，或任务多次投递后仍没有结果"""
+
+
+class Broker(ABC):
+    """
+    任务代理接口：调度器投递任务并等待结果，工作进程按Tool租用任务、续租并提交结果。
+    租约到期仍未续租（工作进程退出）的任务重新投递给其它工作进程。可以基于Redis等外部存储实现该接口。
+    """
+
+    @abstractmethod
+    def put(self, task_id: str, tool: str, payload: Any):
+        """投递任务"""
+
+    @abstractmethod
+    def lease(self, worker_id: str, tools: Optional[Sequence[str]] = None,
+              timeout: float = 1.0) -> Optional[Tuple[str, Any]]:
+        """
+        租用一个任务，最多等待`timeout`秒，没有任务时返回None
+        :param tools: 工作进程可以执行的Tool名称，为空表示全部Tool
+        """
+
+    @abstractmethod
+    def heartbeat(self, worker_id: str):
+        """工作进程心跳，续租该工作进程持有的全部任务"""
+
+    @abstractmethod
+    def complete(self, task_id: str, worker_id: str, ok: bool, value: Any) -> bool:
+        """提交任务结果，任务已经有结果或已经取消时返回False"""
+
+    @abstractmethod
+    def result(self, task_id: str, timeout: Optional[float] = None) -> Optional[Tuple[bool, Any]]:
+        """等待任务结果`(是否成功, 结果或错误信息)`，超过`timeout`秒仍没有结果时返回None"""
+
+    @abstractmethod
+    def cancel(self, task_id: str):
+        """取消任务，之后提交的结果被丢弃"""
+
+
+class LocalBroker(Broker):
+    """
+    内存中的任务代理，可以通过`serve_broker`在网络上共享。
+    每个Tool一个等待队列，工作进程只租用其声明的Tool的任务，多个队列之间按投递顺序租用。
+    """
+
+    def __init__(self, lease_timeout: float = 10.0, max_deliveries: int = 3):
+        """
+        :param lease_timeout: 租约时长，工作进程超过该时间没有心跳时任务重新投递
+        :param max_deliveries: 任务最多投递次数，超过后任务以失败结束
+        """
+        self.lease_timeout = lease_timeout
+        self.max_deliveries = max_deliveries
+        self._condition = threading.Condition()
+        self._seq = itertools.count()
+        # Tool名称 -> 等待中的任务（投递序号, 任务ID），已经完成或取消的任务在租用时跳过
+        self._pending: Dict[str, Deque[Tuple[int, str]]] = {}
+        # 任务ID -> (Tool名称, 投递序号, 任务内容, 已投递次数)
+        self._tasks: Dict[str, Tuple[str, int, Any, int]] = {}
+        # 任务ID -> (工作进程ID, 租约到期时间)
+        self._leases: Dict[str, Tuple[str, float]] = {}
+        self._results: Dict[str, Tuple[bool, Any]] = {}
+
+    def put(self, task_id: str, tool: str, payload: Any):
+        with self._condition:
+            seq = next(self._seq)
+            self._tasks[task_id] = (tool, seq, payload, 0)
+            self._pending.setdefault(tool, deque()).append((seq, task_id))
+            self._condition.notify_all()
+
+    def lease(self, worker_id: str, tools: Optional[Sequence[str]] = None,
+              timeout: float = 1.0) -> Optional[Tuple[str, Any]]:
+        deadline = time.time() + timeout
+        with self._condition:
+            while True:
+                now = time.time()
+                self._requeue_expired(now)
+                task_id = self._pop_pending(tools)
+                if task_id is not None:
+                    tool, seq, payload, deliveries = self._tasks[task_id]
+                    self._tasks[task_id] = (tool, seq, payload, deliveries + 1)
+                    self._leases[task_id] = (worker_id, now + self.lease_timeout)
+                    return task_id, payload
+                if now >= deadline:
+                    return None
+                self._condition.wait(self._next_wait(now, deadline))
+
+    def heartbeat(self, worker_id: str):
+        with self._condition:
+            expires_at = time.time() + self.lease_timeout
+            for task_id, (holder, _) in list(self._leases.items()):
+                if holder == worker_id:
+                    self._leases[task_id] = (holder, expires_at)
+
+    def complete(self, task_id: str, worker_id: str, ok: bool, value: Any) -> bool:
+        with self._condition:
+            if task_id not in self._tasks:
+                return False
+            holder = self._leases.pop(task_id, (None, 0))[0]
+            if holder != worker_id:
+                logger.warning(f"Task {task_id} was completed by {worker_id} after its lease moved to {holder}.")
+            del self._tasks[task_id]
+            self._results[task_id] = (ok, value)
+            self._condition.notify_all()
+            return True
+
+    def result(self, task_id: str, timeout: Optional[float] = None) -> Optional[Tuple[bool, Any]]:
+        deadline = None if timeout is None else time.time() + timeout
+        with self._condition:
+            while task_id not in self._results:
+                now = time.time()
+                self._requeue_expired(now)
+                if task_id in self._results:
+                    break
+                if deadline is not None and now >= deadline:
+                    return None
+                self._condition.wait(self._next_wait(now, deadline))
+            return self._results.pop(task_id)
+
+    def cancel(self, task_id: str):
+        with self._condition:
+            self._tasks.pop(task_id, None)
+            self._leases.pop(task_id, None)
+            self._results.pop(task_id, None)
+
+    def _pop_pending(self, tools: Optional[Sequence[str]]) -> Optional[str]:
+        """在可以执行的Tool队列中取投递序号最小的任务，调用方需持有锁"""
+        candidates = self._pending.keys() if tools is None else [tool for tool in tools if tool in self._pending]
+        best = None
+        for tool in candidates:
+            queue = self._pending[tool]
+            while queue and queue[0][1] not in self._tasks:
+                queue.popleft()
+            if queue and (best is None or queue[0][0] < self._pending[best][0][0]):
+                best = tool
+        if best is None:
+            return None
+        return self._pending[best].popleft()[1]
+
+    def _requeue_expired(self, now: float):
+        """租约到期的任务放回队列头部，超过最多投递次数的任务以失败结束，调用方需持有锁"""
+        for task_id, (holder, expires_at) in list(self._leases.items()):
+            if expires_at > now:
+                continue
+            del self._leases[task_id]
+            tool, seq, payload, deliveries = self._tasks[task_id]
+            if deliveries >= self.max_deliveries:
+                del self._tasks[task_id]
+                self._results[task_id] = (False, f"Task {task_id} of {tool} was delivered {deliveries} times, "
+                                                 f"the workers never returned a result.")
+            else:
+                logger.warning(f"Lease of task {task_id} held by {holder} expired, the task is delivered again.")
+                self._pending.setdefault(tool, deque()).appendleft((seq, task_id))
+            self._condition.notify_all()
+
+    def _next_wait(self, now: float, deadline: Optional[float]) -> Optional[float]:
+        """等待到截止时间或最早的租约到期时间"""
+        ends = [expires_at for _, expires_at in self._leases.values()]
+        if deadline is not None:
+            ends.append(deadline)
+        return max(0.0, min(ends) - now) if ends else None
+
+
+class BrokerManager(BaseManager):
+    """通过`multiprocessing.managers`在网络上共享任务代理，工作进程可以运行在其它主机上"""
+
+
+# 当前进程通过`serve_broker`共享的任务代理
+_SERVED: Optional[Broker] = None
+BrokerManager.register("get_broker", callable=lambda: _SERVED)
+
+
+def _checked_authkey(authkey: bytes) -> bytes:
+    """任务代理接收可执行的Tool调用，必须显式配置连接密钥"""
+    if not authkey:
+        raise ValueError("An authkey is required to serve or connect to a broker.")
+    return authkey
+
+
+def serve_broker(address: Tuple[str, int], authkey: bytes,
+                 broker: Optional[Broker] = None) -> Tuple[Tuple[str, int], Broker]:
+    """
+    在后台线程中共享任务代理，返回实际监听的地址（端口为0时自动分配）与任务代理
+    :param authkey: 连接密钥，工作进程与调用方使用相同的密钥连接
+    """
+    global _SERVED
+    authkey = _checked_authkey(authkey)
+    _SERVED = broker or LocalBroker()
+    server = BrokerManager(address=address, authkey=authkey).get_server()
+    threading.Thread(target=server.serve_forever, name="llmcompiler-broker", daemon=True).start()
+    return server.address, _SERVED
+
+
+def connect_broker(address: Tuple[str, int], authkey: bytes) -> Broker:
+    """连接`serve_broker`共享的任务代理，返回的代理对象可以在多个线程中使用"""
+    manager = BrokerManager(address=address, authkey=_checked_authkey(authkey))
+    manager.connect()
+    return manager.get_broker()
+
+
+class ToolWorker:
+    """
+    远程Tool工作进程：从任务代理租用任务，在本进程中执行Tool并提交结果；
+    后台线程定期发送心跳续租，工作进程退出后其持有的任务在租约到期后重新投递给其它工作进程。
+    """
+
+    def __init__(self, broker: Broker, tools: Optional[Sequence[str]] = None, worker_id: Optional[str] = None,
+                 heartbeat_interval: float = 2.0):
+        """
+        :param tools: 可以执行的Tool名称，为空表示全部Tool；相同Tool的任务固定路由到声明了该Tool的工作进程
+        :param heartbeat_interval: 心跳间隔秒数，需要小于任务代理的租约时长
+        """
+        self.broker = broker
+        self.tools = list(tools) if tools else None
+        self.worker_id = worker_id or uuid.uuid4().hex
+        self.heartbeat_interval = heartbeat_interval
+        self.completed = 0
+        self._stopped = threading.Event()
+
+    def run(self, max_tasks: Optional[int] = None):
+        """持续执行任务，直到调用`stop`或完成`max_tasks`个任务"""
+        heartbeat = threading.Thread(target=self._heartbeat, name=f"heartbeat-{self.worker_id}", daemon=True)
+        heartbeat.start()
+        try:
+            while not self._stopped.is_set() and (max_tasks is None or self.completed < max_tasks):
+                leased = self.broker.lease(self.worker_id, self.tools, self.heartbeat_interval)
+                if leased is not None:
+                    self._execute(*leased)
+        finally:
+            self._stopped.set()
+
+    def stop(self):
+        self._stopped.set()
+
+    def _execute(self, task_id: str, payload: Any):
+        try:
+            ok, value = True, run_envelope(payload)
+        except Exception as e:
+            ok, value = False, "".join(traceback.format_exception(type(e), e, e.__traceback__))
+        # 先计数再提交结果，等待结果的调用方看到的计数已经包含该TASK
+        self.completed += 1
+        self.broker.complete(task_id, self.worker_id, ok, value)
+
+    def _heartbeat(self):
+        while not self._stopped.wait(self.heartbeat_interval):
+            try:
+                self.broker.heartbeat(self.worker_id)
+            except Exception as e:
+                logger.warning(f"Heartbeat of worker {self.worker_id} failed: {repr(e)}")
+
+
+_REMOTE_BROKER: Optional[Broker] = None
+
+
+def configure_remote_broker(broker: Optional[Broker]):
+    """设置声明了`execution="remote"`的Tool使用的任务代理，一般在进程启动时调用一次"""
+    global _REMOTE_BROKER
+    _REMOTE_BROKER = broker
+
+
+def run_remotely(tool_name: str, payload: Any, timeout: Optional[float] = None) -> Any:
+    """
+    投递Tool调用并等待远程工作进程的结果，超过`timeout`秒时取消任务并抛出`TimeoutError`
+    :param timeout: 为空时最多等待`REMOTE_TIMEOUT`秒
+    """
+    broker = _REMOTE_BROKER
+    if broker is None:
+        raise ValueError(f"{tool_name} runs remotely, configure a broker with `configure_remote_broker` first.")
+    if timeout is None:
+        timeout = REMOTE_TIMEOUT
+    task_id = uuid.uuid4().hex
+    broker.put(task_id, tool_name, payload)
+    outcome = broker.result(task_id, timeout)
+    if outcome is None:
+        broker.cancel(task_id)
+        raise TimeoutError(f"{tool_name} did not finish on a remote worker within {timeout} seconds.")
+    ok, value = outcome
+    if not ok:
+        raise RemoteToolError(value)
+    return value
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Serve a task broker or run a remote tool worker.")
+    parser.add_argument("role", choices=["broker", "worker"])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=50051)
+    parser.add_argument("--authkey", required=True, help="Shared secret of the broker and its workers.")
+    parser.add_argument("--tools", default="", help="Comma separated tool names served by the worker.")
+    args = parser.parse_args()
+    if args.role == "broker":
+        address, _ = serve_broker((args.host, args.port), args.authkey.encode())
+        print(f"Broker listening on {address}")
+        threading.Event().wait()
+    else:
+        ToolWorker(connect_broker((args.host, args.port), args.authkey.encode()),
+                   [tool for tool in args.tools.split(",") if tool]).run()
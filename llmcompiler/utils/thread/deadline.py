@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""
+@Author  : Yc-Ma
+@Desc    : Request deadline and call cancellation carried in RunnableConfig.
+@Time    : 2026-10-18 14:52:10
+"""
+import time
+import threading
+from typing import Optional
+
+from langchain_core.runnables import RunnableConfig
+from langchain_core.runnables.config import patch_config, ensure_config
+
+# 请求截止时间（`time.time()`时间戳），放在`RunnableConfig["configurable"]`中随调用链传递到调度器与Tool
+REQUEST_DEADLINE_VAR = "request_deadline"
+# 调用的取消信号（`threading.Event`），例如对冲调用中落败的一次调用
+CALL_CANCELLED_VAR = "call_cancelled"
+
+
+def with_deadline(config: Optional[RunnableConfig], timeout: float) -> RunnableConfig:
+    """设置请求截止时间为当前时间之后`timeout`秒，已经设置了更早的截止时间时保留原截止时间"""
+    deadline = time.time() + timeout
+    current = request_deadline(config)
+    if current is not None:
+        deadline = min(deadline, current)
+    return patch_config(config, configurable={REQUEST_DEADLINE_VAR: deadline})
+
+
+def request_deadline(config: Optional[RunnableConfig] = None) -> Optional[float]:
+    """请求截止时间，没有设置时返回None；不传入`config`时读取当前调用上下文中的`RunnableConfig`"""
+    config = ensure_config(config)
+    return config.get("configurable", {}).get(REQUEST_DEADLINE_VAR)
+
+
+def remaining_time(deadline: Optional[float]) -> Optional[float]:
+    """距离截止时间的剩余秒数，没有截止时间返回None，已经超时返回0"""
+    if deadline is None:
+        return None
+    return max(0.0, deadline - time.time())
+
+
+def with_cancel_event(config: Optional[RunnableConfig], event: threading.Event) -> RunnableConfig:
+    return patch_config(config, configurable={CALL_CANCELLED_VAR: event})
+
+
+def call_cancelled(config: Optional[RunnableConfig] = None) -> bool:
+    """
+    当前调用是否已被取消；已经开始的调用不会被强制中断，耗时的Tool可以在循环中（例如逐页读取）检查后提前结束。
+    不传入`config`时读取当前调用上下文中的`RunnableConfig`
+    """
+    event = ensure_config(config).get("configurable", {}).get(CALL_CANCELLED_VAR)
+    return event is not None and event.is_set()
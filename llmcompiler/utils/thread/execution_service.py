@@ -0,0 +1,267 @@
+# -*- coding: utf-8 -*-
+"""
+@Author  : Yc-Ma
+@Desc    : Process-wide bounded execution service.
+@Time    : 2026-10-18 09:12:31
+"""
+import time
+import heapq
+import itertools
+import logging
+import threading
+import contextvars
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Sequence, Tuple
+
+from llmcompiler.utils.thread.pool_executor import max_worker
+
+logger = logging.getLogger(__name__)
+
+# 调度器执行TASK使用的通道
+TASK_LANE = "task"
+# `@tool_call_by_row_pass_parameters`按行调用Tool使用的通道
+ROW_LANE = "row"
+
+# 配额KEY类型：每个请求、每个Tool
+REQUEST_QUOTA = "request"
+TOOL_QUOTA = "tool"
+
+
+def request_key(request_id: Hashable) -> Tuple[str, Hashable]:
+    """请求级配额KEY"""
+    return REQUEST_QUOTA, request_id
+
+
+def tool_key(tool_name: str) -> Tuple[str, str]:
+    """Tool级配额KEY"""
+    return TOOL_QUOTA, tool_name
+
+
+def tool_quota_keys(service: "ExecutionService", tool) -> Tuple[Hashable, ...]:
+    """Tool级配额KEY，Tool声明了`max_concurrency`时同时将其设置为该KEY的配额"""
+    key = tool_key(tool.name)
+    limit = getattr(tool, "max_concurrency", None)
+    if limit is not None and service.get_limit(key) != limit:
+        service.set_limit(key, limit)
+    return key,
+
+
+class _Job:
+    __slots__ = ("fn", "args", "kwargs", "lane", "keys", "future", "context", "entry")
+
+    def __init__(self, fn: Callable, args: tuple, kwargs: dict, lane: str, keys: Tuple[Hashable, ...]):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.lane = lane
+        self.keys = keys
+        self.future = Future()
+        # 排队中的堆元素：[-priority, seq, job]，重新设置优先级时旧元素的job被置为None
+        self.entry: Optional[list] = None
+        # 任务在提交线程的上下文中运行，保证`RunnableConfig`等上下文变量可以传递到工作线程
+        self.context = contextvars.copy_context()
+
+
+class ExecutionService:
+    """
+    进程级共享的有界执行服务。
+    - 每个通道（lane）对应一个长期存在的线程池，线程数量有上限，线程池的创建成本不再出现在请求路径上；
+    - 调度器与按行调用的装饰器使用不同的通道，上层任务等待下层任务时不会因为线程被占满而死锁；
+    - 每个任务可以携带若干配额KEY（例如请求、Tool），任一KEY达到配额时任务在服务内部排队，不占用线程；
+    - 排队中的任务按优先级从高到低启动，优先级相同时先提交的任务先启动。
+    """
+
+    def __init__(self, task_workers: int = None, row_workers: int = None,
+                 request_quota: Optional[int] = None, tool_quota: Optional[int] = None):
+        """
+        :param task_workers: 调度器通道的最大线程数
+        :param row_workers: 按行调用通道的最大线程数
+        :param request_quota: 单个请求同时运行的TASK数量上限，为空表示不限制
+        :param tool_quota: 单个Tool同时运行的调用数量上限（按行调用的每一行、非按行调用Tool的每个TASK），为空表示不限制
+        """
+        self._workers: Dict[str, int] = {
+            TASK_LANE: task_workers or max_worker(),
+            ROW_LANE: row_workers or max_worker(),
+        }
+        self._default_limits: Dict[str, Optional[int]] = {REQUEST_QUOTA: request_quota, TOOL_QUOTA: tool_quota}
+        self._limits: Dict[Hashable, int] = {}
+        self._executors: Dict[str, ThreadPoolExecutor] = {}
+        self._pending: Dict[str, list] = {}
+        self._queued: Dict[Future, _Job] = {}
+        self._seq = itertools.count()
+        self._running: Dict[str, int] = {}
+        self._active: Dict[Hashable, int] = {}
+        self._lock = threading.Lock()
+        for lane in self._workers:
+            self._init_lane(lane)
+
+    def add_lane(self, lane: str, workers: int):
+        """增加执行通道，已存在的通道不会被修改"""
+        with self._lock:
+            if lane not in self._workers:
+                self._workers[lane] = workers
+                self._init_lane(lane)
+
+    def set_limit(self, key: Hashable, limit: Optional[int]):
+        """设置指定KEY的配额，覆盖默认配额，`None`表示恢复默认配额"""
+        with self._lock:
+            if limit is None:
+                self._limits.pop(key, None)
+            else:
+                self._limits[key] = limit
+            self._drain_all()
+
+    def get_limit(self, key: Hashable) -> Optional[int]:
+        """指定KEY当前生效的配额"""
+        with self._lock:
+            return self._limit(key)
+
+    def submit(self, fn: Callable, *args: Any, lane: str = TASK_LANE, keys: Sequence[Hashable] = (),
+               priority: float = 0.0, **kwargs: Any) -> Future:
+        """
+        提交任务，返回`concurrent.futures.Future`
+        :param lane: 执行通道
+        :param keys: 配额KEY，所有KEY都有剩余配额时任务才会开始运行
+        :param priority: 排队时的优先级，数值越大越先启动
+        """
+        if lane not in self._workers:
+            raise ValueError(f"Unknown execution lane `{lane}`.")
+        job = _Job(fn, args, kwargs, lane, tuple(keys))
+        with self._lock:
+            self._push(job, priority)
+            self._queued[job.future] = job
+            self._drain(lane)
+        return job.future
+
+    def reprioritize(self, future: Future, priority: float) -> bool:
+        """修改排队中任务的优先级，任务已经开始运行时返回False"""
+        with self._lock:
+            job = self._queued.get(future)
+            if job is None:
+                return False
+            job.entry[2] = None
+            self._push(job, priority)
+            return True
+
+    def map(self, fn: Callable, iterable: Iterable[Any], lane: str = TASK_LANE,
+            keys: Sequence[Hashable] = (), timeout: Optional[float] = None) -> List[Any]:
+        """
+        与`Executor.map`类似，按输入顺序返回结果，任一调用出错时抛出异常
+        :param timeout: 等待全部结果的总时长（秒），超时后取消尚未开始的调用并抛出`TimeoutError`
+        """
+        futures = [self.submit(fn, item, lane=lane, keys=keys) for item in iterable]
+        end_time = None if timeout is None else time.time() + timeout
+        try:
+            return [future.result(None if end_time is None else max(0.0, end_time - time.time()))
+                    for future in futures]
+        except FutureTimeoutError:
+            for future in futures:
+                future.cancel()
+            raise TimeoutError(f"{len([f for f in futures if not f.done()])} calls did not finish "
+                               f"within {timeout} seconds.")
+
+    def shutdown(self, wait: bool = True):
+        for executor in self._executors.values():
+            executor.shutdown(wait=wait)
+
+    def _init_lane(self, lane: str):
+        self._executors[lane] = ThreadPoolExecutor(max_workers=self._workers[lane],
+                                                   thread_name_prefix=f"llmcompiler-{lane}")
+        self._pending[lane] = []
+        self._running[lane] = 0
+
+    def _push(self, job: _Job, priority: float):
+        job.entry = [-priority, next(self._seq), job]
+        heapq.heappush(self._pending[job.lane], job.entry)
+
+    def _limit(self, key: Hashable) -> Optional[int]:
+        if key in self._limits:
+            return self._limits[key]
+        if isinstance(key, tuple) and key:
+            return self._default_limits.get(key[0])
+        return None
+
+    def _acquirable(self, job: _Job) -> bool:
+        for key in job.keys:
+            limit = self._limit(key)
+            if limit is not None and self._active.get(key, 0) >= limit:
+                return False
+        return True
+
+    def _drain(self, lane: str):
+        """在通道与配额允许的范围内启动排队的任务，调用方需持有锁"""
+        pending = self._pending[lane]
+        skipped = []
+        while pending and self._running[lane] < self._workers[lane]:
+            entry = heapq.heappop(pending)
+            job = entry[2]
+            if job is None:
+                continue
+            if job.future.cancelled():
+                self._queued.pop(job.future, None)
+                continue
+            if not self._acquirable(job):
+                skipped.append(entry)
+                continue
+            self._start(job)
+        # 因配额未能启动的任务保持原有优先级与顺序
+        for entry in skipped:
+            heapq.heappush(pending, entry)
+
+    def _drain_all(self):
+        for lane in self._pending:
+            self._drain(lane)
+
+    def _start(self, job: _Job):
+        self._queued.pop(job.future, None)
+        self._running[job.lane] += 1
+        for key in job.keys:
+            self._active[key] = self._active.get(key, 0) + 1
+        self._executors[job.lane].submit(self._run, job)
+
+    def _run(self, job: _Job):
+        try:
+            if job.future.set_running_or_notify_cancel():
+                try:
+                    result = job.context.run(job.fn, *job.args, **job.kwargs)
+                except BaseException as e:
+                    job.future.set_exception(e)
+                else:
+                    job.future.set_result(result)
+        finally:
+            with self._lock:
+                self._running[job.lane] -= 1
+                for key in job.keys:
+                    count = self._active.get(key, 0) - 1
+                    if count > 0:
+                        self._active[key] = count
+                    else:
+                        self._active.pop(key, None)
+                self._drain_all()
+
+
+_SERVICE: Optional[ExecutionService] = None
+_SERVICE_LOCK = threading.Lock()
+
+
+def get_execution_service() -> ExecutionService:
+    """获取进程级共享的执行服务，首次使用时按默认参数创建"""
+    global _SERVICE
+    if _SERVICE is None:
+        with _SERVICE_LOCK:
+            if _SERVICE is None:
+                _SERVICE = ExecutionService()
+    return _SERVICE
+
+
+def configure_execution_service(task_workers: int = None, row_workers: int = None,
+                                request_quota: Optional[int] = None,
+                                tool_quota: Optional[int] = None) -> ExecutionService:
+    """
+    使用指定参数替换进程级共享的执行服务，一般在进程启动时调用一次；
+    已经提交到原执行服务的任务仍在原执行服务中完成
+    """
+    global _SERVICE
+    with _SERVICE_LOCK:
+        _SERVICE = ExecutionService(task_workers, row_workers, request_quota, tool_quota)
+    return _SERVICE
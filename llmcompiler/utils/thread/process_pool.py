@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+"""
+@Author  : Yc-Ma
+@Desc    : Warm process pool running CPU-bound tools outside the scheduler threads.
+@Time    : 2026-10-18 18:26:07
+"""
+import os
+import pickle
+import logging
+import importlib
+import threading
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class ToolEnvelope(NamedTuple):
+    """发送到工作进程的Tool调用：Tool类的导入路径、实例上设置过的字段（pickle）以及校验后的参数"""
+    module: str
+    qualname: str
+    fields: bytes
+    kwargs: Dict[str, Any]
+
+
+def tool_envelope(tool, resolved_args: Any) -> Optional[ToolEnvelope]:
+    """
+    封装Tool调用，参数按`args_schema`校验并填充默认值；
+    Tool类无法在工作进程中导入（例如函数内定义的类）或实例字段无法序列化时返回None，由调用方在当前进程执行
+    """
+    cls = type(tool)
+    if "<locals>" in cls.__qualname__ or cls.__module__ == "__main__":
+        return None
+    kwargs = tool._to_args_and_kwargs(resolved_args, None)[1] if resolved_args else {}
+    try:
+        fields = pickle.dumps({name: getattr(tool, name) for name in sorted(tool.model_fields_set)})
+    except Exception as e:
+        logger.warning(f"Fields of {tool.name} can not be sent to a worker process, run it in a thread: {repr(e)}")
+        return None
+    return ToolEnvelope(cls.__module__, cls.__qualname__, fields, kwargs)
+
+
+# 工作进程中已经创建的Tool实例：(模块, 类名, 字段) -> Tool
+_TOOLS: Dict[Tuple[str, str, bytes], Any] = {}
+
+
+def _load_tool(envelope: ToolEnvelope):
+    key = (envelope.module, envelope.qualname, envelope.fields)
+    tool = _TOOLS.get(key)
+    if tool is None:
+        cls = importlib.import_module(envelope.module)
+        for name in envelope.qualname.split("."):
+            cls = getattr(cls, name)
+        tool = _TOOLS[key] = cls(**pickle.loads(envelope.fields))
+    return tool
+
+
+def run_envelope(envelope: ToolEnvelope) -> Any:
+    """在工作进程中执行Tool调用，按批次返回的结果在工作进程中合并后返回"""
+    from llmcompiler.tools.generic.action_output import ActionOutputStream
+
+    output = _load_tool(envelope)._run(**envelope.kwargs)
+    if isinstance(output, ActionOutputStream):
+        output = output.collect()
+    return output
+
+
+def _warm_up():
+    """工作进程启动时预先导入Tool依赖的公共模块，第一次调用不再承担导入成本"""
+    importlib.import_module("llmcompiler.tools.basic")
+
+
+def _ping() -> int:
+    return os.getpid()
+
+
+_POOL: Optional[ProcessPoolExecutor] = None
+_POOL_WORKERS: Optional[int] = None
+_POOL_LOCK = threading.Lock()
+
+
+def _pool_workers() -> int:
+    return _POOL_WORKERS or os.cpu_count() or 1
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """
+    获取进程级共享的进程池，首次使用时创建；工作进程使用`spawn`方式启动，不继承父进程的线程与锁，
+    进程常驻并复用已经创建的Tool实例
+    """
+    global _POOL
+    if _POOL is None:
+        with _POOL_LOCK:
+            if _POOL is None:
+                _POOL = ProcessPoolExecutor(max_workers=_pool_workers(),
+                                            mp_context=multiprocessing.get_context("spawn"),
+                                            initializer=_warm_up)
+    return _POOL
+
+
+def configure_process_pool(max_workers: Optional[int] = None, warm: bool = False) -> ProcessPoolExecutor:
+    """
+    使用指定的工作进程数量替换进程级共享的进程池，一般在进程启动时调用一次
+    :param warm: 是否立即启动全部工作进程，第一次请求不再等待进程启动
+    """
+    global _POOL, _POOL_WORKERS
+    with _POOL_LOCK:
+        previous, _POOL_WORKERS = _POOL, max_workers
+        _POOL = None
+    if previous is not None:
+        previous.shutdown(wait=False)
+    pool = get_process_pool()
+    if warm:
+        warm_process_pool()
+    return pool
+
+
+def warm_process_pool():
+    """启动全部工作进程并等待其完成初始化"""
+    pool = get_process_pool()
+    for future in [pool.submit(_ping) for _ in range(_pool_workers())]:
+        future.result()
+
+
+def submit_envelope(envelope: ToolEnvelope) -> Future:
+    """提交Tool调用到进程池，工作进程异常退出导致进程池不可用时重新创建进程池"""
+    global _POOL
+    pool = get_process_pool()
+    try:
+        return pool.submit(run_envelope, envelope)
+    except BrokenProcessPool:
+        with _POOL_LOCK:
+            if _POOL is pool:
+                _POOL = None
+        logger.warning("Process pool is broken, a new one is created.")
+        return get_process_pool().submit(run_envelope, envelope)
+
+
+def run_in_process(envelope: ToolEnvelope, timeout: Optional[float] = None) -> Any:
+    """在工作进程中执行Tool调用并等待结果，超过`timeout`秒时取消尚未开始的调用并抛出`TimeoutError`"""
+    future = submit_envelope(envelope)
+    try:
+        return future.result(timeout)
+    except FutureTimeoutError:
+        future.cancel()
+        raise TimeoutError(f"{envelope.qualname} did not finish in a worker process within {timeout} seconds.")
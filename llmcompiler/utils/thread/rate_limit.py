@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+"""
+@Author  : Yc-Ma
+@Desc    : Per-tool token-bucket rate limits and async concurrency limits.
+@Time    : 2026-10-18 15:21:44
+"""
+import os
+import time
+import asyncio
+import sqlite3
+import threading
+import weakref
+from typing import Dict, Optional, Tuple, Union
+
+# 速率单位：每秒、每分钟、每小时
+RATE_UNITS = {
+    "s": 1, "sec": 1, "second": 1,
+    "m": 60, "min": 60, "minute": 60,
+    "h": 3600, "hour": 3600,
+}
+
+
+def parse_rate(rate: Union[str, float, int]) -> float:
+    """
+    解析速率为每秒调用次数，支持数字（每秒次数）以及`200/min`、`10/s`、`1000/hour`格式的字符串
+    """
+    if isinstance(rate, (int, float)):
+        value = float(rate)
+    else:
+        count, _, unit = str(rate).strip().partition("/")
+        unit = unit.strip().lower() or "s"
+        if unit not in RATE_UNITS:
+            raise ValueError(f"Unknown rate unit `{unit}` in `{rate}`, use one of {sorted(RATE_UNITS)}.")
+        value = float(count) / RATE_UNITS[unit]
+    if value <= 0:
+        raise ValueError(f"Rate must be positive: `{rate}`.")
+    return value
+
+
+class TokenBucket:
+    """
+    令牌桶：令牌按`rate`匀速补充，最多积累`burst`个。每次调用取一个令牌，令牌不足时预约下一个令牌并等待，
+    等待中的调用按到达顺序均匀放行，不会在令牌补充时集中冲击后端。
+    """
+
+    def __init__(self, rate: float, burst: Optional[int] = None):
+        """
+        :param rate: 每秒补充的令牌数量
+        :param burst: 最多积累的令牌数量，即空闲后允许的突发调用数量，默认1
+        """
+        self.rate = rate
+        self.burst = max(1, burst or 1)
+        self._tokens = float(self.burst)
+        self._updated_at = time.time()
+        self._lock = threading.Lock()
+
+    def reserve(self, max_wait: Optional[float] = None) -> Optional[float]:
+        """
+        预约一个令牌，返回需要等待的秒数；需要等待的时间超过`max_wait`时不预约，返回None
+        """
+        with self._lock:
+            now = time.time()
+            tokens, wait = self._take(self._tokens, self._updated_at, now, max_wait)
+            if wait is not None:
+                self._tokens, self._updated_at = tokens, now
+            return wait
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        """获取一个令牌，最多等待`timeout`秒，超时返回False"""
+        wait = self.reserve(timeout)
+        if wait is None:
+            return False
+        if wait > 0:
+            time.sleep(wait)
+        return True
+
+    async def aacquire(self, timeout: Optional[float] = None) -> bool:
+        """`acquire`的异步版本"""
+        wait = self.reserve(timeout)
+        if wait is None:
+            return False
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return True
+
+    def _take(self, tokens: float, updated_at: float, now: float, max_wait: Optional[float]
+              ) -> Tuple[float, Optional[float]]:
+        """补充令牌后取走一个令牌，令牌可以为负数表示已经被预约"""
+        tokens = min(float(self.burst), tokens + max(0.0, now - updated_at) * self.rate) - 1
+        wait = 0.0 if tokens >= 0 else -tokens / self.rate
+        if max_wait is not None and wait > max_wait:
+            return tokens + 1, None
+        return tokens, wait
+
+
+class SqliteTokenBucket(TokenBucket):
+    """
+    基于本地SQLite文件的令牌桶，同一台机器上的多个进程共享同一个数据库文件中的令牌，
+    预约令牌在`BEGIN IMMEDIATE`事务中完成，由SQLite的文件锁保证进程间互斥。
+    """
+
+    def __init__(self, path: str, key: str, rate: float, burst: Optional[int] = None):
+        """
+        :param path: 数据库文件路径
+        :param key: 令牌桶名称，一般为Tool名称
+        """
+        super().__init__(rate, burst)
+        self.path = os.path.abspath(path)
+        self.key = key
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._connection().execute(
+            "CREATE TABLE IF NOT EXISTS rate_limit ("
+            "key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)")
+
+    def _connection(self) -> sqlite3.Connection:
+        """每个线程使用独立的连接"""
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            self._local.connection = connection
+        return connection
+
+    def reserve(self, max_wait: Optional[float] = None) -> Optional[float]:
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            row = connection.execute("SELECT tokens, updated_at FROM rate_limit WHERE key = ?",
+                                     (self.key,)).fetchone()
+            tokens, updated_at = row if row is not None else (float(self.burst), now)
+            tokens, wait = self._take(tokens, updated_at, now, max_wait)
+            if wait is not None:
+                connection.execute("INSERT OR REPLACE INTO rate_limit (key, tokens, updated_at) VALUES (?, ?, ?)",
+                                   (self.key, tokens, now))
+            connection.execute("COMMIT")
+            return wait
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+
+
+_BUCKETS: Dict[str, TokenBucket] = {}
+_BUCKETS_LOCK = threading.Lock()
+# 跨进程模式使用的数据库文件，为空表示令牌桶只在进程内共享
+_STORE_PATH: Optional[str] = None
+
+
+def get_rate_limiter(name: str, rate: Union[str, float, int], burst: Optional[int] = None) -> TokenBucket:
+    """获取进程级共享的令牌桶，同名令牌桶的速率或突发数量变化时重新创建"""
+    rate = parse_rate(rate)
+    bucket = _BUCKETS.get(name)
+    if bucket is not None and bucket.rate == rate and bucket.burst == max(1, burst or 1):
+        return bucket
+    with _BUCKETS_LOCK:
+        bucket = _BUCKETS.get(name)
+        if bucket is None or bucket.rate != rate or bucket.burst != max(1, burst or 1):
+            if _STORE_PATH is None:
+                bucket = TokenBucket(rate, burst)
+            else:
+                bucket = SqliteTokenBucket(_STORE_PATH, name, rate, burst)
+            _BUCKETS[name] = bucket
+        return bucket
+
+
+def configure_rate_limiter(path: Optional[str] = None):
+    """
+    设置令牌桶的共享范围，一般在进程启动时调用一次：
+    `configure_rate_limiter('/data/llmcompiler/rate_limit.db')`多个工作进程共享令牌，为空时令牌桶只在进程内共享
+    """
+    global _STORE_PATH
+    with _BUCKETS_LOCK:
+        _STORE_PATH = os.path.abspath(path) if path else None
+        _BUCKETS.clear()
+
+
+def tool_rate_limiter(tool) -> Optional[TokenBucket]:
+    """Tool声明了`rate_limit`时返回其令牌桶"""
+    rate = getattr(tool, "rate_limit", None)
+    if not rate:
+        return None
+    return get_rate_limiter(tool.name, rate, getattr(tool, "rate_limit_burst", None))
+
+
+def acquire_tool_rate(tool, timeout: Optional[float] = None):
+    """调用Tool之前获取令牌，超过`timeout`仍无法获取令牌时抛出`TimeoutError`"""
+    limiter = tool_rate_limiter(tool)
+    if limiter is not None and not limiter.acquire(timeout):
+        raise TimeoutError(f"Rate limit of {tool.name} can not be satisfied within {timeout} seconds.")
+
+
+async def aacquire_tool_rate(tool, timeout: Optional[float] = None):
+    """`acquire_tool_rate`的异步版本"""
+    limiter = tool_rate_limiter(tool)
+    if limiter is not None and not await limiter.aacquire(timeout):
+        raise TimeoutError(f"Rate limit of {tool.name} can not be satisfied within {timeout} seconds.")
+
+
+# 协程调度使用的并发限制：事件循环 -> Tool名称 -> (并发上限, 信号量)
+_SEMAPHORES: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, Tuple[int, asyncio.Semaphore]]]" = \
+    weakref.WeakKeyDictionary()
+
+
+def tool_semaphore(tool) -> Optional[asyncio.Semaphore]:
+    """
+    Tool声明了`max_concurrency`时返回当前事件循环中该Tool的信号量；
+    线程调度的并发限制由执行服务的Tool级配额实现
+    """
+    limit = getattr(tool, "max_concurrency", None)
+    if limit is None:
+        return None
+    semaphores = _SEMAPHORES.setdefault(asyncio.get_running_loop(), {})
+    current = semaphores.get(tool.name)
+    if current is None or current[0] != limit:
+        current = semaphores[tool.name] = (limit, asyncio.Semaphore(limit))
+    return current[1]
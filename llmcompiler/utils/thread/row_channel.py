@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""
+@Author  : Yc-Ma
+@Desc    : Replay buffer of streamed tool batches.
+@Time    : 2026-10-18 14:03:26
+"""
+import threading
+from typing import Any, Callable, Iterator, List, Optional
+
+
+class RowChannel:
+    """
+    单个TASK按批次产生结果的重放缓冲区。
+    订阅者总是从第一个批次开始读取，读取到最新批次后等待新批次到达，通道关闭后结束；上游出错时订阅者收到同一个异常。
+    """
+
+    def __init__(self, on_open: Optional[Callable[[], None]] = None):
+        """
+        :param on_open: 第一个批次到达时回调（不持有通道锁）
+        """
+        self.on_open = on_open
+        self._batches: List[Any] = []
+        self._closed = False
+        self._error: Optional[BaseException] = None
+        self._condition = threading.Condition()
+
+    @property
+    def streaming(self) -> bool:
+        """已经产生批次且尚未结束"""
+        with self._condition:
+            return bool(self._batches) and not self._closed
+
+    def put(self, batch: Any):
+        with self._condition:
+            if self._closed:
+                raise ValueError("Can not put a batch into a closed channel.")
+            first = not self._batches
+            self._batches.append(batch)
+            self._condition.notify_all()
+        if first and self.on_open is not None:
+            self.on_open()
+
+    def close(self, error: Optional[BaseException] = None):
+        with self._condition:
+            self._closed = True
+            self._error = error
+            self._condition.notify_all()
+
+    def __iter__(self) -> Iterator[Any]:
+        position = 0
+        while True:
+            with self._condition:
+                while position >= len(self._batches) and not self._closed:
+                    self._condition.wait()
+                if position < len(self._batches):
+                    batch = self._batches[position]
+                    position += 1
+                elif self._error is not None:
+                    raise self._error
+                else:
+                    return
+            yield batch
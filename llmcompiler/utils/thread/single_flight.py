@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+"""
+@Author  : Yc-Ma
+@Desc    : Single-flight call deduplication.
+@Time    : 2026-10-18 12:41:08
+"""
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+
+class SingleFlight:
+    """
+    相同KEY的调用只执行一次：并发的重复调用等待第一次调用完成并复用其结果，调用出错或结果不可复用时等待中的重复调用重新执行。
+    调用完成后不再持有结果，只通过`remember`记录KEY对应的结果引用（例如TASK ID），由调用方按引用读取已完成的结果。
+    同一个实例可以同时用于线程与协程。
+    """
+
+    def __init__(self, reusable: Optional[Callable[[Any], bool]] = None):
+        """
+        :param reusable: 判断调用结果是否可以被重复调用复用，默认全部可复用
+        """
+        self.reusable = reusable or (lambda result: True)
+        self.hits = 0
+        # 执行中的调用
+        self._calls: Dict[Hashable, Future] = {}
+        # 已完成调用的结果引用
+        self._done: Dict[Hashable, Hashable] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Optional[Hashable], fn: Callable, *args: Any, **kwargs: Any) -> Any:
+        """执行调用，`key`为空表示调用不参与去重"""
+        if key is None:
+            return fn(*args, **kwargs)
+        while True:
+            future, leader = self._acquire(key)
+            if leader:
+                return self._lead(key, future, fn, args, kwargs)
+            try:
+                result = future.result()
+            except BaseException:
+                continue
+            if self.reusable(result):
+                self._hit()
+                return result
+
+    async def ado(self, key: Optional[Hashable], fn: Callable, *args: Any, **kwargs: Any) -> Any:
+        """`do`的异步版本，`fn`为协程函数"""
+        if key is None:
+            return await fn(*args, **kwargs)
+        while True:
+            future, leader = self._acquire(key)
+            if leader:
+                try:
+                    result = await fn(*args, **kwargs)
+                except BaseException as e:
+                    self._fail(key, future, e)
+                    raise
+                return self._finish(key, future, result)
+            try:
+                result = await asyncio.wrap_future(future)
+            except BaseException:
+                continue
+            if self.reusable(result):
+                self._hit()
+                return result
+
+    def claim(self, key: Hashable) -> Optional[Future]:
+        """
+        登记由调用方自行执行的调用（例如合并为一次批量调用的多个调用），调用完成后通过`settle`通知等待中的重复调用；
+        相同调用正在执行时返回None
+        """
+        future, leader = self._acquire(key)
+        return future if leader else None
+
+    def settle(self, key: Hashable, future: Future, result: Any = None, error: Optional[BaseException] = None):
+        """`claim`登记的调用完成，出错时等待中的重复调用重新执行"""
+        if error is not None:
+            self._fail(key, future, error)
+        else:
+            self._finish(key, future, result)
+
+    def remember(self, key: Optional[Hashable], ref: Hashable):
+        """记录KEY对应的已完成结果的引用"""
+        if key is not None:
+            with self._lock:
+                self._done[key] = ref
+
+    def recall(self, key: Optional[Hashable]) -> Optional[Hashable]:
+        """KEY对应的已完成结果的引用，没有时返回None"""
+        if key is None:
+            return None
+        with self._lock:
+            return self._done.get(key)
+
+    def hit(self):
+        """调用方复用了已完成的结果"""
+        self._hit()
+
+    def clear(self):
+        with self._lock:
+            self._calls.clear()
+            self._done.clear()
+
+    def _acquire(self, key: Hashable) -> Tuple[Future, bool]:
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                return future, False
+            future = self._calls[key] = Future()
+            return future, True
+
+    def _lead(self, key: Hashable, future: Future, fn: Callable, args: tuple, kwargs: dict) -> Any:
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            self._fail(key, future, e)
+            raise
+        return self._finish(key, future, result)
+
+    def _finish(self, key: Hashable, future: Future, result: Any) -> Any:
+        # 先移除调用再通知等待者：结果只交给等待中的重复调用，不再被实例持有
+        self._release(key, future)
+        future.set_result(result)
+        return result
+
+    def _fail(self, key: Hashable, future: Future, error: BaseException):
+        self._release(key, future)
+        future.set_exception(error)
+
+    def _release(self, key: Hashable, future: Future):
+        with self._lock:
+            if self._calls.get(key) is future:
+                del self._calls[key]
+
+    def _hit(self):
+        with self._lock:
+            self.hits += 1
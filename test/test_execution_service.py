@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""
+Test the process-wide execution service.
+"""
+import sys
+import os
+import time
+import threading
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from llmcompiler.utils.thread.execution_service import ExecutionService, ROW_LANE, tool_key, request_key
+
+
+class _Concurrency:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.current = 0
+        self.peak = 0
+
+    def __call__(self, value):
+        with self.lock:
+            self.current += 1
+            self.peak = max(self.peak, self.current)
+        time.sleep(0.02)
+        with self.lock:
+            self.current -= 1
+        return value
+
+
+def test_lane_bounds_threads():
+    service = ExecutionService(task_workers=3, row_workers=2)
+    counter = _Concurrency()
+    assert service.map(counter, range(10)) == list(range(10))
+    assert counter.peak == 3
+    counter = _Concurrency()
+    service.map(counter, range(10), lane=ROW_LANE)
+    assert counter.peak == 2
+
+
+def test_quota_keys():
+    service = ExecutionService(task_workers=8, request_quota=2)
+    counter = _Concurrency()
+    service.map(counter, range(8), keys=(request_key('r1'),))
+    assert counter.peak == 2
+
+    service.set_limit(tool_key('slow'), 1)
+    counter = _Concurrency()
+    service.map(counter, range(4), lane=ROW_LANE, keys=(tool_key('slow'),))
+    assert counter.peak == 1
+
+
+def test_exception_propagates():
+    service = ExecutionService(task_workers=2)
+
+    def fail():
+        raise ValueError('boom')
+
+    future = service.submit(fail)
+    try:
+        future.result()
+        assert False
+    except ValueError as e:
+        assert str(e) == 'boom'
+    assert service.submit(lambda: 1).result() == 1
+
+
+def test_map_timeout_cancels_remaining_calls():
+    service = ExecutionService(task_workers=1)
+    try:
+        service.map(time.sleep, [0.2, 0.2, 0.2], timeout=0.1)
+        assert False
+    except TimeoutError:
+        pass
+    time.sleep(0.3)
+    assert service.submit(lambda: 1).result(timeout=1) == 1
+
+
+def test_queued_jobs_start_by_priority():
+    service = ExecutionService(task_workers=1)
+    gate = threading.Event()
+    order = []
+    blocker = service.submit(gate.wait)
+    low = service.submit(order.append, 'low', priority=1.0)
+    service.submit(order.append, 'high', priority=5.0)
+    service.submit(order.append, 'mid', priority=3.0)
+    assert service.reprioritize(low, 10.0)
+    gate.set()
+    blocker.result()
+    service.map(lambda x: x, [None])
+    assert order == ['low', 'high', 'mid']
+
+
+def test_token_bucket_paces_calls():
+    from llmcompiler.utils.thread.rate_limit import TokenBucket, parse_rate
+
+    assert parse_rate('120/min') == 2.0 and parse_rate(5) == 5.0
+    bucket = TokenBucket(rate=20, burst=2)
+    start = time.time()
+    for _ in range(6):
+        assert bucket.acquire()
+    assert time.time() - start >= 0.18
+    assert bucket.acquire(timeout=0.001) is False
+
+
+def test_sqlite_token_bucket_is_shared(tmp_path):
+    from llmcompiler.utils.thread.rate_limit import SqliteTokenBucket
+
+    path = str(tmp_path / 'rate_limit.db')
+    first = SqliteTokenBucket(path, 'tool', rate=1, burst=2)
+    second = SqliteTokenBucket(path, 'tool', rate=1, burst=2)
+    assert first.reserve() == 0.0
+    assert second.reserve() == 0.0
+    assert first.reserve(max_wait=0.1) is None
+
+
+def test_broker_redelivers_expired_leases_by_affinity():
+    from llmcompiler.utils.thread.broker import LocalBroker
+
+    broker = LocalBroker(lease_timeout=0.2, max_deliveries=2)
+    broker.put('t1', 'math', 1)
+    broker.put('t2', 'search', 2)
+    # a worker serving only search never leases math tasks
+    assert broker.lease('w1', ['search'], timeout=0) == ('t2', 2)
+    assert broker.lease('w1', ['search'], timeout=0.05) is None
+    # w2 stops heartbeating, the task is delivered to w3 once its lease expires
+    assert broker.lease('w2', None, timeout=0) == ('t1', 1)
+    assert broker.lease('w3', ['math'], timeout=1) == ('t1', 1)
+    broker.heartbeat('w1')
+    assert broker.complete('t1', 'w3', True, 'one')
+    assert broker.complete('t1', 'w2', True, 'late') is False
+    assert broker.result('t1', timeout=0) == (True, 'one')
+    # t2 fails after reaching the delivery limit
+    assert broker.lease('w4', None, timeout=1) == ('t2', 2)
+    ok, error = broker.result('t2', timeout=1)
+    assert not ok and 'delivered 2 times' in error
+
+
+def test_remote_calls_require_authkey_and_wait_bounded(monkeypatch):
+    from llmcompiler.utils.thread import broker as broker_module
+
+    for authkey in (b"", None):
+        try:
+            broker_module.serve_broker(("127.0.0.1", 0), authkey)
+            assert False, authkey
+        except ValueError:
+            pass
+    # without a deadline and without workers the call gives up after REMOTE_TIMEOUT
+    local = broker_module.LocalBroker()
+    monkeypatch.setattr(broker_module, "REMOTE_TIMEOUT", 0.1)
+    broker_module.configure_remote_broker(local)
+    try:
+        start = time.time()
+        try:
+            broker_module.run_remotely('math', 1)
+            assert False
+        except TimeoutError:
+            pass
+        assert time.time() - start < 1
+        assert local.lease('w1', None, timeout=0) is None
+    finally:
+        broker_module.configure_remote_broker(None)
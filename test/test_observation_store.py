@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""
+Test the memory-bounded observation store.
+"""
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+import numpy as np
+import pandas as pd
+
+from llmcompiler.graph.observation_store import ObservationStore
+from llmcompiler.tools.generic.action_output import ActionOutput
+
+
+def test_large_observations_spill_and_rehydrate(tmp_path):
+    store = ObservationStore(budget=1024 * 1024, min_spill_bytes=1024, spill_dir=str(tmp_path))
+    frames = {idx: pd.DataFrame({'nav': np.arange(100000, dtype=np.float64) + idx}) for idx in (1, 2, 3)}
+    for idx, df in frames.items():
+        store[idx] = ActionOutput(any=df)
+    store[4] = 'join'
+    assert store.memory_bytes <= 1024 * 1024
+    assert store.spilled(1) and store.spilled(2) and not store.spilled(3)
+    assert sorted(store) == [1, 2, 3, 4] and len(store) == 4 and 2 in store
+
+    restored = store[1].any
+    pd.testing.assert_frame_equal(restored, frames[1])
+    restored.loc[0, 'nav'] = -1.0
+    assert store.spilled(3)
+    assert store[4] == 'join'
+
+    del store[1]
+    assert 1 not in store and len(store) == 3
+    store.clear()
+    assert len(store) == 0 and not os.listdir(str(tmp_path))
+
+
+def test_unpicklable_observations_stay_in_memory():
+    store = ObservationStore(budget=0, min_spill_bytes=0)
+    store[1] = [lambda: None]
+    store[2] = 'x' * 1000
+    assert not store.spilled(1) and store.spilled(2)
+    assert store[2] == 'x' * 1000
+
+
+def test_scheduler_resolves_spilled_dependencies():
+    from test.test_plan_and_schedule import _schedule
+
+    store = ObservationStore(budget=0, min_spill_bytes=0)
+    observations, _ = _schedule(
+        "1. echo(value=\"a\")\n"
+        "2. echo(value=\"${1}.value\")\n"
+        "3. join()\n", store)
+    assert store.spilled(1)
+    assert observations[2].any.value == ['a']
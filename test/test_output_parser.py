@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""
+Test the plan parser.
+"""
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from test.test_plan_and_schedule import EchoTool
+from llmcompiler.graph.output_parser import LLMCompilerPlanParser, lex_action_args
+
+
+def test_plan_streamed_tasks_emitted_at_closing_parenthesis():
+    """A task is emitted as soon as its balanced closing parenthesis is streamed, before the newline."""
+    plan = ("Thought: echo twice\n"
+            "1. echo(value=\"a (b)\")\n"
+            "2. echo(value=\")${1}\")\n"
+            "3. join()")
+    fed = []
+
+    def chars():
+        for char in plan:
+            fed.append(char)
+            yield char
+
+    emitted = []
+    for task in LLMCompilerPlanParser(tools=[EchoTool()]).transform(chars()):
+        emitted.append((task["idx"], "".join(fed)))
+    assert [idx for idx, _ in emitted] == [1, 2, 3]
+    assert emitted[0][1].endswith('1. echo(value="a (b)")')
+    assert emitted[1][1].endswith('2. echo(value=")${1}")')
+
+    tasks = LLMCompilerPlanParser(tools=[EchoTool()]).parse(plan)
+    assert tasks[0]["thought"] == "echo twice"
+    assert tasks[0]["args"] == {"value": "a (b)"}
+    assert tasks[1]["dependencies"] == [1]
+    assert tasks[2]["tool"] == "join"
+
+
+def test_dependencies_only_reference_earlier_tasks():
+    """Each referenced task id counts once, and self or forward references are not dependencies."""
+    tasks = LLMCompilerPlanParser(tools=[EchoTool()]).parse(
+        "1. echo(value=\"a\")\n"
+        "2. echo(value=\"b\")\n"
+        "3. echo(value=[\"${2}.value\", \"${1}.value\", \"${2}\", \"${3}\", \"${12}\"])\n"
+        "4. join()\n")
+    assert [task["dependencies"] for task in tasks] == [[], [], [1, 2], [1, 2, 3]]
+
+
+def test_action_args_lexed_in_one_pass():
+    """Quoted or nested commas and key names inside values do not split arguments."""
+    lexed = lex_action_args("value=\"a, delay=1\", delay=[1, {'x': (2, 3)}],", ["value", "delay"])
+    assert [(arg.key, arg.value) for arg in lexed] == [("value", "a, delay=1"), ("delay", [1, {'x': (2, 3)}])]
+    # unknown keys stay part of the previous value, as with the schema-keyed split
+    lexed = lex_action_args("value=1, other=2", ["value", "delay"])
+    assert [(arg.key, arg.value) for arg in lexed] == [("value", "1, other=2")]
+    lexed = lex_action_args("value=${1}.value, delay=0.5) # trailing", ["value", "delay"])
+    assert [(arg.key, arg.value) for arg in lexed] == [("value", "${1}.value"), ("delay", 0.5)]
+    # a quote only opens a string at the start of a value or element
+    lexed = lex_action_args("query=O'Neil fund, code=\"1\", names=['a', \"b'c\"]", ["query", "code", "names"])
+    assert {arg.key: arg.value for arg in lexed} == {'query': "O'Neil fund", 'code': '1', 'names': ['a', "b'c"]}
+    tasks = LLMCompilerPlanParser(tools=[EchoTool()]).parse("1. echo(value=O'Neil (fund), delay=0)\n")
+    assert tasks[0]["args"] == {'value': "O'Neil (fund)", 'delay': 0}
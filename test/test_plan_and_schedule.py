@@ -0,0 +1,776 @@
+# -*- coding: utf-8 -*-
+"""
+Test the Task Fetching Unit scheduling.
+"""
+import sys
+import os
+import time
+import asyncio
+import threading
+from typing import Any, List, Optional, Type, Union
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from pydantic import BaseModel, Field
+
+from llmcompiler.graph.output_parser import LLMCompilerPlanParser
+from llmcompiler.graph.plan_and_schedule import schedule_tasks, aschedule_tasks, SchedulerInput, execute_plan, aexecute_plan, \
+    _batchable
+from llmcompiler.graph.critical_path import TOOL_LATENCY
+from llmcompiler.graph.plan_validation import PlanValidationError, topological_levels
+from llmcompiler.tools.basic import CompilerBaseTool
+from llmcompiler.tools.configure.tool_decorator import tool_call_by_row_pass_parameters, resolved_args_dependency
+from llmcompiler.tools.dag.dag_flow_params import DISABLE_ROW_CALL
+from llmcompiler.tools.generic.action_output import ActionOutput, ActionOutputError, ActionOutputStream
+
+
+class EchoInputSchema(BaseModel):
+    value: Optional[Any] = Field(default=None, description="value")
+    delay: Optional[float] = Field(default=0.0, description="delay seconds")
+
+
+class EchoOutputSchema(BaseModel):
+    value: Optional[Any] = Field(default=None, description="value")
+
+
+class EchoTool(CompilerBaseTool):
+    name: str = "echo"
+    description: str = "Echo the input value."
+    args_schema: Type[BaseModel] = EchoInputSchema
+
+    output_model: Type[BaseModel] = EchoOutputSchema
+    dag_flow_kwargs: List[str] = ['value']
+
+    def _run(self, **kwargs: Any) -> ActionOutput:
+        time.sleep(kwargs.get('delay') or 0.0)
+        with CALLS_LOCK:
+            CALLS.append((kwargs.get('value'), time.time()))
+        output = EchoOutputSchema(value=kwargs.get('value'))
+        return ActionOutput(any=output, dag_kwargs=self.flow(output))
+
+
+CALLS = []
+CALLS_LOCK = threading.Lock()
+
+
+class PidTool(CompilerBaseTool):
+    """Reports the process it runs in, defined at module level so worker processes can import it."""
+    name: str = "pid"
+    description: str = "Return the process id."
+    args_schema: Type[BaseModel] = EchoInputSchema
+
+    output_model: Type[BaseModel] = EchoOutputSchema
+    dag_flow_kwargs: List[str] = ['value']
+    execution: str = "process"
+
+    def _run(self, **kwargs: Any) -> ActionOutput:
+        time.sleep(kwargs.get('delay') or 0.0)
+        output = EchoOutputSchema(value=[kwargs.get('value'), os.getpid()])
+        return ActionOutput(any=output, dag_kwargs=self.flow(output))
+
+
+def _schedule(plan: str, observations: dict = None):
+    tools = [EchoTool()]
+    tasks = LLMCompilerPlanParser(tools=tools).parse(plan)
+    observations = {} if observations is None else observations
+    output = schedule_tasks.invoke(
+        SchedulerInput(messages=[], tasks=iter(tasks), charts=[], tasks_temporary_save=[],
+                       observations=observations, print_dag=False))
+    return observations, output
+
+
+def test_dependency_chain():
+    """Dependent tasks receive the resolved value of their dependency."""
+    observations, output = _schedule(
+        "1. echo(value=\"a\", delay=0.05)\n"
+        "2. echo(value=\"${1}.value\")\n"
+        "3. echo(value=\"${2}.value\")\n"
+        "4. join()\n")
+    assert observations[2].any.value == ['a']
+    assert observations[3].any.value == [['a']]
+    assert observations[4] == 'join'
+    assert len(output['messages']) == 6
+
+
+def test_dependents_dispatch_without_polling_delay():
+    """A dependent task starts right after its last dependency finishes."""
+    CALLS.clear()
+    start = time.time()
+    _schedule("\n".join(f"{i}. echo(value=\"${{{i - 1}}}.value\")" if i > 1 else "1. echo(value=\"x\")"
+                        for i in range(1, 7)) + "\n")
+    assert len(CALLS) == 6
+    assert time.time() - start < 0.5
+
+
+def test_unsatisfiable_dependency_is_not_executed():
+    """A task depending on a task that never arrives is dropped instead of blocking."""
+    observations, _ = _schedule("2. echo(value=\"${1}.value\")\n3. echo(value=\"b\")\n")
+    assert 2 not in observations
+    assert observations[3].any.value == 'b'
+
+
+def test_async_dependency_chain():
+    """The asyncio scheduler resolves dependencies like the threaded one."""
+    tasks = LLMCompilerPlanParser(tools=[EchoTool()]).parse(
+        "1. echo(value=\"a\", delay=0.05)\n"
+        "2. echo(value=\"${1}.value\")\n"
+        "3. echo(value=\"c\")\n")
+
+    async def stream():
+        for task in tasks:
+            yield task
+
+    observations = {}
+    output = asyncio.run(aschedule_tasks.ainvoke(
+        SchedulerInput(messages=[], tasks=stream(), charts=[], tasks_temporary_save=[],
+                       observations=observations, print_dag=False)))
+    assert observations[2].any.value == ['a']
+    assert observations[3].any.value == 'c'
+    assert len(output['messages']) == 6
+
+
+def test_critical_path_remaining():
+    """Upstream tasks accumulate the longest downstream chain as later tasks stream in."""
+    from llmcompiler.graph.critical_path import CriticalPath, ToolLatency
+    updates = {}
+    path = CriticalPath(ToolLatency(default=1.0), on_update=updates.__setitem__)
+    tasks = LLMCompilerPlanParser(tools=[EchoTool()]).parse(
+        "1. echo(value=\"a\")\n"
+        "2. echo(value=\"b\")\n"
+        "3. echo(value=\"${1}.value\")\n"
+        "4. echo(value=\"${3}.value\")\n"
+        "5. join()\n")
+    for task in tasks:
+        path.add(task)
+    assert path.remaining(1) == 3.0
+    assert path.remaining(2) == 1.0
+    assert path.remaining(5) == 0.0
+    assert updates[1] == 3.0
+
+
+def test_arguments_compiled_at_parse_time():
+    """Placeholders are compiled into resolution programs when the plan is parsed."""
+    from llmcompiler.graph.arg_resolver import LiteralArg, SingleRef, MultiRef
+    tasks = LLMCompilerPlanParser(tools=[EchoTool()]).parse(
+        "1. echo(value=\"a\")\n"
+        "2. echo(value=\"${1}.value\")\n"
+        "3. echo(value=\"${1}.value and ${2}.value\")\n")
+    assert isinstance(tasks[0]["programs"].fields["value"], LiteralArg)
+    assert isinstance(tasks[1]["programs"].fields["value"], SingleRef)
+    assert tasks[1]["programs"].fields["value"].idx == 1
+    assert isinstance(tasks[2]["programs"].fields["value"], MultiRef)
+
+    observations, _ = _schedule(
+        "1. echo(value=\"a\")\n"
+        "2. echo(value=\"b\")\n"
+        "3. echo(value=\"${1}.value and ${2}.value\")\n")
+    assert observations[3].any.value == "['a'] and ['b']"
+
+
+def test_task_registry_views():
+    """The task table answers idx lookups without scanning the task list."""
+    from llmcompiler.graph.task_registry import TaskRegistry
+    tasks = LLMCompilerPlanParser(tools=[EchoTool()]).parse(
+        "1. echo(value=\"a\")\n"
+        "2. echo(value=\"${1}.value\")\n"
+        "4. echo(value=\"${1}.value\")\n"
+        "5. join()\n")
+    backing = []
+    registry = TaskRegistry.wrap(backing)
+    for task in tasks:
+        registry.append(task)
+    assert len(backing) == len(registry) == 4
+    assert registry.get(4) is tasks[2]
+    assert registry.get(5) is None
+    assert registry.previous_tool_idx(4) == 2
+    assert registry.previous_tool_idx(1) is None
+    assert registry.dependents(1) == [2, 4, 5]
+    assert registry.last()['idx'] == 5
+
+
+def test_identical_calls_run_once():
+    """Duplicate tool calls share the first execution and are recorded under every idx."""
+    CALLS.clear()
+    observations, _ = _schedule(
+        "1. echo(value=\"a\", delay=0.1)\n"
+        "2. echo(value=\"a\", delay=0.1)\n"
+        "3. echo(value=\"b\")\n"
+        "4. echo(delay=0.1, value=\"a\")\n")
+    assert sorted(value for value, _ in CALLS) == ['a', 'b']
+    assert observations[1] is observations[2] is observations[4]
+
+
+def test_completed_duplicates_read_back_through_observations():
+    """A later identical call reuses the earlier task's observation; completed results are not pinned."""
+    from llmcompiler.graph.plan_and_schedule import new_single_flight
+    CALLS.clear()
+    single_flight = new_single_flight()
+    observations = {}
+    for plan in ["1. echo(value=\"a\")\n", "2. echo(value=\"a\")\n"]:
+        schedule_tasks.invoke(
+            SchedulerInput(messages=[], tasks=iter(LLMCompilerPlanParser(tools=[EchoTool()]).parse(plan)), charts=[],
+                           tasks_temporary_save=[], observations=observations, print_dag=False,
+                           single_flight=single_flight))
+        assert not single_flight._calls
+    assert [value for value, _ in CALLS] == ['a']
+    assert observations[2] is observations[1] and single_flight.hits == 1
+
+
+def test_cached_tool_skips_backend_across_requests():
+    """Tools declaring `cache_ttl` reuse successful results across schedules."""
+    from llmcompiler.tools.cache.tool_cache import configure_tool_cache, get_tool_cache
+    from llmcompiler.tools.cache.memory import MemoryToolCache
+
+    class CachedEchoTool(EchoTool):
+        name: str = "cached_echo"
+        cache_ttl: Optional[float] = 60
+        cache_key_fields: Optional[List[str]] = ['value']
+
+    previous = get_tool_cache()
+    cache = configure_tool_cache(MemoryToolCache())
+    try:
+        CALLS.clear()
+        for delay in (0.0, 0.01):
+            tasks = LLMCompilerPlanParser(tools=[CachedEchoTool()]).parse(
+                f"1. cached_echo(value=\"a\", delay={delay})\n")
+            observations = {}
+            schedule_tasks.invoke(
+                SchedulerInput(messages=[], tasks=iter(tasks), charts=[], tasks_temporary_save=[],
+                               observations=observations, print_dag=False))
+            assert observations[1].any.value == 'a'
+        assert len(CALLS) == 1
+        assert cache.stats('cached_echo')['hits'] == 1
+    finally:
+        configure_tool_cache(previous)
+
+
+class PagesInputSchema(BaseModel):
+    pages: Optional[int] = Field(default=3, description="page count")
+
+
+class PagesTool(EchoTool):
+    name: str = "pages"
+    args_schema: Type[BaseModel] = PagesInputSchema
+
+    def _run(self, **kwargs: Any) -> ActionOutputStream:
+        def batches():
+            for page in range(kwargs.get('pages') or 3):
+                time.sleep(0.1)
+                with CALLS_LOCK:
+                    CALLS.append((f'page{page}', time.time()))
+                rows = [EchoOutputSchema(value=f'p{page}r{row}') for row in range(2)]
+                yield ActionOutput(any=rows, dag_kwargs=self.flow(rows))
+
+        return ActionOutputStream(batches(), tool_name=self.name)
+
+
+class RowEchoTool(EchoTool):
+    name: str = "row_echo"
+
+    @tool_call_by_row_pass_parameters(fill_non_list_row=True)
+    def _run(self, **kwargs: Any) -> ActionOutput:
+        with CALLS_LOCK:
+            CALLS.append((kwargs.get('value'), time.time()))
+        output = EchoOutputSchema(value=kwargs.get('value'))
+        return ActionOutput(any=output, dag_kwargs=self.flow(output))
+
+
+def test_row_tool_pipelines_streamed_batches():
+    """A row-wise downstream task starts on the first upstream batch and merges like a single call."""
+    CALLS.clear()
+    tools = [PagesTool(), RowEchoTool()]
+    tasks = LLMCompilerPlanParser(tools=tools).parse(
+        "1. pages(pages=3)\n"
+        "2. row_echo(value=\"${1}.value\", delay=0)\n")
+    observations = {}
+    schedule_tasks.invoke(
+        SchedulerInput(messages=[], tasks=iter(tasks), charts=[], tasks_temporary_save=[],
+                       observations=observations, print_dag=False))
+    calls = dict(CALLS)
+    assert calls['p0r0'] < calls['page2']
+    assert observations[1].dag_kwargs.kwargs['value'] == [f'p{p}r{r}' for p in range(3) for r in range(2)]
+    assert observations[2].dag_kwargs.kwargs['value'] == observations[1].dag_kwargs.kwargs['value']
+    assert len(observations[2].any) == 6
+
+
+def test_pipelined_task_fails_when_a_batch_fails():
+    """One failed batch fails the whole pipelined task instead of returning the other batches."""
+
+    class PickyRowEchoTool(RowEchoTool):
+        name: str = "picky_row_echo"
+
+        @tool_call_by_row_pass_parameters(fill_non_list_row=True)
+        def _run(self, **kwargs: Any) -> ActionOutput:
+            if kwargs.get('value') == 'p1r0':
+                raise ValueError('bad row p1r0')
+            output = EchoOutputSchema(value=kwargs.get('value'))
+            return ActionOutput(any=output, dag_kwargs=self.flow(output))
+
+    tasks = LLMCompilerPlanParser(tools=[PagesTool(), PickyRowEchoTool()]).parse(
+        "1. pages(pages=3)\n"
+        "2. picky_row_echo(value=\"${1}.value\", delay=0)\n")
+    observations = {}
+    schedule_tasks.invoke(
+        SchedulerInput(messages=[], tasks=iter(tasks), charts=[], tasks_temporary_save=[],
+                       observations=observations, print_dag=False))
+    assert len(observations[1].any) == 6
+    assert isinstance(observations[2], str) and 'bad row p1r0' in observations[2]
+
+
+def test_retried_stream_is_not_pipelined():
+    """Batches of a failed attempt are not streamed; the dependent waits for the retried result."""
+    from llmcompiler.tools.configure.retry_policy import RetryPolicy
+
+    attempts = []
+
+    class FlakyPagesTool(PagesTool):
+        name: str = "flaky_pages"
+        retry_policy: Optional[RetryPolicy] = RetryPolicy(max_attempts=2, initial_delay=0.01)
+
+        def _run(self, **kwargs: Any) -> ActionOutputStream:
+            attempts.append(kwargs.get('pages'))
+            stream = super()._run(**kwargs)
+            if len(attempts) > 1:
+                return stream
+
+            def failing():
+                yield next(iter(stream))
+                raise ConnectionError('transient')
+
+            return ActionOutputStream(failing(), tool_name=self.name)
+
+    CALLS.clear()
+    tasks = LLMCompilerPlanParser(tools=[FlakyPagesTool(), RowEchoTool()]).parse(
+        "1. flaky_pages(pages=2)\n"
+        "2. row_echo(value=\"${1}.value\", delay=0)\n")
+    observations = {}
+    schedule_tasks.invoke(
+        SchedulerInput(messages=[], tasks=iter(tasks), charts=[], tasks_temporary_save=[],
+                       observations=observations, print_dag=False))
+    assert attempts == [2, 2]
+    assert isinstance(observations[2], ActionOutput)
+    assert observations[2].dag_kwargs.kwargs['value'] == ['p0r0', 'p0r1', 'p1r0', 'p1r1']
+
+
+class WholeListOutputSchema(BaseModel):
+    value: Optional[Any] = Field(default=None, description="value", json_schema_extra=DISABLE_ROW_CALL)
+
+
+class WholeListTool(EchoTool):
+    """Returns one output row per input value; downstream row calls receive its `value` column whole."""
+    name: str = "whole_list"
+    output_model: Type[BaseModel] = WholeListOutputSchema
+
+    def _run(self, **kwargs: Any) -> ActionOutput:
+        rows = [self.output_model(value=value) for value in kwargs.get('value')]
+        return ActionOutput(any=rows, dag_kwargs=self.flow(rows))
+
+
+class RowsTool(WholeListTool):
+    name: str = "rows"
+    output_model: Type[BaseModel] = EchoOutputSchema
+
+
+class RowContextTool(EchoTool):
+    name: str = "row_context"
+
+    @tool_call_by_row_pass_parameters(detect_disable_row_call=True)
+    def _run(self, **kwargs: Any) -> ActionOutput:
+        time.sleep(0.2)
+        # the dependency context is still the one of this task after the other task has started
+        dependency = resolved_args_dependency(self)['value']['dep_task']['idx']
+        with CALLS_LOCK:
+            CALLS.append((kwargs.get('value'), dependency))
+        output = EchoOutputSchema(value=kwargs.get('value'))
+        return ActionOutput(any=output, dag_kwargs=self.flow(output))
+
+
+def test_concurrent_row_calls_keep_their_own_dependency_context():
+    """Two concurrent row-call tasks on one tool instance each see the dependencies they resolved."""
+    CALLS.clear()
+    tools = [WholeListTool(), RowsTool(), RowContextTool()]
+    tasks = LLMCompilerPlanParser(tools=tools).parse(
+        "1. whole_list(value=[\"a\", \"b\"])\n"
+        "2. rows(value=[\"c\", \"d\"])\n"
+        "3. row_context(value=\"${1}.value\")\n"
+        "4. row_context(value=\"${2}.value\")\n")
+    observations = {}
+    schedule_tasks.invoke(
+        SchedulerInput(messages=[], tasks=iter(tasks), charts=[], tasks_temporary_save=[],
+                       observations=observations, print_dag=False))
+    # task 3 depends on a `disable_row_call` column and is called once with the whole list,
+    # task 4 runs at the same time and is still called row by row
+    assert [output.value for output in observations[3].any] == [['a', 'b']]
+    assert [output.value for output in observations[4].any] == ['c', 'd']
+    assert sorted((str(value), dependency) for value, dependency in CALLS) == [("['a', 'b']", 1), ('c', 2), ('d', 2)]
+
+
+class FailTool(EchoTool):
+    name: str = "fail"
+
+    def _run(self, **kwargs: Any) -> ActionOutput:
+        return ActionOutputError()
+
+
+def test_failed_task_skips_dependents():
+    """Dependents of a failed task are skipped transitively, independent tasks and join still run."""
+    CALLS.clear()
+    tools = [EchoTool(), FailTool()]
+    tasks = LLMCompilerPlanParser(tools=tools).parse(
+        "1. fail(value=\"x\")\n"
+        "2. echo(value=\"${1}.value\")\n"
+        "3. echo(value=\"${2}.value\")\n"
+        "4. echo(value=\"c\")\n"
+        "5. join()\n")
+    observations = {}
+    schedule_tasks.invoke(
+        SchedulerInput(messages=[], tasks=iter(tasks), charts=[], tasks_temporary_save=[],
+                       observations=observations, print_dag=False))
+    assert [value for value, _ in CALLS] == ['c']
+    assert observations[2].startswith('SKIPPED(') and observations[3].startswith('SKIPPED(')
+    assert observations[5] == 'join'
+
+
+def test_request_deadline_returns_partial_observations():
+    """Outstanding tasks are reported as timed out at the request deadline."""
+    from llmcompiler.utils.thread.deadline import with_deadline
+
+    CALLS.clear()
+    tasks = LLMCompilerPlanParser(tools=[EchoTool()]).parse(
+        "1. echo(value=\"a\")\n"
+        "2. echo(value=\"b\", delay=1)\n"
+        "3. echo(value=\"${2}.value\")\n")
+    observations = {}
+    start = time.time()
+    schedule_tasks.invoke(
+        SchedulerInput(messages=[], tasks=iter(tasks), charts=[], tasks_temporary_save=[],
+                       observations=observations, print_dag=False), with_deadline(None, 0.3))
+    assert time.time() - start < 0.8
+    assert observations[1].any.value == 'a'
+    assert observations[2].startswith('TIMEOUT(') and observations[3].startswith('TIMEOUT(')
+    time.sleep(1)
+    assert observations[2].startswith('TIMEOUT(')
+
+
+def test_tool_max_concurrency_and_rate_limit():
+    """Declared concurrency and rate limits serialize backend calls across tasks."""
+
+    class LimitedEchoTool(EchoTool):
+        name: str = "limited_echo"
+        max_concurrency: Optional[int] = 1
+        rate_limit: Optional[Union[str, float]] = "600/min"
+
+    CALLS.clear()
+    tasks = LLMCompilerPlanParser(tools=[LimitedEchoTool()]).parse(
+        "1. limited_echo(value=\"a\", delay=0.1)\n"
+        "2. limited_echo(value=\"b\", delay=0.1)\n"
+        "3. limited_echo(value=\"c\", delay=0.1)\n")
+    start = time.time()
+    schedule_tasks.invoke(
+        SchedulerInput(messages=[], tasks=iter(tasks), charts=[], tasks_temporary_save=[],
+                       observations={}, print_dag=False))
+    assert time.time() - start >= 0.3
+    ends = sorted(t for _, t in CALLS)
+    assert all(b - a >= 0.09 for a, b in zip(ends, ends[1:]))
+
+
+def test_retry_and_hedge_idempotent_tool():
+    """Transient failures are retried, slow idempotent calls are hedged after the observed p95 latency."""
+    from llmcompiler.tools.configure.retry_policy import RetryPolicy
+
+    attempts = []
+
+    class FlakyEchoTool(EchoTool):
+        name: str = "flaky_echo"
+        retry_policy: Optional[RetryPolicy] = RetryPolicy(max_attempts=3, initial_delay=0.01)
+
+        def _run(self, **kwargs: Any) -> ActionOutput:
+            attempts.append(kwargs.get('value'))
+            if len(attempts) < 3:
+                raise ConnectionError('transient')
+            return super()._run(**kwargs)
+
+    class SlowOnceEchoTool(EchoTool):
+        name: str = "slow_once_echo"
+        idempotent: bool = True
+
+        def _run(self, **kwargs: Any) -> ActionOutput:
+            attempts.append(kwargs.get('value'))
+            return super()._run(value=kwargs.get('value'), delay=1 if len(attempts) == 1 else 0)
+
+    observations = {}
+    tasks = LLMCompilerPlanParser(tools=[FlakyEchoTool()]).parse("1. flaky_echo(value=\"a\")\n")
+    schedule_tasks.invoke(
+        SchedulerInput(messages=[], tasks=iter(tasks), charts=[], tasks_temporary_save=[],
+                       observations=observations, print_dag=False))
+    assert attempts == ['a', 'a', 'a'] and observations[1].any.value == 'a'
+
+    attempts.clear()
+    TOOL_LATENCY.clear('slow_once_echo')
+    for _ in range(20):
+        TOOL_LATENCY.record('slow_once_echo', 0.05)
+    tasks = LLMCompilerPlanParser(tools=[SlowOnceEchoTool()]).parse("1. slow_once_echo(value=\"b\")\n")
+    observations = {}
+    start = time.time()
+    schedule_tasks.invoke(
+        SchedulerInput(messages=[], tasks=iter(tasks), charts=[], tasks_temporary_save=[],
+                       observations=observations, print_dag=False))
+    assert time.time() - start < 0.6
+    assert attempts == ['b', 'b'] and observations[1].any.value == 'b'
+
+
+def test_hedge_does_not_wait_for_the_callers_quota():
+    """A hedge of a tool with max_concurrency=1 runs under the task's slot, so a failed slow attempt cannot hang it."""
+    attempts = []
+
+    class SingleSlotEchoTool(EchoTool):
+        name: str = "single_slot_echo"
+        idempotent: bool = True
+        max_concurrency: Optional[int] = 1
+
+        def _run(self, **kwargs: Any) -> ActionOutput:
+            attempts.append(time.time())
+            if len(attempts) == 1:
+                time.sleep(0.4)
+                raise ConnectionError('slow and failed')
+            return super()._run(**kwargs)
+
+    TOOL_LATENCY.clear('single_slot_echo')
+    for _ in range(20):
+        TOOL_LATENCY.record('single_slot_echo', 0.05)
+    observations = {}
+    tasks = LLMCompilerPlanParser(tools=[SingleSlotEchoTool()]).parse("1. single_slot_echo(value=\"a\")\n")
+    thread = threading.Thread(target=schedule_tasks.invoke, daemon=True, args=(
+        SchedulerInput(messages=[], tasks=iter(tasks), charts=[], tasks_temporary_save=[],
+                       observations=observations, print_dag=False),))
+    thread.start()
+    thread.join(5)
+    assert not thread.is_alive()
+    assert len(attempts) == 2
+    assert observations[1].any.value == 'a'
+
+
+def test_losing_hedge_attempt_can_stop_early():
+    """Once the hedge wins, the still running first attempt sees `call_cancelled()` and stops paging."""
+    from llmcompiler.utils.thread.deadline import call_cancelled
+
+    pages = []
+    stopped = threading.Event()
+
+    class PagingEchoTool(EchoTool):
+        name: str = "paging_echo"
+        idempotent: bool = True
+
+        def _run(self, **kwargs: Any) -> ActionOutput:
+            if pages:
+                return super()._run(**kwargs)
+            pages.append(0)
+            for page in range(40):
+                if call_cancelled():
+                    stopped.set()
+                    break
+                pages.append(page)
+                time.sleep(0.05)
+            return super()._run(**kwargs)
+
+    TOOL_LATENCY.clear('paging_echo')
+    for _ in range(20):
+        TOOL_LATENCY.record('paging_echo', 0.05)
+    observations = {}
+    tasks = LLMCompilerPlanParser(tools=[PagingEchoTool()]).parse("1. paging_echo(value=\"a\")\n")
+    schedule_tasks.invoke(
+        SchedulerInput(messages=[], tasks=iter(tasks), charts=[], tasks_temporary_save=[],
+                       observations=observations, print_dag=False))
+    assert observations[1].any.value == 'a'
+    assert stopped.wait(1) and len(pages) < 40
+
+
+def test_task_results_published_as_tasks_finish():
+    """Each tool task publishes its result through the callback as soon as it completes."""
+    from langgraph.graph import StateGraph, MessagesState, START, END
+    from llmcompiler.graph.task_events import with_task_result_callback
+
+    events = []
+    tools = [EchoTool(), FailTool()]
+    plan = ("1. echo(value=\"slow\", delay=0.3)\n"
+            "2. echo(value=\"fast\")\n"
+            "3. fail()\n"
+            "4. echo(value=\"${3}.value\")\n"
+            "5. join()\n")
+    tasks = LLMCompilerPlanParser(tools=tools).parse(plan)
+    config = with_task_result_callback(None, lambda event: events.append((event, time.time())))
+    start = time.time()
+    schedule_tasks.invoke(
+        SchedulerInput(messages=[], tasks=iter(tasks), charts=[], tasks_temporary_save=[],
+                       observations={}, print_dag=False), config)
+    assert [event['idx'] for event, _ in events][-1] == 1
+    assert {event['idx']: event['status'] for event, _ in events} == {1: 'success', 2: 'success', 3: 'failed',
+                                                                        4: 'skipped'}
+    fast = next(at for event, at in events if event['idx'] == 2)
+    assert fast - start < 0.2
+    assert next(event for event, _ in events if event['idx'] == 1)['duration'] >= 0.3
+
+    def node(state, config):
+        schedule_tasks.invoke(
+            SchedulerInput(messages=[], tasks=iter(LLMCompilerPlanParser(tools=tools).parse(plan)), charts=[],
+                           tasks_temporary_save=[], observations={}, print_dag=False), config)
+        return {"messages": []}
+
+    builder = StateGraph(MessagesState)
+    builder.add_node("plan_and_schedule", node)
+    builder.add_edge(START, "plan_and_schedule")
+    builder.add_edge("plan_and_schedule", END)
+    custom = [chunk for chunk in builder.compile().stream({"messages": []}, stream_mode="custom")]
+    assert sorted(chunk['idx'] for chunk in custom) == [1, 2, 3, 4]
+
+
+def test_plan_validation_and_levels():
+    """Complete plans are checked for duplicate, dangling and cyclic dependencies before execution."""
+    task = lambda idx, *deps: {"idx": idx, "tool": "echo", "args": {}, "dependencies": list(deps)}
+    assert topological_levels([task(1), task(2), task(3, 1, 2), task(4, 3), task(5, 1)]) == [[1, 2], [3, 5], [4]]
+    assert topological_levels([task(3, 1)], known=[1]) == [[3]]
+    for tasks in ([task(1), task(1)], [task(1, 2)], [task(1, 2), task(2, 1), task(3)]):
+        try:
+            topological_levels(tasks)
+            assert False, tasks
+        except PlanValidationError:
+            pass
+
+
+def test_execute_plan_keyed_by_idx():
+    """Results of a plan with non-contiguous task ids are returned by task id."""
+    tasks = LLMCompilerPlanParser(tools=[EchoTool()]).parse(
+        "3. echo(value=\"a\", delay=0.05)\n"
+        "7. echo(value=\"b\")\n"
+        "9. echo(value=\"${3}.value\")\n")
+    for by_level in (False, True):
+        results = execute_plan(tasks, by_level=by_level)
+        assert sorted(results) == [3, 7, 9]
+        assert results[9].any.value == ['a']
+    results = asyncio.run(aexecute_plan(tasks))
+    assert results[7].any.value == 'b'
+
+
+def test_same_tool_tasks_fused_into_batch_call():
+    """Ready tasks of a batch-capable tool are fused into one `_run_batch` call and split back per idx."""
+    batches = []
+
+    class BatchEchoTool(EchoTool):
+        name: str = "batch_echo"
+
+        def _run_batch(self, batch_kwargs: List[dict]) -> List[ActionOutput]:
+            batches.append([kwargs['value'] for kwargs in batch_kwargs])
+            time.sleep(0.05 * len(batch_kwargs))
+            return [self._run(**kwargs) for kwargs in batch_kwargs]
+
+    class ProcessBatchEchoTool(BatchEchoTool):
+        name: str = "process_batch_echo"
+        execution: str = "process"
+
+    tools = [EchoTool(), BatchEchoTool()]
+    plan = ("1. echo(value=\"a\", delay=0.05)\n"
+            "2. batch_echo(value=\"60\")\n"
+            "3. batch_echo(value=\"30\")\n"
+            "4. batch_echo(value=\"3\")\n"
+            "5. batch_echo(value=\"${1}.value\")\n"
+            "6. batch_echo(value=\"${1}.value\")\n"
+            "7. batch_echo(value=\"${1}.value\")\n")
+    TOOL_LATENCY.clear('batch_echo')
+    results = execute_plan(LLMCompilerPlanParser(tools=tools).parse(plan))
+    # identical calls of 5, 6 and 7 are called once
+    assert batches == [['60', '30', '3'], [['a']]]
+    assert [results[idx].any.value for idx in (2, 3, 4, 5, 6, 7)] == ['60', '30', '3', ['a'], ['a'], ['a']]
+    assert results[7] is results[5]
+    # latency is recorded per fused call, not per batch
+    assert TOOL_LATENCY.count('batch_echo') == 2 and TOOL_LATENCY.percentile('batch_echo', 100) < 0.1
+
+    batches.clear()
+    results = asyncio.run(aexecute_plan(LLMCompilerPlanParser(tools=tools).parse(plan)))
+    assert batches == [['60', '30', '3'], [['a']]]
+    assert results[4].any.value == '3' and results[6].any.value == ['a'] and results[7] is results[5]
+
+    # tools shipped to worker processes are not fused
+    assert not _batchable({"idx": 1, "tool": ProcessBatchEchoTool(), "args": {}, "dependencies": []})
+
+
+def test_process_execution_runs_in_warm_workers():
+    """Tools declaring `execution="process"` run in worker processes and return their ActionOutput."""
+    from llmcompiler.utils.thread.process_pool import configure_process_pool
+
+    configure_process_pool(2, warm=True)
+    tasks = LLMCompilerPlanParser(tools=[PidTool()]).parse(
+        "1. pid(value=\"a\", delay=0.3)\n"
+        "2. pid(value=\"b\", delay=0.3)\n")
+    results = execute_plan(tasks)
+    assert [results[idx].any.value[0] for idx in (1, 2)] == ['a', 'b']
+    pids = {results[idx].any.value[1] for idx in (1, 2)}
+    assert len(pids) == 2 and os.getpid() not in pids
+    results = asyncio.run(aexecute_plan(tasks))
+    assert results[2].any.value[0] == 'b' and results[2].any.value[1] in pids
+
+
+def test_remote_execution_through_broker():
+    """Tools declaring `execution="remote"` are enqueued to a broker and run by workers serving that tool."""
+    from llmcompiler.utils.thread.broker import serve_broker, connect_broker, configure_remote_broker, ToolWorker
+
+    address, _ = serve_broker(("127.0.0.1", 0), b"test")
+    workers = [ToolWorker(connect_broker(address, b"test"), tools=["pid"], heartbeat_interval=0.1),
+               ToolWorker(connect_broker(address, b"test"), tools=["other"], heartbeat_interval=0.1)]
+    threads = [threading.Thread(target=worker.run, daemon=True) for worker in workers]
+    for thread in threads:
+        thread.start()
+    configure_remote_broker(connect_broker(address, b"test"))
+    try:
+        tasks = LLMCompilerPlanParser(tools=[PidTool(execution="remote")]).parse(
+            "1. pid(value=\"a\")\n"
+            "2. pid(value=\"${1}.value\")\n")
+        results = execute_plan(tasks)
+        # workers run as threads of this process in the test
+        assert results[1].any.value == ['a', os.getpid()]
+        assert results[2].any.value == [[['a', os.getpid()]], os.getpid()]
+        assert workers[0].completed == 2 and workers[1].completed == 0
+    finally:
+        configure_remote_broker(None)
+        for worker in workers:
+            worker.stop()
+
+
+def test_checkpoint_resumes_without_rerunning_finished_tools(tmp_path):
+    """Successful tasks are checkpointed and reused when the same plan resumes in a new process."""
+    from llmcompiler.graph.checkpoint import SqliteCheckpointStore, TaskCheckpoint, with_task_checkpoint
+
+    plan = ("1. echo(value=\"a\")\n"
+            "2. echo(value=\"${1}.value\")\n"
+            "3. fail(value=\"b\")\n")
+    tools = [EchoTool(), FailTool()]
+    store = SqliteCheckpointStore(str(tmp_path / 'checkpoint.db'))
+    checkpoint = TaskCheckpoint(store, "t")
+    config = with_task_checkpoint({"configurable": {"thread_id": "t"}}, checkpoint)
+    CALLS.clear()
+    execute_plan(LLMCompilerPlanParser(tools=tools).parse(plan), config=config)
+    assert len(CALLS) == 2
+    # resolved args live with the tasks of the request, the session checkpoint keeps no per-task state
+    assert set(vars(checkpoint)) == {"store", "thread_id", "restored"}
+    records = SqliteCheckpointStore(str(tmp_path / 'checkpoint.db')).load("t")
+    assert sorted(records) == [1, 2] and records[2]['resolved_args'] == {'value': ['a']}
+
+    # resume: restored results are reused and still reported as tool messages, the failed task runs again
+    CALLS.clear()
+    observations = {idx: record['observation'] for idx, record in records.items()}
+    config = with_task_checkpoint({"configurable": {"thread_id": "t"}}, TaskCheckpoint(store, "t", records))
+    output = schedule_tasks.invoke(
+        SchedulerInput(messages=[], tasks=iter(LLMCompilerPlanParser(tools=tools).parse(plan)), charts=[],
+                       tasks_temporary_save=[], observations=observations, print_dag=False), config)
+    assert CALLS == [] and observations[2].any.value == ['a']
+    assert [message.additional_kwargs['idx'] for message in output['messages'][1::2]] == [1, 2, 3]
+
+    # a changed upstream task runs again, and so do its dependents instead of reusing stale results
+    CALLS.clear()
+    changed = plan.replace('echo(value="a")', 'echo(value="b")')
+    observations = {}
+    config = with_task_checkpoint({"configurable": {"thread_id": "t"}}, TaskCheckpoint(store, "t", records))
+    schedule_tasks.invoke(
+        SchedulerInput(messages=[], tasks=iter(LLMCompilerPlanParser(tools=tools).parse(changed)), charts=[],
+                       tasks_temporary_save=[], observations=observations, print_dag=False), config)
+    assert sorted(str(value) for value, _ in CALLS) == ["['b']", 'b']
+    assert observations[2].any.value == ['b']
@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+"""
+Test the planner chain cache.
+"""
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.messages import HumanMessage
+
+from test.test_plan_and_schedule import EchoTool
+from llmcompiler.graph.planner import Planer
+from llmcompiler.utils.date.date import formatted_dt_now
+
+
+def test_planner_chain_cached_per_tool_set():
+    """Planner chains and tool descriptions are built once per tool set, the prompt time is rendered per call."""
+    llm = FakeListChatModel(responses=["1. echo(value=\"a\")\n2. join()<END_OF_PLAN>"])
+    tools = [EchoTool()]
+    planner = Planer(llm, tools).init()
+    assert Planer(llm, list(tools)).init() is planner
+    assert Planer(llm, tools, custom_prompts={"JOINER_SYSTEM_PROMPT_1": "x"}).init() is not planner
+    assert Planer(llm, [EchoTool()]).init() is not planner
+
+    prompt = planner.steps[0].invoke({"messages": [HumanMessage(content="hi")]}).to_string()
+    assert "`echo`" in prompt and formatted_dt_now("%Y-%m-%d") in prompt
+    assert [task["idx"] for task in planner.invoke({"messages": [HumanMessage(content="hi")]})] == [1, 2]
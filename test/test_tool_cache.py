@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""
+Test the tool result cache backends.
+"""
+import sys
+import os
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from llmcompiler.tools.cache.memory import MemoryToolCache
+from llmcompiler.tools.cache.sqlite import SqliteToolCache
+from llmcompiler.tools.generic.action_output import ActionOutput
+
+
+def test_memory_cache_lru_and_ttl():
+    cache = MemoryToolCache(max_entries=2)
+    cache.set('t', 'a', 1, ttl=60)
+    cache.set('t', 'b', 2, ttl=60)
+    assert cache.lookup('t', 'a') == 1
+    cache.set('t', 'c', 3, ttl=60)
+    assert cache.lookup('t', 'b') is None
+    assert cache.lookup('t', 'c') == 3
+    cache.set('t', 'd', 4, ttl=0.01)
+    time.sleep(0.02)
+    assert cache.get('t', 'd') is None
+    assert cache.stats('t') == {'hits': 2, 'misses': 1, 'hit_rate': 2 / 3}
+
+
+def test_sqlite_cache_shared_and_invalidated(tmp_path):
+    path = str(tmp_path / 'cache.db')
+    writer = SqliteToolCache(path)
+    writer.set('fund', 'k', ActionOutput(any=[1, 2]), ttl=60)
+    writer.set('stock', 'k', ActionOutput(any='x'), ttl=60)
+    reader = SqliteToolCache(path)
+    assert reader.get('fund', 'k').any == [1, 2]
+    reader.invalidate('fund')
+    assert writer.get('fund', 'k') is None
+    assert writer.get('stock', 'k').any == 'x'
+
+
+def test_sqlite_cache_cleans_up_every_n_writes(tmp_path):
+    cache = SqliteToolCache(str(tmp_path / 'cache.db'), max_entries=2, cleanup_every=3, cleanup_interval=3600)
+    indexes = [row[1] for row in cache._connection().execute("PRAGMA index_list(tool_cache)")]
+    assert 'tool_cache_expire' in indexes
+    cache.set('t', 'old', 0, ttl=0.01)
+    time.sleep(0.02)
+
+    def count():
+        return cache._connection().execute("SELECT COUNT(*) FROM tool_cache").fetchone()[0]
+
+    # the third write removes the expired row
+    cache.set('t', 'a', 1, ttl=60)
+    assert count() == 2
+    cache.set('t', 'b', 2, ttl=60)
+    assert count() == 2
+    # writes between cleanups may exceed `max_entries`, the sixth write evicts the least recently used rows
+    cache.set('t', 'c', 3, ttl=60)
+    cache.set('t', 'd', 4, ttl=60)
+    assert count() == 4
+    cache.set('t', 'e', 5, ttl=60)
+    assert count() == 2
+    assert cache.get('t', 'd') == 4 and cache.get('t', 'e') == 5
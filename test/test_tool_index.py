@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+"""
+Test the tool-name index.
+"""
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from test.test_plan_and_schedule import EchoTool
+from llmcompiler.service.status import init_base_call_tools, long_match_tool
+from llmcompiler.tools.tool_index import tool_index
+
+
+def _tool(name: str) -> EchoTool:
+    return EchoTool(name=name)
+
+
+def test_tool_index_lookup_and_longest_match():
+    tools = [_tool("stock"), _tool("stock_price"), _tool("price"), _tool("fund"), _tool("stock")]
+    index = tool_index(tools)
+    assert tool_index(tools) is index
+    assert tool_index(index) is index
+    assert list(index) == tools and len(index) == 5 and index[1] is tools[1]
+    assert index.get("stock") is tools[0]
+    assert index.get("bond") is None
+
+    assert index.longest_match("call stock_price now") is tools[1]
+    assert index.longest_match("price of the fund") is tools[2]
+    assert index.longest_match("stoc pric") is None
+    assert long_match_tool("1. stock_price(code='a')", tools).tool_name == "stock_price"
+    assert long_match_tool("nothing here", tools) is None
+    assert [call.tool_name for call in init_base_call_tools("1. fund()\n\n2. stock(code='a')", tools).call_status] \
+           == ["fund", "stock"]
+
+    assert index.contains_any("the fund is up")
+    assert not index.contains_any("the bond is up")